@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency benchmark: exact brute-force search vs the IVF / IVF-PQ index
+Usage: python benchmark_ann_index.py [gallery_size] [n_queries]
+"""
+import sys
+import time
+import numpy as np
+
+from employees.ann_index import IVFIndex
+
+DIM = 128
+TOP_K = 10
+
+def make_gallery(size, rng):
+    """Synthetic unit descriptors grouped around random 'look-alike' centres, like real face embeddings"""
+    centres = rng.normal(size=(max(1, size // 200), DIM)).astype(np.float32)
+    gallery = centres[rng.integers(0, centres.shape[0], size)] + rng.normal(0, 0.6, (size, DIM)).astype(np.float32)
+    return gallery / np.linalg.norm(gallery, axis=1, keepdims=True)
+
+def make_queries(gallery, n_queries, rng):
+    """Re-captures of enrolled people: stored descriptor plus capture noise (similarity ~0.95-0.98)"""
+    truth = rng.integers(0, gallery.shape[0], n_queries)
+    queries = gallery[truth] + rng.normal(0, 0.02, (n_queries, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True), truth
+
+def exact_search(gallery, query, k):
+    scores = gallery @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def timed(fn, queries):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(fn(query))
+    return results, (time.perf_counter() - start) / len(queries)
+
+def recall(approx, exact, k):
+    return np.mean([len(set(a[:k]) & set(e[:k])) / k for a, e in zip(approx, exact)])
+
+def benchmark_ann(size=100000, n_queries=200):
+    print("⏱️  ANN Index Benchmark (recall vs latency)")
+    print("=" * 60)
+    rng = np.random.default_rng(7)
+    gallery = make_gallery(size, rng)
+    queries, truth = make_queries(gallery, n_queries, rng)
+    labels = np.arange(size)
+    print(f"📊 Gallery: {size} descriptors, {n_queries} queries, top-{TOP_K}")
+
+    exact, exact_time = timed(lambda q: exact_search(gallery, q, TOP_K), queries)
+    print(f"\n{'method':<28}{'build s':>9}{'ms/query':>10}{'R@1':>8}{'R@10':>8}{'MB':>9}")
+    print(f"{'exact (brute force)':<28}{0:>9.1f}{exact_time * 1e3:>10.2f}"
+          f"{np.mean([e[0] == t for e, t in zip(exact, truth)]):>8.3f}{1:>8.3f}{gallery.nbytes / 2**20:>9.1f}")
+
+    for pq_subvectors in (0, 16, 32):
+        start = time.perf_counter()
+        index = IVFIndex(dim=DIM, pq_subvectors=pq_subvectors)
+        index.train(gallery)
+        index.add(labels, gallery)
+        build_time = time.perf_counter() - start
+        payload_mb = sum(data.nbytes for data in index._list_data) / 2**20
+
+        for n_probe in (8, 16, 32, 64):
+            approx, approx_time = timed(lambda q: index.search(q, k=TOP_K, n_probe=n_probe)[0], queries)
+            name = f"IVF{'-PQ' + str(pq_subvectors) if pq_subvectors else '-Flat'} nprobe={n_probe}"
+            print(f"{name:<28}{build_time:>9.1f}{approx_time * 1e3:>10.2f}"
+                  f"{recall(approx, exact, 1):>8.3f}{recall(approx, exact, TOP_K):>8.3f}{payload_mb:>9.1f}")
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    benchmark_ann(size, n_queries)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark compact descriptor formats (float32 / float16 / int8):
+storage per descriptor, gallery memory, 1:N match speed and score drift at the 0.95 threshold
+Usage: python benchmark_descriptor_formats.py [gallery_size]
+"""
+import sys
+import timeit
+import numpy as np
+
+from employees.descriptor_codec import encode_descriptor, decode_descriptor
+from employees.utils import FACE_SIMILARITY_THRESHOLD
+
+DIM = 128
+FORMATS = ('float32', 'float16', 'int8')
+
+def unit_rows(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def benchmark_formats(size=20000):
+    print("⏱️  Descriptor Format Benchmark")
+    print("=" * 60)
+    rng = np.random.default_rng(3)
+    gallery = unit_rows(rng.normal(size=(size, DIM)).astype(np.float32))
+
+    # Genuine pairs spread around the acceptance threshold, plus impostor pairs
+    noise = unit_rows(rng.normal(size=(size, DIM)).astype(np.float32))
+    target = rng.uniform(0.90, 0.995, size).astype(np.float32)[:, None]
+    probes = unit_rows(target * gallery + np.sqrt(1 - target ** 2) * noise)
+    exact_scores = np.einsum('ij,ij->i', gallery, probes)
+    exact_accept = exact_scores >= FACE_SIMILARITY_THRESHOLD
+
+    print(f"📊 {size} genuine pairs, exact similarities {exact_scores.min():.3f}..{exact_scores.max():.3f}, "
+          f"threshold {FACE_SIMILARITY_THRESHOLD}\n")
+    print(f"{'format':<9}{'bytes':>7}{'gallery MB':>12}{'decode µs':>11}{'match ms':>10}"
+          f"{'max |Δ|':>10}{'mean |Δ|':>10}{'flips':>7}")
+
+    probe = probes[0]
+    for fmt in FORMATS:
+        blobs = [encode_descriptor(row, fmt) for row in gallery]
+        decoded = unit_rows(np.vstack([decode_descriptor(blob) for blob in blobs]))
+        scores = np.einsum('ij,ij->i', decoded, probes)
+        delta = np.abs(scores - exact_scores)
+        flips = int(np.sum((scores >= FACE_SIMILARITY_THRESHOLD) != exact_accept))
+
+        # In-memory gallery kept in the compact dtype; int8 codes are upcast per query and rescaled
+        if fmt == 'float32':
+            matrix = decoded.astype(np.float32)
+            match = lambda: matrix @ probe
+        elif fmt == 'float16':
+            matrix = decoded.astype(np.float16)
+            match = lambda: matrix @ probe.astype(np.float16)
+        else:
+            scales = np.abs(decoded).max(axis=1) / 127.0
+            matrix = np.rint(decoded / scales[:, None]).astype(np.int8)
+            match = lambda: (matrix @ probe) * scales
+
+        decode_time = min(timeit.repeat(lambda: decode_descriptor(blobs[0]), number=2000, repeat=3)) / 2000
+        match_time = min(timeit.repeat(match, number=20, repeat=3)) / 20
+
+        print(f"{fmt:<9}{len(blobs[0]):>7}{matrix.nbytes / 2**20:>12.2f}{decode_time * 1e6:>11.2f}"
+              f"{match_time * 1e3:>10.3f}{delta.max():>10.5f}{delta.mean():>10.6f}{flips:>7}")
+
+    print("\n- bytes: stored blob size including the 4-byte format header (legacy float32 blobs are 512)")
+    print("- flips: genuine pairs whose accept/reject decision at the threshold changes vs float32")
+
+if __name__ == "__main__":
+    benchmark_formats(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: sklearn cosine_similarity vs the precomputed-normalized dot product
+used by AttendanceView and compare_face_descriptors
+scikit-learn is no longer an app dependency; install it separately to run this comparison
+"""
+import timeit
+import numpy as np
+
+try:
+    from sklearn.metrics.pairwise import cosine_similarity
+except ImportError:
+    raise SystemExit("❌ This benchmark compares against scikit-learn: pip install scikit-learn")
+
+from employees.utils import normalize_descriptor, descriptor_similarity
+
+ITERATIONS = 20000
+
+def benchmark_similarity():
+    print("⏱️  Face Similarity Kernel Benchmark")
+    print("=" * 50)
+
+    rng = np.random.default_rng(42)
+    stored = rng.normal(size=128).astype(np.float32)
+    incoming = (stored + rng.normal(0, 0.05, 128)).astype(np.float32)
+
+    # Old path: both raw vectors reshaped and passed to sklearn on every request
+    def sklearn_path():
+        return cosine_similarity(incoming.reshape(1, -1), stored.reshape(1, -1))[0][0]
+
+    # New path: stored vector normalized once at registration, probe normalized per request
+    stored_unit, _ = normalize_descriptor(stored)
+
+    def kernel_path():
+        return descriptor_similarity(normalize_descriptor(incoming)[0], stored_unit)
+
+    old_score = sklearn_path()
+    new_score = kernel_path()
+    print(f"🔍 sklearn similarity: {old_score:.6f}")
+    print(f"🔍 kernel similarity:  {new_score:.6f}")
+    print(f"🔍 absolute difference: {abs(old_score - new_score):.2e}")
+
+    old_time = min(timeit.repeat(sklearn_path, number=ITERATIONS, repeat=3)) / ITERATIONS
+    new_time = min(timeit.repeat(kernel_path, number=ITERATIONS, repeat=3)) / ITERATIONS
+
+    print(f"\n📊 Per-comparison latency ({ITERATIONS} iterations, best of 3):")
+    print(f"- sklearn cosine_similarity: {old_time * 1e6:8.2f} µs")
+    print(f"- normalized dot product:    {new_time * 1e6:8.2f} µs")
+    print(f"- speedup: {old_time / new_time:.1f}x")
+
+if __name__ == "__main__":
+    benchmark_similarity()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Geofence engine benchmark: accuracy and speed against geopy's geodesic
+Usage: python benchmark_geofence.py [n_points]
+"""
+import sys
+import time
+import numpy as np
+from geopy.distance import geodesic
+
+from employees.geofence import OfficeGeofence, evaluate_points
+from employees.utils import haversine_distances
+
+OFFICES = [
+    ('Equator', 0.5, 32.6, 100.0),
+    ('Bengaluru', 12.9716, 77.5946, 100.0),
+    ('San Francisco', 37.7749, -122.4194, 150.0),
+    ('Oslo', 59.9139, 10.7522, 200.0),
+]
+
+def sample_points(office_lat, office_lon, max_meters, n, rng):
+    """Points uniformly spread over a disc around the office (approximate degree conversion)"""
+    distance = max_meters * np.sqrt(rng.uniform(0, 1, n))
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    lat = office_lat + distance * np.cos(bearing) / 111320.0
+    lon = office_lon + distance * np.sin(bearing) / (111320.0 * np.cos(np.radians(office_lat)))
+    return lat, lon
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_geofence(n=5000):
+    print("⏱️  Geofence Engine Benchmark (vs geopy geodesic)")
+    print("=" * 72)
+    rng = np.random.default_rng(11)
+
+    for name, office_lat, office_lon, radius in OFFICES:
+        fence = OfficeGeofence(office_lat, office_lon, radius)
+        print(f"\n🏢 {name} ({office_lat}, {office_lon}), radius {radius:.0f} m, {n} points per range")
+        print(f"{'range':>10}{'method':>22}{'µs/point':>11}{'max err m':>11}{'flips':>7}")
+
+        for max_meters in (3 * radius, 50000.0):
+            lat, lon = sample_points(office_lat, office_lon, max_meters, n, rng)
+            points = list(zip(lat.tolist(), lon.tolist()))
+
+            exact, exact_time = timed(lambda: np.array([geodesic((office_lat, office_lon), p).meters for p in points]))
+            exact_inside = exact <= radius
+
+            evaluated, engine_time = timed(lambda: [fence.evaluate(*p) for p in points])
+            engine = np.array([d for d, _ in evaluated])
+            engine_inside = np.array([inside for _, inside in evaluated])
+
+            approx, approx_time = timed(lambda: np.array([fence.distance(*p) for p in points]))
+
+            vector, vector_time = timed(
+                lambda: haversine_distances(np.full(n, office_lat), np.full(n, office_lon), lat, lon))
+            (vec_eval, vec_inside), vec_eval_time = timed(
+                lambda: evaluate_points(lat, lon, np.full(n, office_lat), np.full(n, office_lon), np.full(n, radius)))
+
+            rows = [
+                ('geopy geodesic', exact_time, exact, exact_inside),
+                ('engine.evaluate', engine_time, engine, engine_inside),
+                ('projection only', approx_time, approx, approx <= radius),
+                ('numpy haversine', vector_time, vector, vector <= radius),
+                ('evaluate_points', vec_eval_time, vec_eval, vec_inside),
+            ]
+            for method, elapsed, distances, inside in rows:
+                print(f"{max_meters:>9.0f}m{method:>22}{elapsed / n * 1e6:>11.2f}"
+                      f"{np.max(np.abs(distances - exact)):>11.3f}{int(np.sum(inside != exact_inside)):>7}")
+
+    print("\n- flips: points whose inside/outside decision differs from geodesic")
+
+if __name__ == "__main__":
+    benchmark_geofence(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark and regression gate for worker boot / manage.py import cost
+- python -X importtime summary for django.setup() + URLconf import (what a gunicorn worker loads)
+- time-to-first-request through the Django test client (FIRST_REQUEST_PATH, resolved through the full URLconf)
+- fails (exit 1) if a heavy optional dependency is imported at startup or by that first request,
+  if the request does not answer 200, or if a budget is exceeded
+
+Usage: python benchmark_startup.py [--max-import-ms 400] [--max-first-request-ms 800]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must only load on first use (face matching, image decoding, uploads, geodesics)
+LAZY_MODULES = ('sklearn', 'scipy', 'PIL', 'geopy', 'cloudinary', 'numpy')
+
+# What a gunicorn worker / manage.py command does before handling anything
+STARTUP_SNIPPET = """
+import os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'employeemanagement.settings')
+import django
+django.setup()
+from django.core.management import get_commands
+get_commands()
+from employees.management.commands import update_employee_status
+print('LOADED=' + ','.join(sorted(m for m in {lazy!r} if m in sys.modules)))
+"""
+
+# Lightweight endpoint for the first request: health_check in employeemanagement/urls.py (no DB access).
+# Resolving it still imports the whole URLconf, employees.views included
+FIRST_REQUEST_PATH = '/api/health/'
+
+FIRST_REQUEST_SNIPPET = """
+import os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'employeemanagement.settings')
+import django
+django.setup()
+from django.test import Client
+booted = time.perf_counter()
+response = Client().get({path!r})
+done = time.perf_counter()
+print(f'STATUS={{response.status_code}}')
+print(f'BOOT_MS={{(booted - start) * 1e3:.1f}}')
+print(f'FIRST_REQUEST_MS={{(done - booted) * 1e3:.1f}}')
+print('LOADED=' + ','.join(sorted(m for m in {lazy!r} if m in sys.modules)))
+"""
+
+def run(snippet, *python_flags):
+    result = subprocess.run(
+        [sys.executable, *python_flags, '-c', snippet.format(lazy=LAZY_MODULES, path=FIRST_REQUEST_PATH)],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit("❌ Startup snippet failed")
+    return result
+
+def parse_importtime(stderr):
+    """Return {top-level package: cumulative µs} from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        try:
+            cumulative = int(cumulative.strip())
+        except ValueError:
+            continue  # header line
+        if not name.startswith('  '):  # top-level import (single leading space, no nesting)
+            package = name.strip().split('.')[0]
+            totals[package] = totals.get(package, 0) + cumulative
+    return totals
+
+def value(output, key):
+    for line in output.splitlines():
+        if line.startswith(key + '='):
+            return line.split('=', 1)[1]
+    return ''
+
+def benchmark_startup(max_import_ms, max_first_request_ms):
+    print("⏱️  Startup Benchmark")
+    print("=" * 50)
+    failures = []
+
+    startup = run(STARTUP_SNIPPET, '-X', 'importtime')
+    totals = parse_importtime(startup.stderr)
+    total_ms = sum(totals.values()) / 1000
+    print(f"📦 Import time (django.setup + manage.py commands): {total_ms:.1f} ms")
+    for package, micros in sorted(totals.items(), key=lambda item: -item[1])[:10]:
+        print(f"   {package:<24}{micros / 1000:>8.1f} ms")
+
+    loaded = [module for module in value(startup.stdout, 'LOADED').split(',') if module]
+    if loaded:
+        failures.append(f"heavy modules imported at startup: {', '.join(loaded)}")
+    if total_ms > max_import_ms:
+        failures.append(f"import time {total_ms:.1f} ms > budget {max_import_ms} ms")
+
+    first = run(FIRST_REQUEST_SNIPPET)
+    boot_ms = float(value(first.stdout, 'BOOT_MS'))
+    first_ms = float(value(first.stdout, 'FIRST_REQUEST_MS'))
+    print(f"\n🚀 Worker boot (django.setup): {boot_ms:.1f} ms")
+    print(f"🚀 Time to first request ({FIRST_REQUEST_PATH}, loads the URLconf + views): {first_ms:.1f} ms")
+    print(f"   modules loaded by then: {value(first.stdout, 'LOADED') or 'none of ' + ', '.join(LAZY_MODULES)}")
+    if value(first.stdout, 'STATUS') != '200':
+        failures.append(f"first request to {FIRST_REQUEST_PATH} answered {value(first.stdout, 'STATUS')}, not 200")
+    loaded = [module for module in value(first.stdout, 'LOADED').split(',') if module]
+    if loaded:
+        failures.append(f"heavy modules imported by the first request: {', '.join(loaded)}")
+    if first_ms > max_first_request_ms:
+        failures.append(f"first request {first_ms:.1f} ms > budget {max_first_request_ms} ms")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("\n✅ Startup within budget")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--max-import-ms', type=float, default=400)
+    parser.add_argument('--max-first-request-ms', type=float, default=800)
+    args = parser.parse_args()
+    benchmark_startup(args.max_import_ms, args.max_first_request_ms)
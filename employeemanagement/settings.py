@@ -120,6 +120,64 @@ DATABASES = {
     }
 }
 
+# Cache used for geofence alert state and presence heartbeats. The default in-process locmem cache is
+# per worker; point CACHE_BACKEND/CACHE_LOCATION at a shared cache (Redis, Memcached, or Django's
+# database/file cache) when running several workers, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Storage format for new face descriptors: 'float32' (default), 'float16' or 'int8'
+# Existing blobs keep decoding in whatever format they were written; see reencode_face_descriptors
+FACE_ENCODING_FORMAT = os.environ.get('FACE_ENCODING_FORMAT', 'float32')
+
+# Shared, memory-mapped face gallery snapshot used by every gunicorn worker on one host (opt-in:
+# set a directory such as BASE_DIR / 'face_snapshot'; empty keeps a per-worker in-memory gallery)
+# Rebuild it from the database with: python manage.py export_face_snapshot
+FACE_GALLERY_SNAPSHOT_DIR = os.environ.get('FACE_GALLERY_SNAPSHOT_DIR', '')
+
+# Live location pings are buffered per worker and flushed in bulk every LOCATION_FLUSH_INTERVAL_SECONDS
+# (also the most a crashed worker can lose); a flush also runs once LOCATION_BUFFER_MAX_PENDING rows are waiting
+LOCATION_BUFFER_ENABLED = os.environ.get('LOCATION_BUFFER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LOCATION_FLUSH_INTERVAL_SECONDS = float(os.environ.get('LOCATION_FLUSH_INTERVAL_SECONDS', '5'))
+LOCATION_BUFFER_MAX_PENDING = int(os.environ.get('LOCATION_BUFFER_MAX_PENDING', '5000'))
+
+# Location history: raw points, then per-minute buckets, then per-15-minute buckets until deleted
+# Downsampling runs in: python manage.py compact_location_history (schedule it hourly)
+LOCATION_HISTORY_RAW_DAYS = float(os.environ.get('LOCATION_HISTORY_RAW_DAYS', '7'))
+LOCATION_HISTORY_MINUTE_DAYS = float(os.environ.get('LOCATION_HISTORY_MINUTE_DAYS', '30'))
+LOCATION_HISTORY_RETENTION_DAYS = float(os.environ.get('LOCATION_HISTORY_RETENTION_DAYS', '365'))
+
+# Track compression: a point is dropped when the track replayed without it stays within this many meters
+# (time-synchronized); points around gaps longer than LOCATION_TRACK_MAX_GAP_SECONDS are always kept
+LOCATION_TRACK_TOLERANCE_METERS = float(os.environ.get('LOCATION_TRACK_TOLERANCE_METERS', '15'))
+LOCATION_TRACK_MAX_GAP_SECONDS = float(os.environ.get('LOCATION_TRACK_MAX_GAP_SECONDS', '600'))
+
+# Geofence-exit alerts: an excursion starts once an employee is more than GEOFENCE_EXIT_MARGIN_METERS outside
+# the fence for GEOFENCE_MIN_DWELL_SECONDS and ends after the same dwell back inside. The per-employee state is
+# kept in the default cache (see CACHES) so all workers see the same state.
+GEOFENCE_EXIT_MARGIN_METERS = float(os.environ.get('GEOFENCE_EXIT_MARGIN_METERS', '25'))
+GEOFENCE_MIN_DWELL_SECONDS = float(os.environ.get('GEOFENCE_MIN_DWELL_SECONDS', '120'))
+
+# Live dashboard stream (/api/live-employee-locations/stream/, only served under ASGI; see DEPLOYMENT_GUIDE.md):
+# LocalBroker fans events out within one process; RedisBroker (needs the redis package) relays them between
+# workers and is the default once LIVE_STREAM_REDIS_URL is set
+LIVE_STREAM_REDIS_URL = os.environ.get('LIVE_STREAM_REDIS_URL', 'redis://127.0.0.1:6379/0')
+LIVE_STREAM_BACKEND = os.environ.get('LIVE_STREAM_BACKEND', 'employees.live_stream.RedisBroker'
+                                     if os.environ.get('LIVE_STREAM_REDIS_URL') else 'employees.live_stream.LocalBroker')
+
+# Server worker processes (gunicorn reads the same variable); the stream refuses to run on LocalBroker
+# with more than one, since each dashboard would only see the writes of its own worker
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# Presence heartbeats: every sharing ping refreshes a per-employee key in this cache alias that expires
+# ONLINE_LOCATION_WINDOW after the ping, so online status needs no DB read and no sweeping job
+PRESENCE_CACHE_ALIAS = os.environ.get('PRESENCE_CACHE_ALIAS', 'default')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -76,15 +76,8 @@ CORS_ALLOWED_ORIGINS.extend([
 ])
 
 # Cloudinary Configuration
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-
-cloudinary.config(
-    cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.environ.get('CLOUDINARY_API_KEY'),
-    api_secret=os.environ.get('CLOUDINARY_API_SECRET')
-)
+# Read from CLOUDINARY_CLOUD_NAME / CLOUDINARY_API_KEY / CLOUDINARY_API_SECRET by
+# employees.cloudinary_utils on the first upload, so the SDK is not imported at startup
 
 # Logging
 LOGGING = {
@@ -4,6 +4,7 @@ from .models import Employee, OfficeLocation, Attendance
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
     list_display = ('name', 'employee_id')
+    filter_horizontal = ('allowed_offices',)
 
 @admin.register(OfficeLocation)
 class OfficeLocationAdmin(admin.ModelAdmin):
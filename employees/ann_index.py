@@ -0,0 +1,203 @@
+"""
+Approximate nearest-neighbour index for very large face galleries
+Pure-numpy IVF (inverted file) index over unit-length descriptors, with optional
+product quantization (IVF-PQ) of the residuals. Scores are inner products, which
+equal cosine similarity for normalized descriptors.
+"""
+
+import numpy as np
+
+# Rows scored per matmul when assigning vectors to centroids, bounds peak memory
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def _assign(vectors, centroids):
+    """Index of the highest-scoring centroid for every row, computed in chunks"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignments[start:start + ASSIGN_CHUNK_ROWS] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _nearest_l2(vectors, centroids):
+    """Index of the closest centroid by euclidean distance (used for PQ codebooks)"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+    for start in range(0, vectors.shape[0], ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignments[start:start + ASSIGN_CHUNK_ROWS] = np.argmin(centroid_sq - 2 * chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(vectors, n_clusters, iterations=10, spherical=True, seed=0):
+    """
+    Plain Lloyd's k-means in numpy
+    spherical=True keeps centroids unit-length and assigns by inner product
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids) if spherical else _nearest_l2(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters from random points so no list stays unused
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()))]
+            counts[empty] = 1
+
+        centroids = sums / counts[:, None]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = centroids / norms
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: descriptors are bucketed under their nearest coarse centroid
+    and a search only scans the n_probe best buckets.
+
+    pq_subvectors=0 keeps raw float32 vectors in the lists (IVF-Flat); a positive value
+    stores one uint8 code per subvector instead (IVF-PQ, 128 dims -> pq_subvectors bytes).
+    Labels can be any hashable value (the face gallery uses employee_id strings).
+    """
+
+    def __init__(self, dim=128, n_lists=None, n_probe=16, pq_subvectors=0, seed=0):
+        if pq_subvectors and dim % pq_subvectors:
+            raise ValueError(f"dim {dim} is not divisible by pq_subvectors {pq_subvectors}")
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.pq_subvectors = pq_subvectors
+        self.seed = seed
+        self.centroids = None
+        self.codebooks = None  # (pq_subvectors, 256, dim // pq_subvectors)
+        self._list_data = []
+        self._list_labels = []
+        self._label_list = {}
+
+    def __len__(self):
+        return len(self._label_list)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, sample_per_list=64, iterations=10):
+        """Learn coarse centroids (and PQ codebooks) from a sample of the gallery"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+
+        if not self.n_lists:
+            self.n_lists = max(1, int(np.sqrt(vectors.shape[0])))
+        sample_size = min(vectors.shape[0], self.n_lists * sample_per_list)
+        sample = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+
+        self.centroids = kmeans(sample, self.n_lists, iterations=iterations, seed=self.seed)
+        self.n_lists = self.centroids.shape[0]
+
+        if self.pq_subvectors:
+            residuals = sample - self.centroids[_assign(sample, self.centroids)]
+            sub_dim = self.dim // self.pq_subvectors
+            n_codes = min(256, sample.shape[0])
+            self.codebooks = np.stack([
+                kmeans(residuals[:, m * sub_dim:(m + 1) * sub_dim], n_codes,
+                       iterations=iterations, spherical=False, seed=self.seed + m)
+                for m in range(self.pq_subvectors)
+            ])
+
+        self._list_data = [self._empty_payload() for _ in range(self.n_lists)]
+        self._list_labels = [np.empty(0, dtype=object) for _ in range(self.n_lists)]
+        self._label_list = {}
+
+    def _empty_payload(self):
+        if self.pq_subvectors:
+            return np.empty((0, self.pq_subvectors), dtype=np.uint8)
+        return np.empty((0, self.dim), dtype=np.float32)
+
+    def _encode(self, vectors, assignments):
+        """PQ codes for the residuals of vectors w.r.t. their coarse centroids"""
+        residuals = vectors - self.centroids[assignments]
+        sub_dim = self.dim // self.pq_subvectors
+        codes = np.empty((vectors.shape[0], self.pq_subvectors), dtype=np.uint8)
+        for m in range(self.pq_subvectors):
+            codes[:, m] = _nearest_l2(residuals[:, m * sub_dim:(m + 1) * sub_dim], self.codebooks[m])
+        return codes
+
+    def add(self, labels, vectors):
+        """Append descriptors to their inverted lists (incremental, no retraining)"""
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex.add() called before train()")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        labels = list(labels)
+
+        for label in labels:
+            if label in self._label_list:
+                self.remove(label)
+
+        assignments = _assign(vectors, self.centroids)
+        payload = self._encode(vectors, assignments) if self.pq_subvectors else vectors
+        label_array = np.empty(len(labels), dtype=object)
+        label_array[:] = labels
+
+        for list_no in np.unique(assignments):
+            mask = assignments == list_no
+            self._list_data[list_no] = np.concatenate([self._list_data[list_no], payload[mask]])
+            self._list_labels[list_no] = np.concatenate([self._list_labels[list_no], label_array[mask]])
+            for label in label_array[mask]:
+                self._label_list[label] = int(list_no)
+
+    def remove(self, label):
+        list_no = self._label_list.pop(label, None)
+        if list_no is None:
+            return
+        keep = self._list_labels[list_no] != label
+        self._list_data[list_no] = self._list_data[list_no][keep]
+        self._list_labels[list_no] = self._list_labels[list_no][keep]
+
+    def search(self, query, k=10, n_probe=None):
+        """
+        Return (labels, scores) for the k best candidates, best first
+        Scores are exact inner products for IVF-Flat and PQ approximations for IVF-PQ
+        """
+        if not self.is_trained or not self._label_list:
+            return [], np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        centroid_scores = self.centroids @ query
+        if n_probe < self.n_lists:
+            probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probed = np.arange(self.n_lists)
+        probed = [list_no for list_no in probed if self._list_labels[list_no].shape[0]]
+        if not probed:
+            return [], np.empty(0, dtype=np.float32)
+
+        labels = np.concatenate([self._list_labels[list_no] for list_no in probed])
+
+        if self.pq_subvectors:
+            sub_dim = self.dim // self.pq_subvectors
+            # Lookup table: query sub-vector . every codeword, one row per subspace
+            lut = np.einsum('mkd,md->mk', self.codebooks, query.reshape(self.pq_subvectors, sub_dim))
+            subspaces = np.arange(self.pq_subvectors)
+            scores = np.concatenate([
+                centroid_scores[list_no] + lut[subspaces, self._list_data[list_no].astype(np.intp)].sum(axis=1)
+                for list_no in probed
+            ])
+        else:
+            scores = np.concatenate([self._list_data[list_no] @ query for list_no in probed])
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return labels[top].tolist(), scores[top]
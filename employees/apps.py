@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmployeesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'employees'
+
+    def ready(self):
+        # Register signal handlers that keep the face gallery and office index in sync
+        from . import signals  # noqa: F401
@@ -0,0 +1,123 @@
+"""
+Compact encoding for office boundary polygons
+OfficeLocation.boundary holds a GeoJSON Polygon or MultiPolygon as a small binary
+blob: a header (magic, version, polygon count), ring/vertex counts, then vertices
+as int32 degrees * 1e7 (~1 cm resolution, 8 bytes per vertex instead of 16+ in JSON).
+Rings are stored open (the closing vertex is implied).
+"""
+
+import struct
+
+import numpy as np
+
+MAGIC = b'GB'
+CODEC_VERSION = 1
+HEADER = struct.Struct('<2sBH')  # magic, version, polygon count
+COUNT = struct.Struct('<I')
+
+COORDINATE_SCALE = 1e7
+
+# Upper bound on vertices per office so one bad upload cannot blow up every worker's index
+MAX_BOUNDARY_VERTICES = 20000
+
+
+def _clean_ring(ring):
+    """Validate one GeoJSON ring ([[lon, lat], ...]) and return it open as an (n, 2) array"""
+    points = np.asarray(ring, dtype=np.float64)
+    if points.ndim != 2 or points.shape[1] < 2:
+        raise ValueError("Each ring must be a list of [longitude, latitude] positions")
+    points = points[:, :2]
+    if not np.all(np.isfinite(points)):
+        raise ValueError("Boundary coordinates must be finite numbers")
+    if np.any(np.abs(points[:, 0]) > 180) or np.any(np.abs(points[:, 1]) > 90):
+        raise ValueError("Boundary coordinates must be [longitude, latitude] in degrees")
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    if len(np.unique(points, axis=0)) < 3:
+        raise ValueError("Each ring needs at least 3 distinct positions")
+    return points
+
+
+def encode_boundary(geometry):
+    """
+    Serialize a GeoJSON geometry dict (type Polygon or MultiPolygon)
+    Raises ValueError for anything else or for malformed rings
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError("Boundary must be a GeoJSON Polygon or MultiPolygon object")
+    kind = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    if kind == 'Polygon':
+        polygons = [coordinates]
+    elif kind == 'MultiPolygon':
+        polygons = coordinates
+    else:
+        raise ValueError("Boundary must be a GeoJSON Polygon or MultiPolygon object")
+    if not isinstance(polygons, list) or not polygons or not all(isinstance(p, list) and p for p in polygons):
+        raise ValueError("Boundary has no rings")
+    if not all(isinstance(ring, list) for polygon in polygons for ring in polygon):
+        raise ValueError("Each ring must be a list of [longitude, latitude] positions")
+
+    # Sizes are checked before any ring is parsed or packed (the polygon count is a ushort in the header)
+    total = sum(len(ring) for polygon in polygons for ring in polygon)
+    if total > MAX_BOUNDARY_VERTICES:
+        raise ValueError(f"Boundary has {total} vertices (maximum {MAX_BOUNDARY_VERTICES})")
+
+    parts = [HEADER.pack(MAGIC, CODEC_VERSION, len(polygons))]
+    vertices = []
+    for polygon in polygons:
+        rings = [_clean_ring(ring) for ring in polygon]
+        parts.append(COUNT.pack(len(rings)))
+        for ring in rings:
+            parts.append(COUNT.pack(len(ring)))
+            vertices.append(ring)
+
+    scaled = np.rint(np.vstack(vertices) * COORDINATE_SCALE).astype('<i4')
+    return b''.join(parts) + scaled.tobytes()
+
+
+def decode_boundary(blob):
+    """
+    Deserialize a blob into a list of polygons, each a list of rings,
+    each an open (n, 2) float64 array of (longitude, latitude); the first ring is the outer one
+    """
+    blob = bytes(blob)
+    magic, version, n_polygons = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded office boundary")
+    if version > CODEC_VERSION:
+        raise ValueError(f"Boundary codec version {version} is newer than supported {CODEC_VERSION}")
+
+    offset = HEADER.size
+    layout = []
+    for _ in range(n_polygons):
+        n_rings, = COUNT.unpack_from(blob, offset)
+        offset += COUNT.size
+        sizes = []
+        for _ in range(n_rings):
+            n_vertices, = COUNT.unpack_from(blob, offset)
+            offset += COUNT.size
+            sizes.append(n_vertices)
+        layout.append(sizes)
+
+    coordinates = np.frombuffer(blob, dtype='<i4', offset=offset).reshape(-1, 2) / COORDINATE_SCALE
+    polygons = []
+    start = 0
+    for sizes in layout:
+        rings = []
+        for size in sizes:
+            rings.append(coordinates[start:start + size])
+            start += size
+        polygons.append(rings)
+    return polygons
+
+
+def boundary_to_geojson(blob):
+    """GeoJSON geometry dict for an encoded boundary (rings closed again, as GeoJSON requires)"""
+    polygons = [
+        [ring.tolist() + [ring[0].tolist()] for ring in rings]
+        for rings in decode_boundary(blob)
+    ]
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
@@ -3,22 +3,37 @@ Cloudinary utilities for image upload and management
 Works seamlessly with face detection system
 """
 
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 import base64
 import io
-from PIL import Image
 import os
 from django.core.files.base import ContentFile
 
+# The cloudinary SDK (and requests/urllib3 under it) is imported and configured on first
+# use instead of at import time, so workers and manage.py commands start without it
+_configured = False
+
 def configure_cloudinary():
     """Configure Cloudinary with environment variables"""
+    global _configured
+    import cloudinary
     cloudinary.config(
         cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
         api_key=os.environ.get('CLOUDINARY_API_KEY'),
         api_secret=os.environ.get('CLOUDINARY_API_SECRET')
     )
+    _configured = True
+
+def _cloudinary_uploader():
+    if not _configured:
+        configure_cloudinary()
+    import cloudinary.uploader
+    return cloudinary.uploader
+
+def _cloudinary_api():
+    if not _configured:
+        configure_cloudinary()
+    import cloudinary.api
+    return cloudinary.api
 
 def upload_base64_to_cloudinary(base64_image, folder="employee_faces", public_id=None):
     """
@@ -34,7 +49,7 @@ def upload_base64_to_cloudinary(base64_image, folder="employee_faces", public_id
         image_data = base64.b64decode(base64_image)
         
         # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
+        upload_result = _cloudinary_uploader().upload(
             io.BytesIO(image_data),
             folder=folder,
             public_id=public_id,
@@ -57,7 +72,7 @@ def upload_file_to_cloudinary(file_obj, folder="employee_faces", public_id=None)
     Returns: (cloudinary_url, cloudinary_public_id)
     """
     try:
-        upload_result = cloudinary.uploader.upload(
+        upload_result = _cloudinary_uploader().upload(
             file_obj,
             folder=folder,
             public_id=public_id,
@@ -80,7 +95,7 @@ def get_image_from_cloudinary(public_id):
     Returns: cloudinary_url
     """
     try:
-        resource = cloudinary.api.resource(public_id)
+        resource = _cloudinary_api().resource(public_id)
         return resource['secure_url']
     except Exception as e:
         print(f"❌ Cloudinary get image error: {e}")
@@ -92,7 +107,7 @@ def delete_image_from_cloudinary(public_id):
     Returns: success (bool)
     """
     try:
-        result = cloudinary.uploader.destroy(public_id)
+        result = _cloudinary_uploader().destroy(public_id)
         return result.get('result') == 'ok'
     except Exception as e:
         print(f"❌ Cloudinary delete error: {e}")
@@ -113,6 +128,8 @@ def prepare_image_for_face_detection(base64_image):
     Prepare image for face detection (same as current system)
     Returns: PIL Image object
     """
+    from PIL import Image
+
     if "," in base64_image:
         base64_image = base64_image.split(",")[1]
     
@@ -0,0 +1,85 @@
+"""
+Compact encodings for stored face descriptors
+Blobs written here start with a small header (magic, version, format) so several
+formats can coexist in face_encoding / FaceTemplate.descriptor. Untagged 512-byte
+blobs are the original raw float32 layout and keep decoding as before.
+"""
+
+import struct
+
+import numpy as np
+
+DESCRIPTOR_DIM = 128
+
+MAGIC = b'FD'
+CODEC_VERSION = 1
+HEADER = struct.Struct('<2sBB')  # magic, version, format id
+
+FORMAT_IDS = {
+    'float32': 1,
+    'float16': 2,
+    'int8': 3,
+}
+FORMAT_NAMES = {format_id: name for name, format_id in FORMAT_IDS.items()}
+
+# Size of the untagged float32 blobs written before this codec existed
+LEGACY_BLOB_SIZE = DESCRIPTOR_DIM * 4
+
+
+def encode_descriptor(vector, fmt='float32'):
+    """
+    Serialize a (normally unit-length) descriptor
+    fmt: 'float32' (516 bytes), 'float16' (260 bytes) or 'int8' (136 bytes, per-vector scale)
+    """
+    if fmt not in FORMAT_IDS:
+        raise ValueError(f"Unknown descriptor format: {fmt}")
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    header = HEADER.pack(MAGIC, CODEC_VERSION, FORMAT_IDS[fmt])
+
+    if fmt == 'float32':
+        return header + vector.tobytes()
+    if fmt == 'float16':
+        return header + vector.astype(np.float16).tobytes()
+
+    # int8: symmetric scaling so the largest component maps to +/-127
+    peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return header + struct.pack('<f', scale) + quantized.tobytes()
+
+
+def descriptor_format(blob):
+    """Format name of a stored blob ('legacy' for untagged raw float32)"""
+    blob = bytes(blob)
+    if len(blob) == LEGACY_BLOB_SIZE or len(blob) < HEADER.size:
+        return 'legacy'
+    magic, _, format_id = HEADER.unpack_from(blob)
+    if magic != MAGIC or format_id not in FORMAT_NAMES:
+        return 'legacy'
+    return FORMAT_NAMES[format_id]
+
+
+def decode_descriptor(blob):
+    """Deserialize any supported blob into a float32 vector"""
+    blob = bytes(blob)
+    fmt = descriptor_format(blob)
+    if fmt == 'legacy':
+        return np.frombuffer(blob, dtype=np.float32)
+
+    _, version, _ = HEADER.unpack_from(blob)
+    if version > CODEC_VERSION:
+        raise ValueError(f"Descriptor codec version {version} is newer than supported {CODEC_VERSION}")
+
+    payload = blob[HEADER.size:]
+    if fmt == 'float32':
+        return np.frombuffer(payload, dtype=np.float32)
+    if fmt == 'float16':
+        return np.frombuffer(payload, dtype=np.float16).astype(np.float32)
+
+    scale, = struct.unpack_from('<f', payload)
+    return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def is_quantized(blob):
+    """True for formats whose decoded vector is only approximately unit length"""
+    return descriptor_format(blob) in ('float16', 'int8')
@@ -0,0 +1,303 @@
+"""
+In-memory face gallery for 1:N identification
+Keeps every stored Employee.face_encoding in one contiguous, L2-normalized
+float32 matrix so a probe descriptor is matched with a single matrix-vector product
+Only the primary descriptor of each employee is indexed; FaceTemplate rows are
+used for 1:1 verification of that employee's own check-ins
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from .ann_index import IVFIndex
+from .face_snapshot import snapshot_lock, read_current_generation, write_snapshot, load_snapshot, generation_age
+from .utils import decode_face_encoding, normalize_descriptor
+
+DESCRIPTOR_DIM = 128
+
+# Rebuild from the DB (in the background) once the loaded gallery or snapshot generation
+# is this old, so writes made by other workers/hosts or by bulk_update()/update() paths
+# that skip the signals are eventually seen
+GALLERY_MAX_AGE_SECONDS = 300
+
+# Galleries at least this large are searched through an IVF index instead of brute force
+ANN_MIN_GALLERY_SIZE = 50000
+
+# IVF candidates fetched per requested match; they are re-scored exactly before ranking
+ANN_CANDIDATE_FACTOR = 4
+
+
+def _default_snapshot_dir():
+    from django.conf import settings
+    return getattr(settings, 'FACE_GALLERY_SNAPSHOT_DIR', None) or ''
+
+
+class FaceGallery:
+    """
+    Thread-safe gallery of normalized face descriptors
+
+    Readers grab an immutable (matrix, ids, names, rows) state so identification
+    never blocks on a concurrent add/remove; writers build the new arrays
+    under a lock and swap the state in one assignment.
+
+    Once the gallery reaches ann_min_size descriptors it also maintains an
+    IVFIndex; identification then only scores the probed inverted lists and
+    re-ranks those candidates exactly against the full matrix.
+
+    With a snapshot directory configured the matrix is an np.memmap of the shared
+    on-disk snapshot (see face_snapshot.py): workers boot without scanning the
+    Employee table. A registration/deletion is applied to the local gallery at once
+    and, after commit, a background thread rebuilds the snapshot from the DB as a
+    new generation that the other workers map on their next identify().
+
+    Only the very first load runs on the request path; max-age reloads and
+    snapshot rebuilds run on one background thread per process.
+    """
+
+    def __init__(self, max_age=GALLERY_MAX_AGE_SECONDS, ann_min_size=ANN_MIN_GALLERY_SIZE, snapshot_dir=None):
+        self._lock = threading.Lock()
+        self._max_age = max_age
+        self._ann_min_size = ann_min_size
+        self._snapshot_dir = snapshot_dir
+        self._generation = None
+        self._ann = None
+        self._loaded_at = None
+        self._state = (np.empty((0, DESCRIPTOR_DIM), dtype=np.float32), [], [], {})
+        self._rebuilder = None
+        self._rebuild_pending = False
+
+    def __len__(self):
+        return len(self._state[1])
+
+    @property
+    def snapshot_dir(self):
+        if self._snapshot_dir is None:
+            self._snapshot_dir = _default_snapshot_dir()
+        return self._snapshot_dir
+
+    def _install(self, matrix, ids, names, generation=None):
+        """Swap in a new state and bring the ANN index up to date; callers hold self._lock"""
+        old_matrix, _, _, old_rows = self._state
+        rows = {employee_id: row for row, employee_id in enumerate(ids)}
+
+        if len(ids) < self._ann_min_size:
+            self._ann = None
+        elif self._ann is None:
+            ann = IVFIndex(dim=DESCRIPTOR_DIM)
+            ann.train(matrix)
+            ann.add(ids, matrix)
+            self._ann = ann
+        else:
+            # Keep the trained index and only apply the difference to the previous state
+            for employee_id in old_rows.keys() - rows.keys():
+                self._ann.remove(employee_id)
+            kept = [employee_id for employee_id in ids if employee_id in old_rows]
+            kept_new = np.array([rows[employee_id] for employee_id in kept], dtype=np.intp)
+            kept_old = np.array([old_rows[employee_id] for employee_id in kept], dtype=np.intp)
+            changed = np.any(np.asarray(matrix)[kept_new] != np.asarray(old_matrix)[kept_old], axis=1)
+            updates = [employee_id for employee_id in ids if employee_id not in old_rows]
+            updates += [kept[i] for i in np.flatnonzero(changed)]
+            if updates:
+                self._ann.add(updates, np.asarray(matrix)[[rows[employee_id] for employee_id in updates]])
+
+        self._state = (matrix, ids, names, rows)
+        self._generation = generation
+        self._loaded_at = time.monotonic()
+
+    def _read_database(self):
+        from .models import Employee
+
+        rows = Employee.objects.exclude(face_encoding=None).values_list(
+            'employee_id', 'name', 'face_encoding', 'face_encoding_norm'
+        )
+
+        ids, names, vectors = [], [], []
+        for employee_id, name, face_encoding, face_encoding_norm in rows.iterator():
+            vector = decode_face_encoding(face_encoding, face_encoding_norm)
+            if vector.shape[0] != DESCRIPTOR_DIM:
+                print(f"⚠️ Skipping {employee_id}: descriptor has {vector.shape[0]} dims")
+                continue
+            ids.append(employee_id)
+            names.append(name)
+            vectors.append(vector)
+
+        if vectors:
+            # Rows are already unit length (decode_face_encoding normalizes legacy blobs)
+            matrix = np.vstack(vectors).astype(np.float32)
+        else:
+            matrix = np.empty((0, DESCRIPTOR_DIM), dtype=np.float32)
+        return np.ascontiguousarray(matrix), ids, names
+
+    def load(self):
+        """(Re)build the whole gallery from the Employee table, publishing a snapshot if configured"""
+        matrix, ids, names = self._read_database()
+
+        if self.snapshot_dir:
+            # Readers keep using the current state while the new generation is written
+            with snapshot_lock(self.snapshot_dir):
+                generation = write_snapshot(self.snapshot_dir, matrix, ids, names)
+            with self._lock:
+                self._install(*load_snapshot(self.snapshot_dir, generation), generation=generation)
+        else:
+            with self._lock:
+                self._install(matrix, ids, names)
+
+        print(f"🧠 Face gallery loaded with {len(ids)} descriptors"
+              f"{f' (IVF index, {self._ann.n_lists} lists)' if self._ann else ''}")
+
+    def _sync_with_snapshot(self):
+        """
+        Map the live snapshot generation if it changed; callers hold self._lock
+        Returns False when there is no usable snapshot on disk
+        """
+        generation = read_current_generation(self.snapshot_dir)
+        if generation is None:
+            return False
+        if generation != self._generation:
+            try:
+                self._install(*load_snapshot(self.snapshot_dir, generation), generation=generation)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Face snapshot {generation} unusable: {e}")
+                return False
+            print(f"🧠 Face gallery mapped snapshot {generation} ({len(self)} descriptors)")
+        return True
+
+    def ensure_loaded(self):
+        """Load on first use; later, schedule a background rebuild once the data is older than max_age"""
+        if self.snapshot_dir:
+            with self._lock:
+                mapped = self._sync_with_snapshot()
+            if not mapped:
+                # No snapshot yet (first boot): build it from the DB once
+                self.load()
+            elif generation_age(self._generation) > self._max_age:
+                self.request_rebuild(changed=False)
+            return
+
+        if self._loaded_at is None:
+            self.load()
+        elif time.monotonic() - self._loaded_at > self._max_age:
+            self.request_rebuild(changed=False)
+
+    def request_rebuild(self, changed=True):
+        """
+        Rebuild from the DB on the background thread (and publish a snapshot generation if configured)
+        changed: a write happened, so rebuild again if a rebuild already read the DB;
+        False for max-age refreshes, which a running rebuild already covers
+        """
+        with self._lock:
+            running = self._rebuilder is not None
+            if changed or not running:
+                self._rebuild_pending = True
+            if running:
+                return
+            self._rebuilder = threading.Thread(target=self._rebuild_loop, name='face-gallery-rebuild', daemon=True)
+            self._rebuilder.start()
+
+    def _rebuild_loop(self):
+        from django.db import connection
+        try:
+            while True:
+                with self._lock:
+                    if not self._rebuild_pending:
+                        self._rebuilder = None
+                        return
+                    self._rebuild_pending = False
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"❌ Face gallery rebuild failed: {e}")
+        finally:
+            connection.close()  # The thread's own DB connection
+
+    def _apply(self, change):
+        """
+        Apply change(matrix, ids, names, rows) -> (matrix, ids, names) or None to this worker's gallery
+        In snapshot mode the shared snapshot is then rebuilt from the DB after the
+        surrounding transaction commits, off the request path.
+        """
+        with self._lock:
+            if self.snapshot_dir:
+                self._sync_with_snapshot()
+            if self._loaded_at is None:
+                # Nothing cached yet; the first identify() will load everything
+                return
+            result = change(*self._state)
+            if result is not None:
+                matrix, ids, names = result
+                self._install(np.ascontiguousarray(matrix), ids, names, generation=self._generation)
+
+        if self.snapshot_dir and result is not None:
+            from django.db import transaction
+            transaction.on_commit(self.request_rebuild)
+
+    def add(self, employee_id, name, face_encoding, face_encoding_norm=None):
+        """Insert or replace one employee's descriptor"""
+        vector = decode_face_encoding(face_encoding, face_encoding_norm)
+        if vector.shape[0] != DESCRIPTOR_DIM:
+            return
+        vector = vector.reshape(1, -1)
+
+        def change(matrix, ids, names, rows):
+            if employee_id in rows:
+                row = rows[employee_id]
+                matrix = np.array(matrix)
+                matrix[row] = vector[0]
+                names = list(names)
+                names[row] = name
+                return matrix, ids, names
+            return np.vstack([matrix, vector]), ids + [employee_id], names + [name]
+
+        self._apply(change)
+
+    def remove(self, employee_id):
+        def change(matrix, ids, names, rows):
+            if employee_id not in rows:
+                return None
+            row = rows[employee_id]
+            return (np.delete(matrix, row, axis=0),
+                    ids[:row] + ids[row + 1:],
+                    names[:row] + names[row + 1:])
+
+        self._apply(change)
+
+    def identify(self, descriptor, top_k=5, exact=False):
+        """
+        Return up to top_k (employee_id, name, similarity) tuples, best first
+        descriptor: array-like of shape (128,)
+        exact: score every row even when the IVF index is active (no approximate misses)
+        """
+        self.ensure_loaded()
+        matrix, ids, names, rows = self._state
+        if not ids:
+            return []
+
+        probe, norm = normalize_descriptor(descriptor)
+        if norm == 0:
+            return []
+
+        ann = None if exact else self._ann
+        if ann is not None:
+            labels, _ = ann.search(probe, k=max(1, int(top_k)) * ANN_CANDIDATE_FACTOR)
+            candidate_rows = np.array([rows[label] for label in labels if label in rows], dtype=np.intp)
+            if candidate_rows.size == 0:
+                return []
+            scores = matrix[candidate_rows] @ probe
+            order = np.argsort(-scores)[:max(1, int(top_k))]
+            return [(ids[candidate_rows[i]], names[candidate_rows[i]], float(scores[i])) for i in order]
+
+        scores = matrix @ probe
+        top_k = max(1, min(int(top_k), scores.shape[0]))
+        if top_k < scores.shape[0]:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(scores.shape[0])
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [(ids[i], names[i], float(scores[i])) for i in candidates]
+
+
+# Process-wide gallery shared by the views and kept fresh by signals
+face_gallery = FaceGallery()
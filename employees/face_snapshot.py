@@ -0,0 +1,126 @@
+"""
+On-disk face gallery snapshot shared by all gunicorn workers
+A snapshot generation is a flat float32 .npy matrix plus a JSON employee-id index.
+The CURRENT file names the live generation and is swapped atomically, so workers can
+np.memmap the matrix read-only and the gallery lives once in the OS page cache.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no cross-worker lock needed
+    fcntl = None
+
+SNAPSHOT_FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+
+# Generations kept on disk besides the live one (workers may still be mapping them)
+KEEP_OLD_GENERATIONS = 1
+
+
+def _paths(snapshot_dir, generation):
+    return (
+        os.path.join(snapshot_dir, f'gallery-{generation}.npy'),
+        os.path.join(snapshot_dir, f'gallery-{generation}.json'),
+    )
+
+
+@contextmanager
+def snapshot_lock(snapshot_dir):
+    """Exclusive cross-process lock held while a worker rewrites the snapshot"""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, LOCK_FILE), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_current_generation(snapshot_dir):
+    """Name of the live generation, or None when no snapshot has been written yet"""
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE)) as current:
+            return current.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_age(generation):
+    """Seconds since a generation was written (its name starts with the write time in ns)"""
+    try:
+        return time.time() - int(generation.split('-')[0]) / 1e9
+    except (AttributeError, ValueError):
+        return float('inf')
+
+
+def write_snapshot(snapshot_dir, matrix, ids, names):
+    """
+    Write a new generation and make it live
+    Returns the generation name
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    generation = f'{time.time_ns()}-{os.getpid()}'
+    matrix_path, index_path = _paths(snapshot_dir, generation)
+
+    np.save(matrix_path, np.ascontiguousarray(matrix, dtype=np.float32))
+    with open(index_path, 'w') as index_file:
+        json.dump({
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'count': len(ids),
+            'dim': int(matrix.shape[1]),
+            'employee_ids': list(ids),
+            'names': list(names),
+        }, index_file)
+
+    # Atomic pointer swap: readers see either the old or the new generation, never a mix
+    current_tmp = os.path.join(snapshot_dir, f'{CURRENT_FILE}.{generation}.tmp')
+    with open(current_tmp, 'w') as current:
+        current.write(generation)
+    os.replace(current_tmp, os.path.join(snapshot_dir, CURRENT_FILE))
+
+    _remove_old_generations(snapshot_dir, generation)
+    return generation
+
+
+def load_snapshot(snapshot_dir, generation):
+    """
+    Map a generation read-only
+    Returns (matrix as np.memmap, employee_ids, names)
+    """
+    matrix_path, index_path = _paths(snapshot_dir, generation)
+    with open(index_path) as index_file:
+        index = json.load(index_file)
+    if index.get('version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported face snapshot version: {index.get('version')}")
+
+    matrix = np.load(matrix_path, mmap_mode='r')
+    if matrix.shape[0] != index['count']:
+        raise ValueError(f"Face snapshot {generation} is inconsistent: "
+                         f"{matrix.shape[0]} rows vs {index['count']} ids")
+    return matrix, index['employee_ids'], index['names']
+
+
+def _remove_old_generations(snapshot_dir, live_generation):
+    generations = sorted(
+        name[len('gallery-'):-len('.npy')]
+        for name in os.listdir(snapshot_dir)
+        if name.startswith('gallery-') and name.endswith('.npy')
+    )
+    stale = [generation for generation in generations if generation != live_generation]
+    for generation in stale[:max(0, len(stale) - KEEP_OLD_GENERATIONS)]:
+        for path in _paths(snapshot_dir, generation):
+            try:
+                # Unlinking is safe even if another worker still has the file mapped
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,293 @@
+"""
+Fast geofence distance engine
+Each OfficeLocation gets a precomputed local projection (meters per degree on the
+WGS84 ellipsoid at the office latitude) and a degree bounding box. A check is a
+bounding-box reject, then a flat-earth distance in that projection; the exact
+geopy geodesic is only computed when a point lands within a small band of the
+radius boundary, where the approximation could flip the decision.
+Offices with a boundary polygon use PolygonGeofence instead of the circle.
+"""
+
+import math
+
+import numpy as np
+
+from .utils import haversine_distances
+
+# Projected distances are accurate to centimetres within this range of the office;
+# beyond it the engine switches to haversine
+PROJECTION_MAX_METERS = 10000.0
+
+# Points whose approximate distance is this close to the radius get an exact geodesic check
+BOUNDARY_BAND_METERS = 1.0
+
+# Relative band used with haversine (spherical model, up to ~0.5% error)
+HAVERSINE_BAND_RATIO = 0.006
+
+# Polygon edges are bucketed into horizontal bands holding about this many edges each
+EDGES_PER_BUCKET = 4
+MAX_POLYGON_BUCKETS = 4096
+
+# Points per chunk when measuring many points against every polygon edge at once
+POLYGON_DISTANCE_CHUNK = 256
+
+
+def meters_per_degree(latitude):
+    """(meters per degree of latitude, meters per degree of longitude) on WGS84 at a latitude"""
+    phi = math.radians(latitude)
+    lat_meters = 111132.92 - 559.82 * math.cos(2 * phi) + 1.175 * math.cos(4 * phi) - 0.0023 * math.cos(6 * phi)
+    lon_meters = 111412.84 * math.cos(phi) - 93.5 * math.cos(3 * phi) + 0.118 * math.cos(5 * phi)
+    return lat_meters, lon_meters
+
+
+def geodesic_meters(lat1, lon1, lat2, lon2):
+    from geopy.distance import geodesic
+    return geodesic((lat1, lon1), (lat2, lon2)).meters
+
+
+class OfficeGeofence:
+    """Precomputed circle geofence for one office"""
+
+    def __init__(self, latitude, longitude, radius_meters):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.radius_meters = float(radius_meters)
+        self.lat_meters, self.lon_meters = meters_per_degree(self.latitude)
+
+        # Bounding box slightly larger than the circle so the reject never cuts a point inside it
+        margin = self.radius_meters + BOUNDARY_BAND_METERS
+        self.min_lat = self.latitude - margin / self.lat_meters
+        self.max_lat = self.latitude + margin / self.lat_meters
+        self.lon_span = margin / max(self.lon_meters, 1e-6)
+        self.min_lon = self.longitude - self.lon_span
+        self.max_lon = self.longitude + self.lon_span
+
+    def in_bounding_box(self, latitude, longitude):
+        if self.radius_meters > PROJECTION_MAX_METERS:
+            return True  # degree box from the local scale is not reliable for huge circles
+        # Longitude offset taken across the antimeridian when that is shorter
+        delta_lon = (longitude - self.longitude + 180.0) % 360.0 - 180.0
+        return self.min_lat <= latitude <= self.max_lat and abs(delta_lon) <= self.lon_span
+
+    def projected_distance(self, latitude, longitude):
+        """Flat-earth distance in meters using the office's local projection"""
+        delta_lon = (longitude - self.longitude + 180.0) % 360.0 - 180.0
+        dy = (latitude - self.latitude) * self.lat_meters
+        dx = delta_lon * self.lon_meters
+        return math.hypot(dx, dy)
+
+    def distance(self, latitude, longitude):
+        """Approximate distance in meters (projection nearby, haversine far away)"""
+        distance = self.projected_distance(latitude, longitude)
+        if distance <= PROJECTION_MAX_METERS:
+            return distance
+        return float(haversine_distances(self.latitude, self.longitude, latitude, longitude))
+
+    def outside_meters(self, distance):
+        """How far beyond the fence a point at this evaluate() distance is (0 inside)"""
+        return max(0.0, distance - self.radius_meters)
+
+    def evaluate(self, latitude, longitude):
+        """
+        Returns (distance_meters, is_inside)
+        The distance is exact (geodesic) whenever it decides a boundary case
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        distance = self.distance(latitude, longitude)
+        band = BOUNDARY_BAND_METERS if distance <= PROJECTION_MAX_METERS else HAVERSINE_BAND_RATIO * distance
+        if abs(distance - self.radius_meters) <= band:
+            distance = geodesic_meters(self.latitude, self.longitude, latitude, longitude)
+        return distance, distance <= self.radius_meters
+
+    def contains(self, latitude, longitude):
+        """Membership only; points outside the bounding box are rejected without any trigonometry"""
+        if not self.in_bounding_box(latitude, longitude):
+            return False
+        return self.evaluate(latitude, longitude)[1]
+
+
+class PolygonGeofence:
+    """
+    Precomputed polygon / multipolygon geofence for one office
+
+    Vertices are projected to local meters around the office point and every
+    edge is registered in the horizontal bands its y-range spans. Containment is
+    a bounding-box reject, one band lookup and an even-odd crossing count over
+    the handful of edges in that band (holes and multiple parts fall out of the
+    even-odd rule). Distances are 0 inside and to the nearest edge outside.
+    """
+
+    def __init__(self, latitude, longitude, polygons):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.lat_meters, self.lon_meters = meters_per_degree(self.latitude)
+
+        starts, ends = [], []
+        for rings in polygons:
+            for ring in rings:
+                xy = self._project(ring[:, 1], ring[:, 0])
+                starts.append(xy)
+                ends.append(np.roll(xy, -1, axis=0))
+        starts, ends = np.vstack(starts), np.vstack(ends)
+        self.x1, self.y1 = starts[:, 0].copy(), starts[:, 1].copy()
+        self.x2, self.y2 = ends[:, 0].copy(), ends[:, 1].copy()
+
+        # Circumscribed radius around the office point (used by the office index)
+        self.radius_meters = float(np.max(np.hypot(self.x1, self.y1)))
+
+        self.min_x, self.max_x = float(self.x1.min()), float(self.x1.max())
+        self.min_y, self.max_y = float(self.y1.min()), float(self.y1.max())
+        self.min_lat = self.latitude + self.min_y / self.lat_meters
+        self.max_lat = self.latitude + self.max_y / self.lat_meters
+        self.min_lon = self.longitude + self.min_x / max(self.lon_meters, 1e-6)
+        self.max_lon = self.longitude + self.max_x / max(self.lon_meters, 1e-6)
+
+        # Horizontal edges never cross a horizontal ray, so they are left out of the buckets
+        sloped = np.flatnonzero(self.y1 != self.y2)
+        self.n_buckets = int(min(MAX_POLYGON_BUCKETS, max(1, len(sloped) // EDGES_PER_BUCKET)))
+        self.bucket_height = max((self.max_y - self.min_y) / self.n_buckets, 1e-9)
+        low = self._bucket(np.minimum(self.y1[sloped], self.y2[sloped]))
+        high = self._bucket(np.maximum(self.y1[sloped], self.y2[sloped]))
+        members = [[] for _ in range(self.n_buckets)]
+        for edge, first, last in zip(sloped.tolist(), low.tolist(), high.tolist()):
+            for bucket in range(first, last + 1):
+                members[bucket].append(edge)
+        self.buckets = [np.array(edges, dtype=np.intp) for edges in members]
+
+    def _project(self, latitudes, longitudes):
+        delta_lon = (np.asarray(longitudes, dtype=np.float64) - self.longitude + 180.0) % 360.0 - 180.0
+        return np.column_stack([
+            delta_lon * self.lon_meters,
+            (np.asarray(latitudes, dtype=np.float64) - self.latitude) * self.lat_meters,
+        ])
+
+    def _bucket(self, y):
+        return np.clip(((np.asarray(y) - self.min_y) / self.bucket_height).astype(np.intp), 0, self.n_buckets - 1)
+
+    def _crossings(self, edges, px, py):
+        """Even-odd crossings of rays from (px, py) towards +x against the given edges; px/py may be arrays"""
+        x1, y1, x2, y2 = self.x1[edges], self.y1[edges], self.x2[edges], self.y2[edges]
+        px, py = np.asarray(px)[..., None], np.asarray(py)[..., None]
+        straddles = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        return np.sum(straddles & (px < x_cross), axis=-1)
+
+    def _edge_distances(self, px, py):
+        """Distance from each point to the nearest edge; px/py are 1-d arrays"""
+        dx, dy = self.x2 - self.x1, self.y2 - self.y1
+        length_sq = np.maximum(dx * dx + dy * dy, 1e-12)
+        result = np.empty(len(px))
+        for start in range(0, len(px), POLYGON_DISTANCE_CHUNK):
+            cx = px[start:start + POLYGON_DISTANCE_CHUNK, None]
+            cy = py[start:start + POLYGON_DISTANCE_CHUNK, None]
+            t = np.clip(((cx - self.x1) * dx + (cy - self.y1) * dy) / length_sq, 0.0, 1.0)
+            result[start:start + POLYGON_DISTANCE_CHUNK] = np.min(
+                np.hypot(self.x1 + t * dx - cx, self.y1 + t * dy - cy), axis=1
+            )
+        return result
+
+    def _contains_xy(self, px, py):
+        if not (self.min_x <= px <= self.max_x and self.min_y <= py <= self.max_y):
+            return False
+        edges = self.buckets[int(self._bucket(py))]
+        return bool(edges.size) and int(self._crossings(edges, px, py)) % 2 == 1
+
+    def evaluate(self, latitude, longitude):
+        """Returns (distance_meters, is_inside); the distance is 0 inside the boundary"""
+        px, py = self._project([float(latitude)], [float(longitude)])[0]
+        if self._contains_xy(px, py):
+            return 0.0, True
+        return float(self._edge_distances(np.array([px]), np.array([py]))[0]), False
+
+    def distance(self, latitude, longitude):
+        return self.evaluate(latitude, longitude)[0]
+
+    def outside_meters(self, distance):
+        return distance  # Polygon distances are already measured from the boundary
+
+    def contains(self, latitude, longitude):
+        px, py = self._project([float(latitude)], [float(longitude)])[0]
+        return self._contains_xy(px, py)
+
+    def evaluate_many(self, latitudes, longitudes):
+        """Vectorized evaluate(): (distances_meters, is_inside) arrays for many points"""
+        xy = self._project(latitudes, longitudes)
+        px, py = xy[:, 0], xy[:, 1]
+        inside = np.zeros(len(px), dtype=bool)
+        in_box = np.flatnonzero((px >= self.min_x) & (px <= self.max_x) & (py >= self.min_y) & (py <= self.max_y))
+        buckets = self._bucket(py[in_box])
+        for bucket in np.unique(buckets):
+            points = in_box[buckets == bucket]
+            edges = self.buckets[bucket]
+            if edges.size:
+                inside[points] = self._crossings(edges, px[points], py[points]) % 2 == 1
+        distances = np.zeros(len(px))
+        outside = np.flatnonzero(~inside)
+        if outside.size:
+            distances[outside] = self._edge_distances(px[outside], py[outside])
+        return distances, inside
+
+
+def make_geofence(latitude, longitude, radius_meters, boundary=None):
+    """PolygonGeofence when the office has an encoded boundary, otherwise the radius circle"""
+    if boundary:
+        from .boundary_codec import decode_boundary
+        return PolygonGeofence(latitude, longitude, decode_boundary(boundary))
+    return OfficeGeofence(latitude, longitude, radius_meters)
+
+
+# Geofences are cached per office and rebuilt when its coordinates, radius or boundary change
+_geofence_cache = {}
+
+
+def get_office_geofence(office):
+    boundary = bytes(office.boundary) if office.boundary else None
+    key = (office.latitude, office.longitude, office.radius_meters, boundary)
+    cached = _geofence_cache.get(office.pk)
+    if cached is None or cached[0] != key:
+        cached = (key, make_geofence(*key))
+        _geofence_cache[office.pk] = cached
+    return cached[1]
+
+
+def evaluate_points(latitudes, longitudes, office_latitudes, office_longitudes, radii):
+    """
+    Vectorized geofence check for arrays of points, each against its own office circle
+    Returns (distances_meters, is_inside) numpy arrays; near-boundary points are
+    re-measured with the exact geodesic
+    """
+    latitudes, longitudes, office_latitudes, office_longitudes, radii = (
+        np.asarray(x, dtype=np.float64) for x in (latitudes, longitudes, office_latitudes, office_longitudes, radii)
+    )
+    distances = haversine_distances(office_latitudes, office_longitudes, latitudes, longitudes)
+    near_boundary = np.abs(distances - radii) <= np.maximum(BOUNDARY_BAND_METERS, HAVERSINE_BAND_RATIO * distances)
+    for i in np.flatnonzero(near_boundary):
+        distances[i] = geodesic_meters(office_latitudes[i], office_longitudes[i], latitudes[i], longitudes[i])
+    return distances, distances <= radii
+
+
+def evaluate_offices(latitudes, longitudes, offices):
+    """
+    Vectorized geofence check of point i against offices[i] (OfficeLocation instances)
+    Circles go through evaluate_points; points of each polygon office are checked together
+    Returns (distances_meters, is_inside) numpy arrays
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    distances, inside = evaluate_points(
+        latitudes, longitudes,
+        [office.latitude for office in offices], [office.longitude for office in offices],
+        [office.radius_meters for office in offices]
+    )
+
+    by_polygon = {}
+    for position, office in enumerate(offices):
+        if office.boundary:
+            by_polygon.setdefault(office.pk, (office, []))[1].append(position)
+    for office, positions in by_polygon.values():
+        positions = np.array(positions, dtype=np.intp)
+        distances[positions], inside[positions] = get_office_geofence(office).evaluate_many(
+            latitudes[positions], longitudes[positions]
+        )
+    return distances, inside
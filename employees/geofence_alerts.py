@@ -0,0 +1,129 @@
+"""
+Debounced geofence-exit alerts
+One LocationAlert per excursion instead of one per outside ping. Every employee
+runs a small state machine whose state lives in the Django cache:
+
+    inside --outside by more than the exit margin for the dwell time--> outside  (alert opened)
+    outside --back inside the fence for the dwell time--> inside                 (alert closed)
+
+Pings outside the fence but within the exit margin never start an excursion
+(hysteresis against GPS jitter at the boundary). While outside, the open alert's
+distance, max distance, ping count and last_seen_at are refreshed at most every
+ALERT_REFRESH_SECONDS, or immediately when the max distance grows.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import LocationAlert
+
+STATE_INSIDE = 'inside'
+STATE_LEAVING = 'leaving'
+STATE_OUTSIDE = 'outside'
+STATE_RETURNING = 'returning'
+
+# How often an open alert is rewritten while the employee stays outside
+ALERT_REFRESH_SECONDS = 60
+
+# Cached states expire after a quiet day; the next ping rebuilds them from the open alert
+STATE_TTL_SECONDS = 86400
+
+
+def _cache_key(employee_pk):
+    return f'geofence-state:{employee_pk}'
+
+
+def _initial_state(employee):
+    """State from the DB (cache miss only): outside if the employee has an open alert"""
+    alert = LocationAlert.objects.filter(employee=employee, ended_at__isnull=True).order_by('-timestamp').first()
+    if alert is None:
+        return {'state': STATE_INSIDE, 'since': None, 'alert_id': None}
+    return {
+        'state': STATE_OUTSIDE,
+        'since': None,
+        'alert_id': alert.pk,
+        'max_distance': (alert.max_distance or alert.distance) * 1000,
+        'pings': alert.ping_count,
+        'refreshed_at': alert.last_seen_at or alert.timestamp,
+    }
+
+
+def track_geofence(employee, latitude, longitude, distance_meters, outside_meters, at=None):
+    """
+    Feed one location ping into the employee's excursion state machine
+    outside_meters: how far beyond the fence the ping is (0 when inside)
+    Returns 'opened', 'closed', 'updated' or None
+    """
+    at = at or timezone.now()
+    exit_margin = settings.GEOFENCE_EXIT_MARGIN_METERS
+    dwell = settings.GEOFENCE_MIN_DWELL_SECONDS
+
+    key = _cache_key(employee.pk)
+    state = cache.get(key)
+    if state is None:
+        state = _initial_state(employee)
+
+    event = None
+    current = state['state']
+    if current == STATE_INSIDE:
+        if outside_meters > exit_margin:
+            state.update(state=STATE_LEAVING, since=at)
+
+    elif current == STATE_LEAVING:
+        if outside_meters <= 0:
+            state.update(state=STATE_INSIDE, since=None)
+        elif outside_meters > exit_margin and (at - state['since']).total_seconds() >= dwell:
+            alert = LocationAlert.objects.create(
+                employee=employee,
+                latitude=latitude,
+                longitude=longitude,
+                distance=distance_meters / 1000,  # Convert to km
+                max_distance=distance_meters / 1000,
+                last_seen_at=at,
+                office_name=employee.office.name
+            )
+            # timestamp is auto_now_add; the excursion started when the employee first left
+            LocationAlert.objects.filter(pk=alert.pk).update(timestamp=state['since'])
+            state.update(state=STATE_OUTSIDE, alert_id=alert.pk, max_distance=distance_meters,
+                         pings=1, refreshed_at=at)
+            event = 'opened'
+
+    elif current == STATE_OUTSIDE:
+        if outside_meters <= 0:
+            state.update(state=STATE_RETURNING, since=at)
+        else:
+            state['pings'] += 1
+            grew = distance_meters > state['max_distance']
+            state['max_distance'] = max(state['max_distance'], distance_meters)
+            if grew or (at - state['refreshed_at']).total_seconds() >= ALERT_REFRESH_SECONDS:
+                updated = LocationAlert.objects.filter(pk=state['alert_id'], ended_at__isnull=True).update(
+                    latitude=latitude,
+                    longitude=longitude,
+                    distance=distance_meters / 1000,
+                    max_distance=state['max_distance'] / 1000,
+                    last_seen_at=at,
+                    ping_count=state['pings']
+                )
+                if not updated:
+                    # Closed or deleted elsewhere (another worker, an admin): start over from this ping
+                    cache.delete(key)
+                    return track_geofence(employee, latitude, longitude, distance_meters, outside_meters, at)
+                state['refreshed_at'] = at
+                event = 'updated'
+
+    elif current == STATE_RETURNING:
+        if outside_meters > 0:
+            state.update(state=STATE_OUTSIDE, since=None)
+        elif (at - state['since']).total_seconds() >= dwell:
+            LocationAlert.objects.filter(pk=state['alert_id'], ended_at__isnull=True).update(
+                ended_at=state['since'],
+                last_seen_at=state['since'],
+                max_distance=state['max_distance'] / 1000,
+                ping_count=state['pings']
+            )
+            state = {'state': STATE_INSIDE, 'since': None, 'alert_id': None}
+            event = 'closed'
+
+    cache.set(key, state, STATE_TTL_SECONDS)
+    return event
@@ -0,0 +1,130 @@
+"""
+Incremental polling for the live location endpoints
+A poll with ?since=<cursor> gets only the employees whose presence record changed
+after the cursor (EmployeePresence.updated_at, indexed), whose online status lapsed
+since then, or who have a newer position in the write-behind buffer, plus the
+public ids of the employees deleted since then (EmployeeTombstone).
+
+Conditional GET: presence_fingerprint() sums up everything a poll's response depends
+on with two aggregate queries, one query over the recently active employees and one
+heartbeat get_many, so a poll whose If-None-Match / If-Modified-Since still holds is
+answered 304 before any employee is loaded or serialized.
+"""
+
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Employee, EmployeeTombstone
+from .presence import ONLINE_LOCATION_WINDOW, LOCATION_HEARTBEAT_SECONDS, online_heartbeats, presence_status
+
+# Deleted employees are reported this long; an older cursor gets the full list instead
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+# Cursors are moved back by this much, so a write still committing while a poll read is in the next delta
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+# A heartbeat can keep an employee online this much longer than their stored location
+HEARTBEAT_SLACK = timedelta(seconds=LOCATION_HEARTBEAT_SECONDS)
+
+
+def parse_cursor(value):
+    """Aware datetime from a ?since= cursor; raises ValueError with a message for the client"""
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValueError("since must be an ISO 8601 timestamp (the cursor of a previous response)")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def next_cursor(now):
+    """Cursor for the client's next poll, for a response read at `now` (UTC with Z: no '+' to URL-encode)"""
+    return (now - CURSOR_OVERLAP).astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def is_full_resync(since, now):
+    """No cursor, or one older than the kept tombstones (removals could be missed): send every employee"""
+    return since is None or since < now - TOMBSTONE_RETENTION
+
+
+def changed_since(queryset, since, buffered, now):
+    """
+    Employees of queryset whose entry may differ from what a poll at `since` returned:
+    presence record written after it, status lapsed since (last location plus the online
+    window, or the heartbeat trailing it, passed in between) or a newer buffered position
+    """
+    changed = Q(presence__updated_at__gt=since) | Q(
+        presence__last_location_at__gt=since - ONLINE_LOCATION_WINDOW - HEARTBEAT_SLACK,
+        presence__last_location_at__lte=now - ONLINE_LOCATION_WINDOW
+    )
+    newer = [employee_pk for employee_pk, location in buffered.items() if location.timestamp > since]
+    if newer:
+        changed |= Q(pk__in=newer)
+    return queryset.filter(changed)
+
+
+def record_removal(employee_id):
+    """Tombstone for a deleted employee; tombstones past TOMBSTONE_RETENTION are pruned on the way"""
+    now = timezone.now()
+    EmployeeTombstone.objects.create(employee_id=employee_id)
+    EmployeeTombstone.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+
+def removed_since(since, present_ids=()):
+    """Public ids deleted after `since`, less those in present_ids (since re-created)"""
+    removed = EmployeeTombstone.objects.filter(deleted_at__gt=since).values_list('employee_id', flat=True)
+    return sorted(set(removed) - set(present_ids))
+
+
+def presence_fingerprint(buffered, now, *variant):
+    """
+    (etag, last_modified) of the live location state; both move whenever a poll's response would
+    buffered: location_buffer.latest(); variant: anything else the response depends on
+    last_modified is a Unix timestamp (or None) as django.utils.cache expects
+    """
+    lapsed = now - ONLINE_LOCATION_WINDOW
+    summary = Employee.objects.aggregate(
+        employees=Count('pk'),
+        changed=Max('presence__updated_at'),
+        location_lapsed=Max('presence__last_location_at', filter=Q(presence__last_location_at__lte=lapsed)),
+        heartbeat_lapsed=Max('presence__last_location_at',
+                             filter=Q(presence__last_location_at__lte=lapsed - HEARTBEAT_SLACK)),
+    )
+    removed = EmployeeTombstone.objects.aggregate(removed=Max('deleted_at'))['removed']
+
+    # Only employees active within the window (plus heartbeat slack) can be online
+    recent = Employee.objects.filter(
+        Q(presence__last_location_at__gte=lapsed - HEARTBEAT_SLACK) | Q(pk__in=list(buffered))
+    ).values_list('pk', 'employee_id', 'presence__last_location_at', 'presence__is_sharing')
+    online = set()
+    candidates = []
+    for employee_pk, employee_id, location_at, is_sharing in recent:
+        newer = buffered.get(employee_pk)
+        if newer is not None and (location_at is None or newer.timestamp >= location_at):
+            location_at, is_sharing = newer.timestamp, newer.is_active
+        if location_at is not None and presence_status(location_at, is_sharing, None, now)[0]:
+            online.add(employee_id)
+        else:
+            candidates.append(employee_id)
+    online.update(online_heartbeats(candidates))
+
+    state = (
+        variant, summary['employees'], summary['changed'], removed, sorted(online),
+        sorted((employee_pk, location.timestamp, location.is_active) for employee_pk, location in buffered.items())
+    )
+    etag = f'"{hashlib.md5(repr(state).encode()).hexdigest()}"'
+
+    times = [summary['changed'], removed] + [location.timestamp for location in buffered.values()]
+    if summary['location_lapsed'] is not None:
+        times.append(summary['location_lapsed'] + ONLINE_LOCATION_WINDOW)
+    if summary['heartbeat_lapsed'] is not None:
+        times.append(summary['heartbeat_lapsed'] + ONLINE_LOCATION_WINDOW + HEARTBEAT_SLACK)
+    times = [at for at in times if at is not None and at <= now]
+    return etag, int(max(times).timestamp()) if times else None
@@ -0,0 +1,221 @@
+"""
+Push stream of live position/status deltas for admin dashboards (Server-Sent Events over ASGI)
+The write paths (location_update, the bulk endpoints, attendance, the status sync)
+call publish_*(). Each event is encoded once and handed to the subscribers of this
+process with one event-loop wakeup, so a hundred open dashboards cost a hundred
+queue appends per event and no DB reads; only the snapshot sent on connect queries.
+
+settings.LIVE_STREAM_BACKEND selects the broker: LocalBroker fans out inside one
+process (runserver, a single worker); RedisBroker relays events through Redis
+pub/sub so every worker holds one subscription and fans out locally. A broker that
+is not cross_process only streams when settings.WEB_CONCURRENCY is 1.
+"""
+
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Comment line sent when nothing happened for this long, so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+# Events a dashboard may fall behind by before its stream is reset (it reconnects and gets a new snapshot)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Reconnect delay suggested to EventSource clients
+RETRY_MILLISECONDS = 5000
+
+
+def encode_event(event_type, payload):
+    """One SSE frame, encoded once and shared by every subscriber"""
+    return f"event: {event_type}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n".encode()
+
+
+class Subscriber:
+    """One open stream: its office filter and a bounded queue of encoded frames"""
+
+    def __init__(self, loop, office_ids=None):
+        self.loop = loop
+        self.office_ids = frozenset(office_ids) if office_ids else None
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, office_id):
+        return self.office_ids is None or office_id in self.office_ids
+
+    def offer(self, frame):
+        """Queue a frame; runs on the subscriber's event loop"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True  # The stream loop sees the flag and resets the client
+
+
+class LocalBroker:
+    """
+    In-process fan-out
+    publish() may be called from any thread (sync views run in worker threads);
+    delivery hops onto each subscriber loop once per event, not once per subscriber.
+    """
+
+    # Subscribers see events published by other worker processes
+    cross_process = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # event loop -> set of Subscriber
+
+    def subscribe(self, office_ids=None):
+        """Register a stream; call from the coroutine that will read its queue"""
+        subscriber = Subscriber(asyncio.get_running_loop(), office_ids)
+        with self._lock:
+            self._subscribers.setdefault(subscriber.loop, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.loop)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.loop]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event_type, office_id, payload):
+        if self._subscribers:  # Nobody watching in this process: skip the encoding
+            self.dispatch(office_id, encode_event(event_type, payload))
+
+    def dispatch(self, office_id, frame):
+        """Hand an encoded frame to the local subscribers of office_id"""
+        with self._lock:
+            targets = [(loop, list(subscribers)) for loop, subscribers in self._subscribers.items()]
+        for loop, subscribers in targets:
+            subscribers = [subscriber for subscriber in subscribers if subscriber.wants(office_id)]
+            if subscribers and not loop.is_closed():
+                loop.call_soon_threadsafe(_deliver, subscribers, frame)
+
+
+def _deliver(subscribers, frame):
+    for subscriber in subscribers:
+        subscriber.offer(frame)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Cross-worker fan-out through Redis pub/sub (needs the redis package)
+    Events are published to one channel; each process runs one listener thread,
+    started with its first subscriber, that feeds the local fan-out.
+    """
+
+    cross_process = True
+
+    def __init__(self, url=None, channel='live-locations'):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("LIVE_STREAM_BACKEND RedisBroker needs the redis package (pip install redis)")
+        self._redis = redis.Redis.from_url(url or settings.LIVE_STREAM_REDIS_URL)
+        self._channel = channel
+        self._listener = None
+
+    def subscribe(self, office_ids=None):
+        self._ensure_listener()
+        return super().subscribe(office_ids)
+
+    def publish(self, event_type, office_id, payload):
+        message = json.dumps([office_id, encode_event(event_type, payload).decode()])
+        self._redis.publish(self._channel, message)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='live-stream-redis', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._channel)
+        for message in pubsub.listen():
+            try:
+                office_id, frame = json.loads(message['data'])
+                self.dispatch(office_id, frame.encode())
+            except (ValueError, TypeError) as e:
+                print(f"❌ Bad live stream message: {e}")
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Process-wide broker built from settings.LIVE_STREAM_BACKEND"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'LIVE_STREAM_BACKEND', 'employees.live_stream.LocalBroker'))()
+    return _broker
+
+
+def _publish(event_type, office_id, payload):
+    # After commit, so dashboards never see a write that was rolled back
+    def send():
+        try:
+            get_broker().publish(event_type, office_id, payload)
+        except Exception as e:
+            print(f"❌ Live stream publish failed: {e}")
+    transaction.on_commit(send)
+
+
+def location_payload(employee, location, is_online):
+    """Dashboard entry for an employee's position (shared by the snapshot and the deltas)"""
+    return {
+        'employee_id': employee.employee_id,
+        'employee_name': employee.name,
+        'office_id': employee.office_id,
+        'latitude': location.latitude if location else None,
+        'longitude': location.longitude if location else None,
+        'is_in_office_radius': location.is_in_office_radius if location else False,
+        'distance_from_office': location.distance_from_office if location else None,
+        'last_updated': location.timestamp.isoformat() if location else None,
+        'status': 'online' if is_online else 'offline',
+        'is_sharing': bool(location and location.is_active and is_online),
+    }
+
+
+def publish_location(employee, location):
+    """A stored position (the employee is sharing, so online)"""
+    _publish('location', employee.office_id, location_payload(employee, location, True))
+
+
+def publish_status(employee, is_online):
+    """Online/offline change without a new position (sharing stopped, status sync)"""
+    _publish('status', employee.office_id, {
+        'employee_id': employee.employee_id,
+        'office_id': employee.office_id,
+        'status': 'online' if is_online else 'offline',
+        'is_sharing': is_online,
+    })
+
+
+def publish_attendance(employee, attendance, office_name=None):
+    _publish('attendance', employee.office_id, {
+        'employee_id': employee.employee_id,
+        'employee_name': employee.name,
+        'office_id': employee.office_id,
+        'action': attendance.action,
+        'office_name': office_name,
+        'timestamp': attendance.timestamp.isoformat() if attendance.timestamp else None,
+    })
@@ -0,0 +1,276 @@
+"""
+Write-behind buffer for live employee locations
+location_update puts the latest EmployeeLocation per employee here instead of
+writing it synchronously; a background thread flushes the coalesced rows with one
+bulk_create + bulk_update per interval. Pings replaced before a flush never hit
+the DB. The employees' presence records and appended LocationHistory points ride
+along in the same transaction.
+Rows leave the buffer only after their flush transaction commits, so a
+failed flush is retried and a crash loses at most one flush interval of pings.
+
+The buffer is per process. Under several gunicorn workers, reads overlay only
+this worker's buffer, so another worker's live view of an employee can lag by up
+to one flush interval. When pings of one employee reach several workers the newest
+fix wins: a flush skips employees whose stored location is newer than the buffered
+one (and drops that stale entry), so neither EmployeeLocation nor the presence
+record moves backwards. Each flush reuses the employee's existing active row and
+deactivates any other, so the employee still keeps a single active EmployeeLocation.
+"""
+
+import atexit
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+
+# Fields written by a flush (employee and pk never change for a buffered row)
+FLUSH_FIELDS = [
+    'latitude', 'longitude', 'lat_cell', 'lon_cell', 'is_in_office_radius', 'distance_from_office', 'timestamp',
+    'is_active',
+]
+
+
+class LocationBuffer:
+    """
+    Per-process latest-position buffer keyed by employee pk
+
+    Buffered objects are never mutated after put(); a newer ping replaces the
+    object, which is what lets the flush run without holding the lock during the DB write.
+    Flushed rows stay as clean entries for clean_ttl seconds so the next ping
+    can be compared without reading the DB.
+    """
+
+    def __init__(self, flush_interval=None, max_pending=None, clean_ttl=120):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._clean_ttl = clean_ttl
+        self._entries = {}  # employee pk -> (EmployeeLocation, dirty, buffered_at)
+        self._pending = 0  # Dirty entries, kept as a running count so put() stays O(1)
+        self._history = []  # LocationHistory rows waiting for their bulk_create
+        self._thread = None
+        self._metrics = {
+            'pings': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'flushed_rows': 0,
+            'history_rows': 0,
+            'failed_flushes': 0,
+            'stale_rows': 0,
+            'last_flush_rows': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+        }
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'LOCATION_BUFFER_ENABLED', True)
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is None:
+            return getattr(settings, 'LOCATION_FLUSH_INTERVAL_SECONDS', 5.0)
+        return self._flush_interval
+
+    @property
+    def max_pending(self):
+        if self._max_pending is None:
+            return getattr(settings, 'LOCATION_BUFFER_MAX_PENDING', 5000)
+        return self._max_pending
+
+    def get(self, employee_pk):
+        """Latest buffered active location for an employee, or None (caller falls back to the DB)"""
+        entry = self._entries.get(employee_pk)
+        if entry is None:
+            return None
+        location, dirty, buffered_at = entry
+        if not dirty and time.monotonic() - buffered_at > self._clean_ttl:
+            return None
+        return location if location.is_active else None
+
+    def latest(self):
+        """{employee pk: EmployeeLocation} of every buffered row, active or not (for overlaying DB reads)"""
+        return {employee_pk: entry[0] for employee_pk, entry in self._entries.items()}
+
+    def put(self, location):
+        """Buffer a new latest location (an EmployeeLocation that is not mutated afterwards)"""
+        with self._lock:
+            previous = self._entries.get(location.employee_id)
+            if previous is not None:
+                if previous[1]:
+                    self._metrics['coalesced'] += 1
+                if location.pk is None:
+                    location.pk = previous[0].pk  # Update the row already created for this employee
+            if previous is None or not previous[1]:
+                self._pending += 1
+            self._entries[location.employee_id] = (location, True, time.monotonic())
+            self._metrics['pings'] += 1
+            pending = self._pending
+        self._ensure_thread()
+
+        if pending >= self.max_pending:
+            self.flush()
+
+    def append_history(self, points):
+        """Queue LocationHistory rows for the next flush"""
+        with self._lock:
+            self._history.extend(points)
+            pending = len(self._history)
+        self._ensure_thread()
+
+        if pending >= self.max_pending:
+            self.flush()
+
+    def deactivate(self, employee_pk):
+        """Mark a buffered location inactive (location sharing turned off)"""
+        with self._lock:
+            entry = self._entries.get(employee_pk)
+            if entry is None or not entry[0].is_active:
+                return
+            location = copy.copy(entry[0])
+            location.is_active = False
+            if not entry[1]:
+                self._pending += 1
+            self._entries[employee_pk] = (location, True, time.monotonic())
+
+    def flush(self):
+        """Write every dirty row in one transaction; returns the number of rows written"""
+        from .models import EmployeeLocation, LocationHistory
+        from .presence import record_location_presence
+
+        with self._flush_lock:
+            with self._lock:
+                dirty = {employee_pk: entry[0] for employee_pk, entry in self._entries.items() if entry[1]}
+                history, self._history = self._history, []
+            if not dirty and not history:
+                return 0
+
+            start = time.perf_counter()
+            unsaved = [location for location in dirty.values() if location.pk is None]
+            # bulk_create applies auto_now_add, so the fix times are put back afterwards
+            fix_times = [location.timestamp for location in unsaved]
+            new = []
+            stale = set()
+            try:
+                with transaction.atomic():
+                    if dirty:
+                        # Newest stored fix per employee, whichever worker wrote it; older buffered pings are dropped
+                        stored = dict(EmployeeLocation.objects.filter(employee_id__in=list(dirty)).values(
+                            'employee_id'
+                        ).annotate(latest=Max('timestamp')).values_list('employee_id', 'latest'))
+                        stale = {employee_pk for employee_pk, location in dirty.items()
+                                 if stored.get(employee_pk) is not None and stored[employee_pk] > location.timestamp}
+                    writes = {employee_pk: location for employee_pk, location in dirty.items()
+                              if employee_pk not in stale}
+                    fresh = [location for location in unsaved if location.employee_id not in stale]
+                    if fresh:
+                        # Update-or-create: another worker may already have created the employee's active row
+                        adopted = {}
+                        for employee_pk, pk in EmployeeLocation.objects.filter(
+                            employee_id__in=[location.employee_id for location in fresh], is_active=True
+                        ).order_by('employee_id', '-timestamp', '-pk').values_list('employee_id', 'pk'):
+                            adopted.setdefault(employee_pk, pk)
+                        for location in fresh:
+                            location.pk = adopted.get(location.employee_id)
+                        new = [location for location in fresh if location.pk is None]
+                    if new:
+                        EmployeeLocation.objects.bulk_create(new)
+                        for location, fix_time in zip(unsaved, fix_times):
+                            location.timestamp = fix_time
+                    if writes:
+                        existing = list(writes.values())
+                        EmployeeLocation.objects.bulk_update(existing, FLUSH_FIELDS)
+                        # Rows other workers created for the same employees stop being live
+                        EmployeeLocation.objects.filter(employee_id__in=list(writes), is_active=True).exclude(
+                            pk__in=[location.pk for location in existing]
+                        ).update(is_active=False)
+                        record_location_presence(existing)
+                    if history:
+                        LocationHistory.objects.bulk_create(history)
+            except Exception as e:
+                # Roll the buffered objects back to their pre-flush state (the rows were not committed)
+                for location, fix_time in zip(unsaved, fix_times):
+                    location.pk = None
+                    location.timestamp = fix_time
+                for point in history:
+                    point.pk = None
+                with self._lock:
+                    self._history[:0] = history
+                self._metrics['failed_flushes'] += 1
+                print(f"❌ Location buffer flush failed, {len(dirty)} rows and {len(history)} history points "
+                      f"kept for retry: {e}")
+                return 0
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                for employee_pk, location in dirty.items():
+                    current = self._entries.get(employee_pk)
+                    if current is None:
+                        continue
+                    if employee_pk in stale:
+                        if current[0] is location:
+                            # Another worker stored a newer fix: forget this one so reads fall back to the DB
+                            del self._entries[employee_pk]
+                            self._pending -= 1
+                        continue
+                    if current[0] is location:
+                        self._entries[employee_pk] = (location, False, time.monotonic())
+                        self._pending -= 1
+                    elif current[0].pk is None:
+                        current[0].pk = location.pk  # A newer ping arrived while its row was being created
+                self._metrics['flushes'] += 1
+                self._metrics['flushed_rows'] += len(dirty) - len(stale)
+                self._metrics['stale_rows'] += len(stale)
+                self._metrics['history_rows'] += len(history)
+                self._metrics['last_flush_rows'] = len(dirty) - len(stale)
+                self._metrics['last_flush_ms'] = round(elapsed_ms, 2)
+                self._metrics['max_flush_ms'] = round(max(self._metrics['max_flush_ms'], elapsed_ms), 2)
+                self._evict_clean()
+
+            print(f"💾 Flushed {len(dirty) - len(stale)} buffered locations ({len(new)} new, {len(stale)} stale "
+                  f"skipped) and {len(history)} history points in {elapsed_ms:.1f} ms")
+            return len(dirty) - len(stale)
+
+    def _evict_clean(self):
+        """Drop clean entries past their TTL; callers hold self._lock"""
+        cutoff = time.monotonic() - self._clean_ttl
+        for employee_pk in [pk for pk, entry in self._entries.items() if not entry[1] and entry[2] < cutoff]:
+            del self._entries[employee_pk]
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = self._pending
+            metrics['pending_history'] = len(self._history)
+            metrics['buffered'] = len(self._entries)
+        metrics['flush_interval_seconds'] = self.flush_interval
+        return metrics
+
+    def _ensure_thread(self):
+        # Started lazily so every forked gunicorn worker gets its own flusher
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='location-buffer-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+# Process-wide buffer used by location_update and the live location views
+location_buffer = LocationBuffer()
+
+# Graceful shutdown (gunicorn worker restart, SIGTERM) writes whatever is pending
+atexit.register(location_buffer.flush)
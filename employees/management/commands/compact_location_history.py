@@ -0,0 +1,123 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from employees.models import LocationHistory
+
+HISTORY_FIELDS = ('employee_id', 'bucket_start', 'latitude', 'longitude', 'is_in_office_radius',
+                  'distance_from_office', 'point_count')
+
+
+def bucket_floor(moment, seconds):
+    """Start of the `seconds`-long bucket containing an aware datetime (buckets aligned to the epoch)"""
+    epoch_seconds = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % seconds, tz=dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = ('Downsample aging location history (raw points -> per minute -> per 15 minutes) and drop buckets '
+            'past retention. Run it from cron, e.g. hourly: python manage.py compact_location_history')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--raw-days', type=float, default=settings.LOCATION_HISTORY_RAW_DAYS,
+                            help='Keep raw points this many days (default: settings.LOCATION_HISTORY_RAW_DAYS)')
+        parser.add_argument('--minute-days', type=float, default=settings.LOCATION_HISTORY_MINUTE_DAYS,
+                            help='Keep per-minute buckets this many days (default: settings.LOCATION_HISTORY_MINUTE_DAYS)')
+        parser.add_argument('--retention-days', type=float, default=settings.LOCATION_HISTORY_RETENTION_DAYS,
+                            help='Delete anything older (default: settings.LOCATION_HISTORY_RETENTION_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Employees compacted per transaction (default: 200)')
+
+    def handle(self, *args, **options):
+        if not 0 < options['raw_days'] <= options['minute_days'] <= options['retention_days']:
+            raise CommandError('Expected 0 < --raw-days <= --minute-days <= --retention-days')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        start = time.perf_counter()
+        now = timezone.now()
+        before = LocationHistory.objects.count()
+        self.stdout.write(f"🗜️ Compacting {before} location history rows...")
+
+        stages = [
+            (LocationHistory.RESOLUTION_RAW, LocationHistory.RESOLUTION_MINUTE, options['raw_days']),
+            (LocationHistory.RESOLUTION_MINUTE, LocationHistory.RESOLUTION_QUARTER_HOUR, options['minute_days']),
+        ]
+        for source, target, days in stages:
+            cutoff = bucket_floor(now - timedelta(days=days), target)
+            merged, written = self._downsample(source, target, cutoff, options['chunk_size'])
+            if merged:
+                self.stdout.write(f"   {merged} rows before {cutoff:%Y-%m-%d %H:%M} -> {written} "
+                                  f"{LocationHistory(resolution=target).get_resolution_display().lower()} buckets")
+
+        expired, _ = LocationHistory.objects.filter(
+            bucket_start__lt=now - timedelta(days=options['retention_days'])
+        ).delete()
+        if expired:
+            self.stdout.write(f"   {expired} buckets past {options['retention_days']:g} days deleted")
+
+        after = LocationHistory.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Location history compacted: {before} -> {after} rows in {time.perf_counter() - start:.1f}s."
+        ))
+
+    def _downsample(self, source, target, cutoff, chunk_size):
+        """Fold `source` rows older than cutoff into `target` buckets; returns (rows read, buckets written)"""
+        employee_pks = list(
+            LocationHistory.objects.filter(resolution=source, bucket_start__lt=cutoff)
+            .order_by().values_list('employee_id', flat=True).distinct()
+        )
+        merged = written = 0
+        for offset in range(0, len(employee_pks), chunk_size):
+            chunk = employee_pks[offset:offset + chunk_size]
+            with transaction.atomic():
+                sources = LocationHistory.objects.filter(
+                    employee_id__in=chunk, resolution=source, bucket_start__lt=cutoff
+                )
+                rows = list(sources.values_list(*HISTORY_FIELDS))
+                if not rows:
+                    continue
+
+                # Buckets written by an earlier run absorb late-arriving points (e.g. a delayed bulk upload)
+                earliest = bucket_floor(min(row[1] for row in rows), target)
+                targets = LocationHistory.objects.filter(
+                    employee_id__in=chunk, resolution=target, bucket_start__gte=earliest, bucket_start__lt=cutoff
+                )
+                rows += list(targets.values_list(*HISTORY_FIELDS))
+
+                # (employee, bucket) -> [latitude sum, longitude sum, points, all inside, max distance]
+                buckets = {}
+                for employee_pk, bucket_start, latitude, longitude, is_inside, distance, count in rows:
+                    key = (employee_pk, bucket_floor(bucket_start, target))
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        buckets[key] = [latitude * count, longitude * count, count, is_inside, distance]
+                    else:
+                        bucket[0] += latitude * count
+                        bucket[1] += longitude * count
+                        bucket[2] += count
+                        bucket[3] = bucket[3] and is_inside
+                        bucket[4] = max(bucket[4], distance)
+
+                targets.delete()
+                sources.delete()
+                LocationHistory.objects.bulk_create([
+                    LocationHistory(
+                        employee_id=employee_pk,
+                        bucket_start=bucket_start,
+                        resolution=target,
+                        latitude=latitude_sum / count,
+                        longitude=longitude_sum / count,
+                        is_in_office_radius=is_inside,
+                        distance_from_office=distance,
+                        point_count=count
+                    )
+                    for (employee_pk, bucket_start), (latitude_sum, longitude_sum, count, is_inside, distance)
+                    in buckets.items()
+                ], batch_size=1000)
+                merged += len(rows)
+                written += len(buckets)
+        return merged, written
@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from employees.models import LocationHistory
+from employees.trajectory import simplify_track, track_errors, represented_counts
+
+
+class Command(BaseCommand):
+    help = ('Compact stored raw location tracks with the time-aware Douglas-Peucker simplifier and report the '
+            'compression ratio and positional error (use --dry-run to tune --tolerance-meters)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerance-meters', type=float, default=settings.LOCATION_TRACK_TOLERANCE_METERS,
+                            help='Maximum synchronized distance between the original and compacted track '
+                                 '(default: settings.LOCATION_TRACK_TOLERANCE_METERS)')
+        parser.add_argument('--max-gap-seconds', type=float, default=settings.LOCATION_TRACK_MAX_GAP_SECONDS,
+                            help='Always keep the points around longer gaps '
+                                 '(default: settings.LOCATION_TRACK_MAX_GAP_SECONDS)')
+        parser.add_argument('--days', type=float, default=None,
+                            help='Only compact raw points from the last N days (default: all raw points)')
+        parser.add_argument('--employee', default=None, help='Only compact this employee_id')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without deleting')
+
+    def handle(self, *args, **options):
+        if options['tolerance_meters'] <= 0:
+            raise CommandError('--tolerance-meters must be positive')
+
+        start = time.perf_counter()
+        queryset = LocationHistory.objects.filter(resolution=LocationHistory.RESOLUTION_RAW)
+        if options['days'] is not None:
+            queryset = queryset.filter(bucket_start__gte=timezone.now() - timedelta(days=options['days']))
+        if options['employee']:
+            queryset = queryset.filter(employee__employee_id=options['employee'])
+
+        employee_pks = list(queryset.order_by().values_list('employee_id', flat=True).distinct())
+        self.stdout.write(
+            f"🗜️ Compressing raw tracks of {len(employee_pks)} employees "
+            f"(tolerance {options['tolerance_meters']:g} m, max gap {options['max_gap_seconds']:g} s)"
+            f"{' [dry run]' if options['dry_run'] else ''}"
+        )
+
+        before = after = 0
+        errors = []
+        for employee_pk in employee_pks:
+            with transaction.atomic():
+                rows = list(queryset.filter(employee_id=employee_pk).order_by('bucket_start').values_list(
+                    'id', 'bucket_start', 'latitude', 'longitude', 'is_in_office_radius', 'point_count'
+                ))
+                ids, timestamps, latitudes, longitudes, inside, counts = (list(column) for column in zip(*rows))
+
+                inside = np.array(inside)
+                keep = np.zeros(len(rows), dtype=bool)
+                changes = np.flatnonzero(inside[1:] != inside[:-1])
+                keep[changes] = True
+                keep[changes + 1] = True
+                kept = simplify_track(timestamps, latitudes, longitudes, options['tolerance_meters'],
+                                      options['max_gap_seconds'], keep)
+
+                before += len(rows)
+                after += len(kept)
+                errors.append(track_errors(timestamps, latitudes, longitudes, kept))
+
+                if options['dry_run'] or len(kept) == len(rows):
+                    continue
+                dropped = np.setdiff1d(np.arange(len(rows)), kept)
+                new_counts = represented_counts(len(rows), kept, counts)
+                updates = [
+                    LocationHistory(id=ids[index], point_count=int(count))
+                    for index, count in zip(kept, new_counts) if count != counts[index]
+                ]
+                LocationHistory.objects.bulk_update(updates, ['point_count'], batch_size=1000)
+                # Delete in slices to stay under SQLite's bound-parameter limit
+                dropped_ids = [ids[index] for index in dropped]
+                for offset in range(0, len(dropped_ids), 900):
+                    LocationHistory.objects.filter(id__in=dropped_ids[offset:offset + 900]).delete()
+
+        if not before:
+            self.stdout.write("ℹ️ No raw location history to compress.")
+            return
+
+        errors = np.concatenate(errors)
+        self.stdout.write(
+            f"📊 {before} -> {after} points (compression ratio {before / max(after, 1):.1f}x, "
+            f"{100 * (1 - after / before):.1f}% removed)"
+        )
+        self.stdout.write(
+            f"📏 Positional error: max {errors.max():.2f} m, "
+            f"p95 {np.percentile(errors, 95):.2f} m, mean {errors.mean():.2f} m"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Track compression {'simulated' if options['dry_run'] else 'finished'} "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from employees.face_gallery import face_gallery
+from employees.face_snapshot import read_current_generation
+
+class Command(BaseCommand):
+    help = 'Write the shared memory-mapped face gallery snapshot from Employee.face_encoding'
+
+    def handle(self, *args, **options):
+        snapshot_dir = settings.FACE_GALLERY_SNAPSHOT_DIR
+        if not snapshot_dir:
+            raise CommandError('FACE_GALLERY_SNAPSHOT_DIR is not configured')
+
+        self.stdout.write(f"🔄 Exporting face gallery snapshot to {snapshot_dir}...")
+        face_gallery.load()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Snapshot {read_current_generation(snapshot_dir)} written with {len(face_gallery)} descriptors. "
+                f"Running workers map it on their next identification."
+            )
+        )
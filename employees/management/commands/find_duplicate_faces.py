@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from employees.models import Employee
+from employees.utils import decode_face_encoding, find_duplicate_pairs, DUPLICATE_FACE_THRESHOLD
+
+class Command(BaseCommand):
+    help = 'Find employees enrolled with near-identical faces (blocked matrix products over all encodings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=DUPLICATE_FACE_THRESHOLD,
+                            help=f'Cosine similarity reported as a duplicate (default: {DUPLICATE_FACE_THRESHOLD})')
+        parser.add_argument('--block-size', type=int, default=4096,
+                            help='Descriptors per matrix block; memory is block_size^2 floats (default: 4096)')
+        parser.add_argument('--limit', type=int, default=100,
+                            help='Maximum pairs to print, highest similarity first (default: 100, 0 = all)')
+
+    def handle(self, *args, **options):
+        if options['block_size'] < 1:
+            raise CommandError('--block-size must be positive')
+
+        start = time.perf_counter()
+        ids, names, vectors = [], [], []
+        for employee_id, name, face_encoding, face_encoding_norm in Employee.objects.exclude(
+            face_encoding=None
+        ).values_list('employee_id', 'name', 'face_encoding', 'face_encoding_norm').iterator():
+            vector = decode_face_encoding(face_encoding, face_encoding_norm)
+            if vector.shape[0] != 128:
+                self.stdout.write(self.style.WARNING(f"⚠️  Skipping {employee_id}: descriptor has {vector.shape[0]} dims"))
+                continue
+            ids.append(employee_id)
+            names.append(name)
+            vectors.append(vector)
+
+        if len(vectors) < 2:
+            self.stdout.write("ℹ️  Fewer than two enrolled faces, nothing to compare.")
+            return
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        loaded = time.perf_counter()
+        self.stdout.write(f"🔍 Comparing {len(ids)} descriptors at threshold {options['threshold']}...")
+
+        pairs_i, pairs_j, scores = find_duplicate_pairs(matrix, options['threshold'], options['block_size'])
+        done = time.perf_counter()
+
+        limit = options['limit'] or len(scores)
+        for i, j, score in zip(pairs_i[:limit], pairs_j[:limit], scores[:limit]):
+            self.stdout.write(
+                self.style.WARNING(f"👥 {score:.4f}  {names[i]} ({ids[i]})  <->  {names[j]} ({ids[j]})")
+            )
+        if len(scores) > limit:
+            self.stdout.write(f"... and {len(scores) - limit} more pairs")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Found {len(scores)} near-duplicate pairs among {len(ids)} employees "
+                f"(load {loaded - start:.2f}s, compare {done - loaded:.2f}s)."
+            )
+        )
@@ -0,0 +1,78 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from employees.models import Employee, FaceTemplate
+from employees.descriptor_codec import FORMAT_IDS, encode_descriptor, decode_descriptor, descriptor_format
+from employees.utils import decode_face_encoding, decode_unit_descriptor
+
+class Command(BaseCommand):
+    help = 'Re-encode stored face descriptors (face_encoding and face templates) into float32, float16 or int8'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', default='float16', choices=sorted(FORMAT_IDS),
+                            help='Target descriptor format (default: float16)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per bulk_update (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        fmt = options['fmt']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        self.stdout.write(f"🔄 Re-encoding face descriptors as {fmt}{' (dry run)' if options['dry_run'] else ''}...")
+
+        employees = Employee.objects.exclude(face_encoding=None).only('id', 'face_encoding', 'face_encoding_norm')
+        employee_stats = self._reencode(
+            employees, Employee, 'face_encoding', fmt, batch_size, options['dry_run'],
+            lambda employee: decode_face_encoding(employee.face_encoding, employee.face_encoding_norm),
+            extra_fields=['face_encoding_norm']
+        )
+        template_stats = self._reencode(
+            FaceTemplate.objects.only('id', 'descriptor'), FaceTemplate, 'descriptor', fmt, batch_size,
+            options['dry_run'], lambda template: decode_unit_descriptor(template.descriptor)
+        )
+
+        for label, (seen, changed, bytes_before, bytes_after) in (
+            ('Employee.face_encoding', employee_stats),
+            ('FaceTemplate.descriptor', template_stats),
+        ):
+            self.stdout.write(
+                f"📊 {label}: {changed}/{seen} rows re-encoded, "
+                f"{bytes_before / 1024:.1f} KiB -> {bytes_after / 1024:.1f} KiB"
+            )
+
+        self.stdout.write(self.style.SUCCESS("✅ Face descriptor re-encoding completed."))
+
+    def _reencode(self, queryset, model, field, fmt, batch_size, dry_run, decode, extra_fields=()):
+        seen = changed = bytes_before = bytes_after = 0
+        pending = []
+
+        for obj in queryset.iterator(chunk_size=batch_size):
+            blob = bytes(getattr(obj, field))
+            seen += 1
+            bytes_before += len(blob)
+            if descriptor_format(blob) == fmt:
+                bytes_after += len(blob)
+                continue
+
+            # decode() normalizes legacy rows, so record their original norm before it is lost
+            new_blob = encode_descriptor(decode(obj), fmt)
+            if 'face_encoding_norm' in extra_fields and obj.face_encoding_norm is None:
+                obj.face_encoding_norm = float(np.linalg.norm(decode_descriptor(blob)))
+            bytes_after += len(new_blob)
+            setattr(obj, field, new_blob)
+            pending.append(obj)
+            changed += 1
+
+            if len(pending) >= batch_size:
+                self._flush(model, pending, [field, *extra_fields], dry_run)
+                pending = []
+
+        self._flush(model, pending, [field, *extra_fields], dry_run)
+        return seen, changed, bytes_before, bytes_after
+
+    def _flush(self, model, objects, fields, dry_run):
+        if objects and not dry_run:
+            model.objects.bulk_update(objects, fields)
@@ -0,0 +1,170 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from employees.descriptor_codec import encode_descriptor
+from employees.models import Employee, FaceTemplate
+# The pool runs functions of this Django-free module, so spawned children can import it
+from employees.reenroll_worker import extract_descriptor, init_worker
+from employees.utils import decode_face_encoding, normalize_descriptor, descriptor_similarity
+
+DEFAULT_EXTRACTOR = 'employees.utils.get_face_encoding_from_base64'
+
+
+class Command(BaseCommand):
+    help = 'Regenerate face descriptors from stored face images in parallel (resumable, chunked bulk_update)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--extractor', default=DEFAULT_EXTRACTOR,
+                            help=f'Dotted path of a base64-image -> 128-d descriptor function (default: {DEFAULT_EXTRACTOR})')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes decoding images and extracting descriptors (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Employees per bulk_update and checkpoint (default: 500)')
+        parser.add_argument('--checkpoint', default='reenroll_checkpoint.json',
+                            help='File recording the last committed employee pk and the failed ones, used to resume')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first employee')
+        parser.add_argument('--validate-only', action='store_true',
+                            help='Compare new descriptors with the stored ones without writing anything')
+        parser.add_argument('--keep-templates', action='store_true',
+                            help='Keep existing face templates instead of replacing them with the new descriptor')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+        try:
+            import_string(options['extractor'])
+        except ImportError as e:
+            raise CommandError(f"Cannot import extractor {options['extractor']}: {e}")
+
+        checkpoint = options['checkpoint']
+        self.last_pk = 0
+        self.retry_pks = set()  # Failed in an earlier run and not retried yet
+        self.failed_pks = set()
+        if not options['restart'] and not options['validate_only'] and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            self.last_pk = state.get('last_pk', 0)
+            self.retry_pks = set(state.get('failed_pks', []))
+            self.stdout.write(f"⏩ Resuming after employee pk {self.last_pk}, retrying {len(self.retry_pks)} "
+                              f"failed employees ({checkpoint})")
+
+        queryset = Employee.objects.filter(Q(pk__gt=self.last_pk) | Q(pk__in=self.retry_pks)).order_by('pk').only(
+            'pk', 'employee_id', 'face_image', 'face_image_cloudinary_url', 'face_encoding', 'face_encoding_norm'
+        )
+        total = queryset.count()
+        self.stdout.write(
+            f"🔄 Re-enrolling {total} employees with {options['extractor']} "
+            f"({options['workers']} workers, chunks of {options['chunk_size']})"
+            f"{' [validate only]' if options['validate_only'] else ''}"
+        )
+
+        self.stats = {'processed': 0, 'updated': 0, 'failed': 0, 'similarities': []}
+        start = time.perf_counter()
+        chunk = []
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+            for employee in queryset.iterator(chunk_size=options['chunk_size']):
+                chunk.append(employee)
+                if len(chunk) >= options['chunk_size']:
+                    self._process_chunk(pool, chunk, options)
+                    self._report(start, total)
+                    chunk = []
+            if chunk:
+                self._process_chunk(pool, chunk, options)
+                self._report(start, total)
+
+        similarities = self.stats['similarities']
+        if similarities:
+            self.stdout.write(
+                f"📊 Similarity new vs stored descriptor: mean {np.mean(similarities):.4f}, "
+                f"min {np.min(similarities):.4f}"
+            )
+
+        if self.stats['updated'] and not options['validate_only']:
+            if settings.FACE_GALLERY_SNAPSHOT_DIR:
+                # bulk_update bypasses the gallery signals; republish the shared snapshot once
+                call_command('export_face_snapshot', stdout=self.stdout)
+        if not options['validate_only'] and os.path.exists(checkpoint) and self.stats['failed'] == 0:
+            os.remove(checkpoint)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Re-enrollment finished: {self.stats['updated']} updated, {self.stats['failed']} failed, "
+                f"{self.stats['processed']} processed in {time.perf_counter() - start:.1f}s."
+            )
+        )
+
+    def _process_chunk(self, pool, employees, options):
+        tasks = []
+        for employee in employees:
+            local_path = None
+            if employee.face_image:
+                try:
+                    local_path = employee.face_image.path
+                except (NotImplementedError, ValueError):
+                    local_path = None
+            tasks.append((employee.pk, local_path, employee.face_image_cloudinary_url, options['extractor']))
+
+        by_pk = {employee.pk: employee for employee in employees}
+        updated = []
+        for pk, descriptor, error in pool.map(extract_descriptor, tasks):
+            employee = by_pk[pk]
+            self.stats['processed'] += 1
+            self.retry_pks.discard(pk)
+            if error:
+                self.stats['failed'] += 1
+                self.failed_pks.add(pk)
+                self.stdout.write(self.style.WARNING(f"⚠️  {employee.employee_id}: {error}"))
+                continue
+
+            descriptor_unit, descriptor_norm = normalize_descriptor(descriptor)
+            if employee.face_encoding:
+                stored = decode_face_encoding(employee.face_encoding, employee.face_encoding_norm)
+                if stored.shape == descriptor_unit.shape:
+                    self.stats['similarities'].append(descriptor_similarity(stored, descriptor_unit))
+
+            employee.face_encoding = encode_descriptor(descriptor_unit, settings.FACE_ENCODING_FORMAT)
+            employee.face_encoding_norm = descriptor_norm
+            updated.append(employee)
+
+        if options['validate_only']:
+            return
+
+        if updated:
+            Employee.objects.bulk_update(updated, ['face_encoding', 'face_encoding_norm'])
+            if not options['keep_templates']:
+                # Templates from the old model are not comparable with the new descriptors
+                FaceTemplate.objects.filter(employee__in=updated).delete()
+                FaceTemplate.objects.bulk_create([
+                    FaceTemplate(employee=employee, descriptor=employee.face_encoding, source='registration')
+                    for employee in updated
+                ])
+            self.stats['updated'] += len(updated)
+
+        # Failed rows are reported above and kept in the checkpoint, so a resumed run retries them
+        self.last_pk = max(self.last_pk, employees[-1].pk)
+        with open(options['checkpoint'], 'w') as checkpoint_file:
+            json.dump({
+                'last_pk': self.last_pk,
+                'failed_pks': sorted(self.retry_pks | self.failed_pks),
+                'updated_at': time.time()
+            }, checkpoint_file)
+
+    def _report(self, start, total):
+        elapsed = time.perf_counter() - start
+        processed = self.stats['processed']
+        rate = processed / elapsed if elapsed else 0.0
+        eta = (total - processed) / rate if rate else 0.0
+        self.stdout.write(
+            f"⏳ {processed}/{total} processed ({self.stats['updated']} updated, {self.stats['failed']} failed) "
+            f"- {rate:.1f} employees/s, ETA {eta:.0f}s"
+        )
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from employees.models import Employee, EmployeePresence
+from employees.presence import with_latest_location
+
+# Presence columns compared against the values derived from EmployeeLocation/Attendance
+CHECKED_FIELDS = ('last_location_at', 'latitude', 'longitude', 'is_in_office_radius', 'distance_from_office',
+                  'is_sharing', 'last_attendance_at')
+
+
+def expected_presence(employee):
+    """EmployeePresence an employee annotated by with_latest_location() should have"""
+    return EmployeePresence(
+        employee_id=employee.pk,
+        last_location_at=employee.latest_location_timestamp,
+        latitude=employee.latest_location_latitude,
+        longitude=employee.latest_location_longitude,
+        is_in_office_radius=bool(employee.latest_location_is_in_office_radius),
+        distance_from_office=employee.latest_location_distance_from_office,
+        is_sharing=bool(employee.latest_location_is_active),
+        last_attendance_at=employee.last_attendance_at
+    )
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the denormalized EmployeePresence records from EmployeeLocation and Attendance, or with '
+            '--check only report records that drifted (exits non-zero when any did)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Report drift without writing anything')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Records written per INSERT ... ON CONFLICT (default: 1000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        start = time.perf_counter()
+        # One query each for the source of truth and the current records
+        employees = list(with_latest_location(Employee.objects.all()))
+        records = {record.employee_id: record for record in EmployeePresence.objects.all()}
+        self.stdout.write(f"🔎 Checking presence for {len(employees)} employees...")
+
+        drifted = []
+        for employee in employees:
+            expected = expected_presence(employee)
+            record = records.get(employee.pk)
+            if record is None:
+                drifted.append(expected)
+                self.stdout.write(f"⚠️  {employee.name} ({employee.employee_id}): no presence record")
+                continue
+            fields = [field for field in CHECKED_FIELDS if getattr(record, field) != getattr(expected, field)]
+            if fields:
+                drifted.append(expected)
+                details = ', '.join(f"{field} {getattr(record, field)} -> {getattr(expected, field)}" for field in fields)
+                self.stdout.write(f"⚠️  {employee.name} ({employee.employee_id}): {details}")
+
+        elapsed = time.perf_counter() - start
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} of {len(employees)} presence records drifted "
+                                   f"(run without --check to rebuild them)")
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ All {len(employees)} presence records consistent ({elapsed:.1f}s)"
+            ))
+            return
+
+        EmployeePresence.objects.bulk_create(
+            drifted, update_conflicts=True, unique_fields=['employee'],
+            update_fields=list(CHECKED_FIELDS) + ['updated_at'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rebuilt {len(drifted)} of {len(employees)} presence records in {time.perf_counter() - start:.1f}s"
+        ))
@@ -1,8 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta
-from employees.models import Employee, EmployeeLocation, Attendance
-from employees.views import check_employee_online_status
+from employees.models import Employee, EmployeeLocation
+from employees.location_buffer import location_buffer
+from employees.presence import employee_presence, sync_presence_flags, record_location_presence
 
 class Command(BaseCommand):
     help = 'Update employee online/offline status based on login and location activity'
@@ -10,53 +10,49 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write("🔄 Starting employee status update...")
         
-        employees = Employee.objects.all()
-        updated_count = 0
+        # One query over the presence records, then one UPDATE each for the locations and records going offline
+        presence = employee_presence(Employee.objects.select_related('office'), location_buffer.latest())
+        changed = {employee.pk for employee, _ in sync_presence_flags(presence)}
+        updated_count = len(changed)
+        missing = []
         
-        for employee in employees:
-            # Check if employee should be marked as offline
-            is_online = check_employee_online_status(employee)
-            
-            # Get the latest location record
-            latest_location = EmployeeLocation.objects.filter(
-                employee=employee
-            ).order_by('-timestamp').first()
-            
-            if latest_location:
-                # Update the is_active status based on online check
-                if latest_location.is_active != is_online:
-                    latest_location.is_active = is_online
-                    latest_location.save()
-                    updated_count += 1
-                    
-                    status = "online" if is_online else "offline"
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"✅ Updated {employee.name} ({employee.employee_id}) to {status}"
-                        )
-                    )
-                else:
-                    status = "online" if is_online else "offline"
-                    self.stdout.write(
-                        f"ℹ️  {employee.name} ({employee.employee_id}) already {status}"
+        for employee, latest_location, is_online in presence:
+            status = "online" if is_online else "offline"
+            if latest_location is None:
+                missing.append(employee)
+            elif employee.pk in changed:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"✅ Updated {employee.name} ({employee.employee_id}) to {status}"
                     )
-            else:
-                # No location record exists, create one with offline status
-                EmployeeLocation.objects.create(
-                    employee=employee,
-                    latitude=employee.office.latitude if employee.office else 0,
-                    longitude=employee.office.longitude if employee.office else 0,
-                    is_in_office_radius=False,
-                    distance_from_office=0,
-                    is_active=False,
-                    timestamp=timezone.now()
                 )
-                updated_count += 1
+            else:
                 self.stdout.write(
-                    self.style.WARNING(
-                        f"⚠️  Created offline record for {employee.name} ({employee.employee_id}) - no previous location"
-                    )
+                    f"ℹ️  {employee.name} ({employee.employee_id}) already {status}"
                 )
+
+        # No location record exists, create one with offline status
+        offline_records = []
+        for employee in missing:
+            record = EmployeeLocation(
+                employee=employee,
+                latitude=employee.office.latitude if employee.office else 0,
+                longitude=employee.office.longitude if employee.office else 0,
+                is_in_office_radius=False,
+                distance_from_office=0,
+                is_active=False,
+                timestamp=timezone.now()
+            )
+            record.set_grid_cell()
+            offline_records.append(record)
+            self.stdout.write(
+                self.style.WARNING(
+                    f"⚠️  Created offline record for {employee.name} ({employee.employee_id}) - no previous location"
+                )
+            )
+        EmployeeLocation.objects.bulk_create(offline_records)
+        record_location_presence(offline_records)
+        updated_count += len(offline_records)
         
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,43 @@
+# Store face descriptors L2-normalized, keeping the original norm alongside
+
+from django.db import migrations, models
+
+
+def normalize_existing_encodings(apps, schema_editor):
+    import numpy as np
+
+    Employee = apps.get_model('employees', 'Employee')
+    for employee in Employee.objects.exclude(face_encoding=None).iterator():
+        vector = np.frombuffer(bytes(employee.face_encoding), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0 or not np.isfinite(norm):
+            continue
+        employee.face_encoding = (vector / np.float32(norm)).astype(np.float32).tobytes()
+        employee.face_encoding_norm = norm
+        employee.save(update_fields=['face_encoding', 'face_encoding_norm'])
+
+
+def denormalize_existing_encodings(apps, schema_editor):
+    import numpy as np
+
+    Employee = apps.get_model('employees', 'Employee')
+    for employee in Employee.objects.exclude(face_encoding_norm=None).iterator():
+        vector = np.frombuffer(bytes(employee.face_encoding), dtype=np.float32)
+        employee.face_encoding = (vector * np.float32(employee.face_encoding_norm)).astype(np.float32).tobytes()
+        employee.save(update_fields=['face_encoding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0005_add_cloudinary_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='face_encoding_norm',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(normalize_existing_encodings, denormalize_existing_encodings),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_templates_from_face_encoding(apps, schema_editor):
+    """Every already-registered employee starts with their stored descriptor as the first template"""
+    import numpy as np
+
+    Employee = apps.get_model('employees', 'Employee')
+    FaceTemplate = apps.get_model('employees', 'FaceTemplate')
+    templates = []
+    for employee in Employee.objects.exclude(face_encoding=None).iterator():
+        vector = np.frombuffer(bytes(employee.face_encoding), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0 or not np.isfinite(norm):
+            continue
+        templates.append(FaceTemplate(
+            employee=employee,
+            descriptor=(vector / np.float32(norm)).astype(np.float32).tobytes(),
+            source='registration'
+        ))
+    FaceTemplate.objects.bulk_create(templates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0006_employee_face_encoding_norm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descriptor', models.BinaryField()),
+                ('source', models.CharField(choices=[('registration', 'Registration'), ('attendance', 'Accepted attendance')], default='registration', max_length=20)),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='face_templates', to='employees.employee')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.RunPython(seed_templates_from_face_encoding, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0007_facetemplate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='office',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='employees.officelocation'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='allowed_offices',
+            field=models.ManyToManyField(blank=True, related_name='visiting_employees', to='employees.officelocation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0008_employee_allowed_offices_attendance_office'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='officelocation',
+            name='boundary',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
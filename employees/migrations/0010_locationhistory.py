@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0009_officelocation_boundary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('resolution', models.PositiveIntegerField(choices=[(0, 'Raw point'), (60, 'Per minute'), (900, 'Per 15 minutes')], default=0)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('is_in_office_radius', models.BooleanField(default=True)),
+                ('distance_from_office', models.FloatField()),
+                ('point_count', models.PositiveIntegerField(default=1)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_history', to='employees.employee')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'indexes': [models.Index(fields=['employee', 'bucket_start'], name='locationhistory_track_idx'), models.Index(fields=['resolution', 'bucket_start'], name='locationhistory_age_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def close_existing_alerts(apps, schema_editor):
+    """Alerts written before excursions were tracked are single pings: close each one on itself"""
+    LocationAlert = apps.get_model('employees', 'LocationAlert')
+    LocationAlert.objects.filter(ended_at__isnull=True).update(
+        ended_at=F('timestamp'), last_seen_at=F('timestamp'), max_distance=F('distance')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0010_locationhistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locationalert',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='locationalert',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='locationalert',
+            name='max_distance',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='locationalert',
+            name='ping_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(close_existing_alerts, migrations.RunPython.noop),
+    ]
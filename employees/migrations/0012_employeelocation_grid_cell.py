@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:41
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Floor, Greatest, Least
+
+# Frozen copy of viewport.LIVE_CELL_DEGREES / LIVE_CELL_COLUMNS at the time of this migration
+CELL_DEGREES = 0.01
+CELL_COLUMNS = 36000
+
+
+def fill_grid_cells(apps, schema_editor):
+    """One UPDATE computing the cells in the DB, same arithmetic as viewport.grid_cell"""
+    EmployeeLocation = apps.get_model('employees', 'EmployeeLocation')
+    EmployeeLocation.objects.update(
+        lat_cell=Floor(F('latitude') / Value(CELL_DEGREES)),
+        lon_cell=Greatest(Least(Floor((F('longitude') + Value(180.0)) / Value(CELL_DEGREES)), Value(CELL_COLUMNS - 1)), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0011_locationalert_excursions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employeelocation',
+            name='lat_cell',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='employeelocation',
+            name='lon_cell',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='employeelocation',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['lat_cell', 'lon_cell'], name='employeelocation_cell_idx'),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
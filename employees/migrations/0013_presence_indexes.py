@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0012_employeelocation_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['employee', '-timestamp'], name='attendance_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeelocation',
+            index=models.Index(fields=['employee', '-timestamp'], name='employeelocation_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.2 on 2026-10-17 17:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+LOCATION_FIELDS = ['latitude', 'longitude', 'is_in_office_radius', 'distance_from_office', 'timestamp', 'is_active']
+
+
+def backfill_presence(apps, schema_editor):
+    """One presence row per employee from its latest location and attendance (as sync_employee_presence does)"""
+    Employee = apps.get_model('employees', 'Employee')
+    EmployeeLocation = apps.get_model('employees', 'EmployeeLocation')
+    Attendance = apps.get_model('employees', 'Attendance')
+    EmployeePresence = apps.get_model('employees', 'EmployeePresence')
+
+    latest_location = EmployeeLocation.objects.filter(employee=OuterRef('pk')).order_by('-timestamp', '-pk')
+    latest_attendance = Attendance.objects.filter(employee=OuterRef('pk')).order_by('-timestamp')
+    employees = Employee.objects.annotate(
+        **{f'latest_{field}': Subquery(latest_location.values(field)[:1]) for field in LOCATION_FIELDS},
+        last_attendance_at=Subquery(latest_attendance.values('timestamp')[:1])
+    )
+    EmployeePresence.objects.bulk_create([
+        EmployeePresence(
+            employee_id=employee.pk,
+            last_location_at=employee.latest_timestamp,
+            latitude=employee.latest_latitude,
+            longitude=employee.latest_longitude,
+            is_in_office_radius=bool(employee.latest_is_in_office_radius),
+            distance_from_office=employee.latest_distance_from_office,
+            is_sharing=bool(employee.latest_is_active),
+            last_attendance_at=employee.last_attendance_at,
+        )
+        for employee in employees
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0013_presence_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeePresence',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presence', serialize=False, to='employees.employee')),
+                ('last_location_at', models.DateTimeField(blank=True, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('is_in_office_radius', models.BooleanField(default=False)),
+                ('distance_from_office', models.FloatField(blank=True, null=True)),
+                ('is_sharing', models.BooleanField(default=False)),
+                ('last_attendance_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_presence, migrations.RunPython.noop),
+    ]
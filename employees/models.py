@@ -1,5 +1,6 @@
 from django.db import models
 
+from .viewport import grid_cell
 
 
 
@@ -8,6 +9,8 @@ class OfficeLocation(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     radius_meters = models.FloatField(default=100.0)  # Allowed radius
+    # Optional polygon/multipolygon boundary (boundary_codec blob); replaces the radius circle when set
+    boundary = models.BinaryField(null=True, blank=True)
 
     def __str__(self):
         return self.name  # Allowed radius
@@ -20,9 +23,32 @@ class Employee(models.Model):
     face_image_cloudinary_url = models.URLField(max_length=500, blank=True, null=True)
     face_image_cloudinary_id = models.CharField(max_length=200, blank=True, null=True)
     office = models.ForeignKey('OfficeLocation', on_delete=models.CASCADE)
+    # Other sites the employee may check in at (field staff rotating across offices)
+    allowed_offices = models.ManyToManyField('OfficeLocation', blank=True, related_name='visiting_employees')
     
     # 🧠 New field to store face encodings as binary
     face_encoding = models.BinaryField(null=True, blank=True)
+    # L2 norm of the descriptor as sent by the client; face_encoding itself is stored unit-length
+    face_encoding_norm = models.FloatField(null=True, blank=True)
+
+class FaceTemplate(models.Model):
+    """One of possibly several enrolled descriptors for an employee (unit-length float32)"""
+    SOURCE_CHOICES = [
+        ('registration', 'Registration'),
+        ('attendance', 'Accepted attendance'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='face_templates')
+    descriptor = models.BinaryField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='registration')
+    similarity = models.FloatField(null=True, blank=True)  # Match score when captured from an attendance
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.employee.name} - {self.source} template at {self.created_at}"
 
 class Attendance(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -34,6 +60,14 @@ class Attendance(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     action = models.CharField(max_length=10, default='login')
+    # Office whose geofence accepted the check-in (null for records made before multi-office check-in)
+    office = models.ForeignKey(OfficeLocation, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Latest attendance per employee (presence)
+            models.Index(fields=['employee', '-timestamp'], name='attendance_latest_idx'),
+        ]
 
 class LocationAlert(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -42,9 +76,19 @@ class LocationAlert(models.Model):
     distance = models.FloatField()  # Distance from office in km
     timestamp = models.DateTimeField(auto_now_add=True)
     office_name = models.CharField(max_length=100)
+    # One alert per excursion (see geofence_alerts): refreshed while outside, closed on return
+    max_distance = models.FloatField(null=True, blank=True)  # km
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)  # Null while the employee is still outside
+    ping_count = models.PositiveIntegerField(default=1)
     
     class Meta:
         ordering = ['-timestamp']
+
+    @property
+    def duration_seconds(self):
+        end = self.ended_at or self.last_seen_at or self.timestamp
+        return max(0.0, (end - self.timestamp).total_seconds())
     
     def __str__(self):
         return f"{self.employee.name} - {self.distance:.2f}km away at {self.timestamp}"
@@ -57,12 +101,100 @@ class EmployeeLocation(models.Model):
     distance_from_office = models.FloatField()  # Distance in meters
     timestamp = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)  # To track if location sharing is active
+    # Grid cell of the position (see viewport.grid_cell), for bounding-box queries
+    lat_cell = models.IntegerField(null=True, editable=False)
+    lon_cell = models.IntegerField(null=True, editable=False)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Latest location per employee (presence)
+            models.Index(fields=['employee', '-timestamp'], name='employeelocation_latest_idx'),
+            # Partial: only live rows are ever looked up by cell
+            models.Index(fields=['lat_cell', 'lon_cell'], name='employeelocation_cell_idx',
+                         condition=models.Q(is_active=True)),
+        ]
     
     def __str__(self):
         return f"{self.employee.name} - {self.distance_from_office:.0f}m from office at {self.timestamp}"
 
+    def set_grid_cell(self):
+        """Fill lat_cell/lon_cell from the position; bulk_create/bulk_update callers must call this themselves"""
+        self.lat_cell, self.lon_cell = grid_cell(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.set_grid_cell()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'lat_cell', 'lon_cell'}
+        super().save(*args, **kwargs)
+
+class EmployeePresence(models.Model):
+    """
+    Denormalized presence per employee, maintained on write
+    location_update / the location buffer flush, attendance check-ins and the status
+    sync keep it current, so a status read is a join on the primary key plus a clock
+    comparison instead of a search through EmployeeLocation and Attendance.
+    sync_employee_presence rebuilds it from those tables and reports drift.
+    """
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, primary_key=True, related_name='presence')
+    last_location_at = models.DateTimeField(null=True, blank=True)  # Timestamp of the latest EmployeeLocation
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    is_in_office_radius = models.BooleanField(default=False)
+    distance_from_office = models.FloatField(null=True, blank=True)  # Meters
+    is_sharing = models.BooleanField(default=False)  # The latest EmployeeLocation is active
+    last_attendance_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Delta polls select rows changed since a cursor
+
+    def __str__(self):
+        return f"{self.employee.name} - {'sharing' if self.is_sharing else 'not sharing'} since {self.last_location_at}"
+
+class EmployeeTombstone(models.Model):
+    """
+    Deleted employee, kept for live_delta.TOMBSTONE_RETENTION so delta polls of the
+    live location endpoints can report the removal (the presence record is gone with the employee)
+    """
+    employee_id = models.CharField(max_length=100)  # Public id of the deleted employee
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.employee_id} deleted at {self.deleted_at}"
+
+class LocationHistory(models.Model):
+    """
+    Append-only location track, separate from the mutable EmployeeLocation "active" row
+    Raw points are downsampled into per-minute and then per-15-minute buckets as they
+    age (see compact_location_history), so a day of track is one index range on
+    (employee, bucket_start) whatever its resolution.
+    """
+    RESOLUTION_RAW = 0
+    RESOLUTION_MINUTE = 60
+    RESOLUTION_QUARTER_HOUR = 900
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_RAW, 'Raw point'),
+        (RESOLUTION_MINUTE, 'Per minute'),
+        (RESOLUTION_QUARTER_HOUR, 'Per 15 minutes'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='location_history')
+    bucket_start = models.DateTimeField()  # Fix time for raw points, bucket start for downsampled ones
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES, default=RESOLUTION_RAW)  # Seconds per bucket
+    latitude = models.FloatField()  # Mean position for downsampled buckets
+    longitude = models.FloatField()
+    is_in_office_radius = models.BooleanField(default=True)  # False if any point in the bucket was outside
+    distance_from_office = models.FloatField()  # Meters; the largest distance in the bucket
+    point_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ['bucket_start']
+        indexes = [
+            models.Index(fields=['employee', 'bucket_start'], name='locationhistory_track_idx'),
+            models.Index(fields=['resolution', 'bucket_start'], name='locationhistory_age_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee.name} at {self.bucket_start} ({self.get_resolution_display()}, {self.point_count} points)"
+
 
 
@@ -0,0 +1,192 @@
+"""
+Spatial index over OfficeLocation
+Answers "which offices contain this point" and "nearest N offices" without
+scanning the table. Every office geofence (circle or polygon) is registered in each fixed-size
+latitude/longitude grid cell its bounding box touches, so containment is one
+bucket lookup plus an exact check of the few offices in it. Office centres are
+also bucketed in a coarser grid that the nearest search walks ring by ring; a
+polygon can be nearer than its centre by up to its circumscribed radius (its
+reach), so the search bounds are widened by the largest reach.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+from .geofence import (
+    make_geofence, meters_per_degree, OfficeGeofence, HAVERSINE_BAND_RATIO, PROJECTION_MAX_METERS
+)
+from .utils import haversine_distances
+
+# Containment grid cell size (~1.1 km of latitude)
+COVER_CELL_DEGREES = 0.01
+
+# Nearest-search grid cell size (~11 km of latitude)
+CENTER_CELL_DEGREES = 0.1
+
+# Offices covering more containment cells than this are checked on every query instead
+MAX_CELLS_PER_OFFICE = 400
+
+# The nearest search falls back to scanning every centre after this many rings (~330 km)
+MAX_SEARCH_RINGS = 30
+
+# Rebuild after this many seconds so office edits made through another worker are picked up
+OFFICE_INDEX_MAX_AGE_SECONDS = 60
+
+
+def _cell(latitude, longitude, cell_degrees):
+    return math.floor(latitude / cell_degrees), math.floor(((longitude + 180.0) % 360.0) / cell_degrees)
+
+
+class OfficeSpatialIndex:
+    """
+    Thread-safe grid index of office geofences
+
+    Queries read an immutable state tuple; invalidate() (called from the
+    OfficeLocation signals) drops it and the next query rebuilds it from the DB.
+    """
+
+    def __init__(self, cover_cell_degrees=COVER_CELL_DEGREES, center_cell_degrees=CENTER_CELL_DEGREES,
+                 max_age=OFFICE_INDEX_MAX_AGE_SECONDS):
+        self._lock = threading.Lock()
+        self._cover_cell = cover_cell_degrees
+        self._center_cell = center_cell_degrees
+        self._max_age = max_age
+        self._loaded_at = None
+        self._state = None
+
+    def __len__(self):
+        return len(self._ensure_loaded()[0])
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def build(self, offices):
+        """
+        Index an iterable of (office_id, name, latitude, longitude, radius_meters, boundary)
+        """
+        entries = {}
+        cover = {}
+        centers = {}
+        wide = []
+        columns = round(360.0 / self._cover_cell)
+
+        for office_id, name, latitude, longitude, radius_meters, boundary in offices:
+            fence = make_geofence(latitude, longitude, radius_meters, boundary)
+            entries[office_id] = (name, fence)
+            centers.setdefault(_cell(latitude, longitude, self._center_cell), []).append(office_id)
+
+            first_row = math.floor(fence.min_lat / self._cover_cell)
+            last_row = math.floor(fence.max_lat / self._cover_cell)
+            first_column = math.floor((fence.min_lon + 180.0) / self._cover_cell)
+            last_column = math.floor((fence.max_lon + 180.0) / self._cover_cell)
+            n_cells = (last_row - first_row + 1) * (last_column - first_column + 1)
+            if fence.radius_meters > PROJECTION_MAX_METERS or n_cells > MAX_CELLS_PER_OFFICE:
+                wide.append(office_id)
+                continue
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    # Columns wrap so circles crossing the antimeridian land in both edge cells
+                    cover.setdefault((row, column % columns), []).append(office_id)
+
+        ids = list(entries)
+        center_latitudes = np.array([entries[office_id][1].latitude for office_id in ids], dtype=np.float64)
+        center_longitudes = np.array([entries[office_id][1].longitude for office_id in ids], dtype=np.float64)
+        # How much nearer than its centre an office can be: circles measure from the centre, polygons from an edge
+        fences = [entries[office_id][1] for office_id in ids]
+        reaches = np.array([0.0 if isinstance(fence, OfficeGeofence) else fence.radius_meters for fence in fences],
+                           dtype=np.float64)
+
+        with self._lock:
+            self._state = (entries, cover, centers, wide, ids, center_latitudes, center_longitudes, reaches)
+            self._loaded_at = time.monotonic()
+        return self
+
+    def load(self):
+        from .models import OfficeLocation
+
+        self.build(OfficeLocation.objects.values_list(
+            'id', 'name', 'latitude', 'longitude', 'radius_meters', 'boundary'
+        ))
+        print(f"🗺️ Office index built with {len(self._state[0])} offices")
+
+    def _ensure_loaded(self):
+        state = self._state
+        if state is None or time.monotonic() - self._loaded_at > self._max_age:
+            self.load()
+            state = self._state
+        return state
+
+    def get(self, office_id):
+        """(name, OfficeGeofence) for an indexed office, or None"""
+        return self._ensure_loaded()[0].get(office_id)
+
+    def containing(self, latitude, longitude):
+        """
+        Offices whose geofence contains the point, nearest first
+        Returns a list of (office_id, name, distance_meters)
+        """
+        entries, cover, _, wide, _, _, _, _ = self._ensure_loaded()
+        latitude, longitude = float(latitude), float(longitude)
+
+        matches = []
+        for office_id in cover.get(_cell(latitude, longitude, self._cover_cell), []) + wide:
+            name, fence = entries[office_id]
+            # contains() rejects on the bounding box first; the distance is only measured for matches
+            if fence.contains(latitude, longitude):
+                matches.append((office_id, name, fence.evaluate(latitude, longitude)[0]))
+        matches.sort(key=lambda match: match[2])
+        return matches
+
+    def nearest(self, latitude, longitude, limit=5):
+        """
+        Up to limit offices closest to the point, nearest first, by fence distance
+        (from a circle's centre, to a polygon's nearest edge)
+        Returns a list of (office_id, name, distance_meters)
+        """
+        entries, _, centers, _, ids, center_latitudes, center_longitudes, reaches = self._ensure_loaded()
+        latitude, longitude = float(latitude), float(longitude)
+        limit = max(1, min(int(limit), len(ids)))
+        if not ids:
+            return []
+
+        row, column = _cell(latitude, longitude, self._center_cell)
+        columns = round(360.0 / self._center_cell)
+        max_reach = float(reaches.max())
+        found = []
+        for ring in range(MAX_SEARCH_RINGS + 1):
+            for ring_row in range(row - ring, row + ring + 1):
+                edge = ring_row in (row - ring, row + ring)
+                ring_columns = range(column - ring, column + ring + 1) if edge else (column - ring, column + ring)
+                for ring_column in ring_columns:
+                    for office_id in centers.get((ring_row, ring_column % columns), []):
+                        name, fence = entries[office_id]
+                        found.append((office_id, name, fence.distance(latitude, longitude)))
+
+            if len(found) >= limit:
+                # Centres in a further ring are at least `ring` whole cells away, their fences at most max_reach nearer
+                lat_meters, lon_meters = meters_per_degree(min(89.0, abs(latitude) + (ring + 1) * self._center_cell))
+                bound = ring * self._center_cell * min(lat_meters, lon_meters) - max_reach
+                found.sort(key=lambda match: match[2])
+                if found[limit - 1][2] <= bound:
+                    return found[:limit]
+
+        # Sparse offices far from the point: one vectorized pass over every centre gives a lower bound
+        # on each fence distance; exact distances are measured in that order until the bound passes the limit-th
+        lower = haversine_distances(latitude, longitude, center_latitudes, center_longitudes) * (
+            1 - HAVERSINE_BAND_RATIO) - reaches
+        found = []
+        for i in np.argsort(lower):
+            if len(found) >= limit and lower[i] > found[-1][2]:
+                break
+            name, fence = entries[ids[i]]
+            found.append((ids[i], name, fence.distance(latitude, longitude)))
+            found = sorted(found, key=lambda match: match[2])[:limit]
+        return found
+
+
+# Process-wide index shared by the views and invalidated by signals
+office_index = OfficeSpatialIndex()
@@ -0,0 +1,290 @@
+"""
+Employee online/offline presence rules
+Kept free of numpy/Cloudinary imports so management commands can use it cheaply
+
+Status reads go through EmployeePresence, the per-employee record the write paths
+keep current (record_*_presence): employee_presence() is one query joining it on
+the primary key, with presence_status() applied in Python. with_latest_location()
+derives the same values from EmployeeLocation/Attendance (subqueries on the
+(employee, timestamp) indexes) for rebuilding and checking those records.
+
+Heartbeats: every sharing ping also refreshes a cache key that expires
+ONLINE_LOCATION_WINDOW later (settings.PRESENCE_CACHE_ALIAS), so "online" is
+"the key exists": status-only reads are one get_many with no DB access, and
+nothing has to sweep stale employees offline.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, DateTimeField, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from .models import Attendance, EmployeeLocation, EmployeePresence
+
+# A sharing employee counts as online while their last location is at most this old
+ONLINE_LOCATION_WINDOW = timedelta(minutes=10)
+
+# Unmoved sharing pings only refresh the stored location once this old (location_update),
+# so last_location_at may trail an employee's heartbeat by up to this much
+LOCATION_HEARTBEAT_SECONDS = 120
+
+# Employees per UPDATE in record_attendance_presence (keeps the CASE/WHERE under SQLite's expression limits)
+ATTENDANCE_PRESENCE_BATCH = 200
+
+# A login older than this no longer keeps an employee's presence alive
+LOGIN_WINDOW = timedelta(hours=24)
+
+# EmployeeLocation fields copied onto each employee by with_latest_location()
+LATEST_LOCATION_FIELDS = [
+    'latitude', 'longitude', 'is_in_office_radius', 'distance_from_office', 'timestamp', 'is_active'
+]
+
+# Columns rewritten by record_location_presence
+LOCATION_PRESENCE_FIELDS = [
+    'last_location_at', 'latitude', 'longitude', 'is_in_office_radius', 'distance_from_office', 'is_sharing',
+    'updated_at'
+]
+
+def presence_status(location_timestamp, location_active, last_attendance_at, now=None):
+    """
+    (is_online, reason) from already-loaded values; the rules of check_employee_online_status:
+    1. Sharing with a location update in the last 10 minutes -> online
+    2. No login for more than 24 hours -> offline
+    3. Sharing but the location is older than 10 minutes -> offline
+    4. Otherwise offline (no recent activity)
+    """
+    now = now or timezone.now()
+
+    if location_timestamp is not None and location_active and now - location_timestamp <= ONLINE_LOCATION_WINDOW:
+        return True, 'recent_location'
+
+    if last_attendance_at is not None and now - last_attendance_at > LOGIN_WINDOW:
+        return False, 'no_recent_login'
+
+    if location_timestamp is not None and location_active:
+        return False, 'stale_location'
+
+    return False, 'no_recent_activity'
+
+def with_latest_location(queryset):
+    """
+    Annotate employees with latest_location_<field> for each of LATEST_LOCATION_FIELDS
+    and last_attendance_at, as subqueries of the one employee query
+    """
+    # -pk breaks timestamp ties so every subquery picks the same row
+    latest_location = EmployeeLocation.objects.filter(employee=OuterRef('pk')).order_by('-timestamp', '-pk')
+    latest_attendance = Attendance.objects.filter(employee=OuterRef('pk')).order_by('-timestamp')
+    return queryset.annotate(
+        **{f'latest_location_{field}': Subquery(latest_location.values(field)[:1]) for field in LATEST_LOCATION_FIELDS},
+        last_attendance_at=Subquery(latest_attendance.values('timestamp')[:1])
+    )
+
+def _heartbeat_cache():
+    return caches[getattr(settings, 'PRESENCE_CACHE_ALIAS', 'default')]
+
+def _heartbeat_key(employee_id):
+    return f'presence:{employee_id}'
+
+def record_heartbeat(employee_id, at=None):
+    """
+    Sharing ping from an employee (employee_id, the public id): keep them online until
+    ONLINE_LOCATION_WINDOW after `at`; the key expires by itself when the pings stop
+    """
+    now = timezone.now()
+    at = min(at or now, now)
+    timeout = (ONLINE_LOCATION_WINDOW - (now - at)).total_seconds()
+    if timeout > 0:
+        _heartbeat_cache().set(_heartbeat_key(employee_id), at, timeout)
+
+def clear_heartbeats(employee_ids):
+    """Sharing turned off: offline immediately instead of when the key expires"""
+    if employee_ids:
+        _heartbeat_cache().delete_many([_heartbeat_key(employee_id) for employee_id in employee_ids])
+
+def online_heartbeats(employee_ids):
+    """{employee_id: last ping time} of the employees that are online, in one cache get_many"""
+    keys = {_heartbeat_key(employee_id): employee_id for employee_id in employee_ids}
+    if not keys:
+        return {}
+    return {keys[key]: at for key, at in _heartbeat_cache().get_many(list(keys)).items()}
+
+def online_ids(latest_locations, now=None):
+    """
+    Public ids of the employees that are online, from {employee_id: (location timestamp, is_active)}:
+    presence_status() on the location, else a live heartbeat (one get_many for the rest)
+    """
+    now = now or timezone.now()
+    online = {employee_id for employee_id, (timestamp, is_active) in latest_locations.items()
+              if timestamp is not None and presence_status(timestamp, is_active, None, now)[0]}
+    online.update(online_heartbeats([employee_id for employee_id in latest_locations if employee_id not in online]))
+    return online
+
+def presence_from_location(location):
+    """Unsaved EmployeePresence carrying an EmployeeLocation's position (attendance left untouched)"""
+    return EmployeePresence(
+        employee_id=location.employee_id,
+        last_location_at=location.timestamp,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        is_in_office_radius=location.is_in_office_radius,
+        distance_from_office=location.distance_from_office,
+        is_sharing=location.is_active
+    )
+
+def record_location_presence(locations):
+    """
+    Upsert presence from each employee's newly written latest EmployeeLocation
+    (one INSERT ... ON CONFLICT for the batch); callers pass only rows that are the newest for their employee
+    Only moves last_location_at forward: an employee whose stored fix is newer (written by
+    another worker) is skipped, so an older ping never flips a sharing employee offline
+    """
+    rows = {location.employee_id: presence_from_location(location) for location in locations}
+    for employee_pk, stored_at in EmployeePresence.objects.filter(
+        employee_id__in=list(rows), last_location_at__isnull=False
+    ).values_list('employee_id', 'last_location_at'):
+        if stored_at > rows[employee_pk].last_location_at:
+            del rows[employee_pk]
+    if rows:
+        EmployeePresence.objects.bulk_create(
+            list(rows.values()), update_conflicts=True, unique_fields=['employee'],
+            update_fields=LOCATION_PRESENCE_FIELDS
+        )
+
+def record_sharing_stopped(employee_pks):
+    """Location sharing turned off (or timed out) for these employees"""
+    if employee_pks:
+        EmployeePresence.objects.filter(employee_id__in=employee_pks).update(
+            is_sharing=False, updated_at=timezone.now()
+        )
+
+def record_attendance_presence(attendance_times):
+    """
+    {employee pk: attendance timestamp}; only moves last_attendance_at forward,
+    so replayed offline check-ins older than the latest one are ignored
+    One UPDATE per ATTENDANCE_PRESENCE_BATCH employees: a CASE picks each row's
+    timestamp and the WHERE keeps only rows it moves forward
+    """
+    if not attendance_times:
+        return
+    EmployeePresence.objects.bulk_create(
+        [EmployeePresence(employee_id=employee_pk) for employee_pk in attendance_times], ignore_conflicts=True
+    )
+    now = timezone.now()
+    items = list(attendance_times.items())
+    for start in range(0, len(items), ATTENDANCE_PRESENCE_BATCH):
+        batch = items[start:start + ATTENDANCE_PRESENCE_BATCH]
+        forward = Q()
+        for employee_pk, at in batch:
+            forward |= Q(employee_id=employee_pk) & (Q(last_attendance_at__isnull=True) | Q(last_attendance_at__lt=at))
+        EmployeePresence.objects.filter(forward).update(
+            last_attendance_at=Case(
+                *[When(employee_id=employee_pk, then=Value(at)) for employee_pk, at in batch],
+                output_field=DateTimeField()
+            ),
+            updated_at=now
+        )
+
+
+def employee_presence(queryset, buffered=None, now=None, use_heartbeats=False):
+    """
+    [(employee, latest EmployeeLocation or None, is_online)] from the presence records (one joined query)
+    queryset: Employee queryset (select_related('office') it if the caller reads the office)
+    buffered: {employee pk: EmployeeLocation} of newer unflushed rows (location_buffer.latest());
+    a buffered row newer than the recorded one replaces it
+    use_heartbeats: also count employees with a live heartbeat key as online (one get_many);
+    off for the status sync, which must only act on what the DB says
+    Locations built from presence records are unsaved (pk None); they carry the fields the views read
+    """
+    now = now or timezone.now()
+    buffered = buffered or {}
+    employees = list(queryset.select_related('presence'))
+    heartbeats = online_heartbeats([employee.employee_id for employee in employees]) if use_heartbeats else {}
+
+    presence = []
+    for employee in employees:
+        location = None
+        try:
+            record = employee.presence
+        except EmployeePresence.DoesNotExist:
+            record = None
+        if record is not None and record.last_location_at is not None:
+            location = EmployeeLocation(
+                employee=employee,
+                latitude=record.latitude,
+                longitude=record.longitude,
+                is_in_office_radius=record.is_in_office_radius,
+                distance_from_office=record.distance_from_office,
+                timestamp=record.last_location_at,
+                is_active=record.is_sharing
+            )
+
+        newer = buffered.get(employee.pk)
+        if newer is not None and (location is None or newer.timestamp >= location.timestamp):
+            location = newer
+
+        is_online, _ = presence_status(
+            location.timestamp if location else None,
+            location.is_active if location else False,
+            record.last_attendance_at if record else None,
+            now
+        )
+        presence.append((employee, location, is_online or employee.employee_id in heartbeats))
+    return presence
+
+def sync_presence_flags(presence):
+    """
+    Deactivate the latest location of every employee that is no longer online,
+    with one UPDATE for the locations and one for the presence records
+    (online requires an active location, so the flag only ever turns off here)
+    presence: employee_presence() result; returns [(employee, is_online)] of the employees changed
+    """
+    from .live_stream import publish_status
+    from .location_buffer import location_buffer
+
+    changed = [(employee, is_online) for employee, location, is_online in presence
+               if location is not None and location.is_active and not is_online]
+    employee_pks = [employee.pk for employee, _ in changed]
+    if employee_pks:
+        EmployeeLocation.objects.filter(employee_id__in=employee_pks, is_active=True).update(is_active=False)
+        record_sharing_stopped(employee_pks)
+    for employee, is_online in changed:
+        location_buffer.deactivate(employee.pk)  # Otherwise the next flush would reactivate the row
+        publish_status(employee, is_online)
+    return changed
+
+def check_employee_online_status(employee):
+    """
+    Check if employee should be marked as offline based on:
+    1. No location update for more than 10 minutes (if they were sharing)
+    2. No login for more than 24 hours (more reasonable for daily work)
+    Single-employee form; list views use employee_presence()
+    """
+    now = timezone.now()
+
+    # Get the latest attendance (login/logout)
+    latest_attendance = Attendance.objects.filter(
+        employee=employee
+    ).order_by('-timestamp').first()
+
+    # Get the latest location update
+    latest_location = EmployeeLocation.objects.filter(
+        employee=employee
+    ).order_by('-timestamp', '-pk').first()
+
+    is_online, reason = presence_status(
+        latest_location.timestamp if latest_location else None,
+        latest_location.is_active if latest_location else False,
+        latest_attendance.timestamp if latest_attendance else None,
+        now
+    )
+    if reason == 'recent_location':
+        time_since_location = now - latest_location.timestamp
+        print(f"✅ Employee {employee.name} has recent location update ({time_since_location.total_seconds()/60:.1f} minutes ago) - marking online")
+    elif reason == 'no_recent_login':
+        time_since_login = now - latest_attendance.timestamp
+        print(f"🕐 Employee {employee.name} hasn't logged in for {time_since_login.total_seconds()/3600:.1f} hours - marking offline")
+    elif reason == 'stale_location':
+        time_since_location = now - latest_location.timestamp
+        print(f"📍 Employee {employee.name} hasn't sent location for {time_since_location.total_seconds()/60:.1f} minutes - marking offline")
+    return is_online
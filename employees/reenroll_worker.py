@@ -0,0 +1,58 @@
+"""
+Pool-process side of the reenroll_faces command
+Kept free of Django model imports so it can be imported by a child started with
+the spawn method (the default on macOS and Windows), where the app registry is not
+loaded yet. init_worker() sets Django up in such a child before the first task,
+for extractors that need settings or models.
+"""
+
+import base64
+import os
+
+import numpy as np
+
+
+def init_worker():
+    """ProcessPoolExecutor initializer: set Django up in spawned children (a no-op after fork)"""
+    from django.apps import apps
+
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def extract_descriptor(task):
+    """
+    Runs in a pool process: load one employee's face image and compute its descriptor
+    task: (pk, local_path, cloudinary_url, extractor_path)
+    Returns (pk, descriptor list or None, error or None)
+    """
+    from django.utils.module_loading import import_string
+
+    pk, local_path, cloudinary_url, extractor_path = task
+    try:
+        if local_path and os.path.exists(local_path):
+            with open(local_path, 'rb') as image_file:
+                image_data = image_file.read()
+        elif cloudinary_url:
+            import requests
+            response = requests.get(cloudinary_url, timeout=30)
+            response.raise_for_status()
+            image_data = response.content
+        else:
+            return pk, None, 'no face image available'
+
+        extractor = import_string(extractor_path)
+        descriptor = extractor(base64.b64encode(image_data).decode('ascii'))
+        if descriptor is None:
+            return pk, None, 'extractor returned no descriptor'
+
+        descriptor = np.asarray(descriptor, dtype=np.float32).reshape(-1)
+        if descriptor.shape[0] != 128:
+            return pk, None, f'descriptor has {descriptor.shape[0]} dims'
+        norm = float(np.linalg.norm(descriptor))
+        if norm < 1e-6 or not np.isfinite(norm):
+            return pk, None, 'no face detected (empty descriptor)'
+        return pk, descriptor.tolist(), None
+    except Exception as e:
+        return pk, None, str(e)
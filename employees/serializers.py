@@ -28,10 +28,27 @@ class AttendanceSerializer(serializers.ModelSerializer):
 
 # employees/serializers.py
 
+class BoundaryField(serializers.Field):
+    """GeoJSON Polygon/MultiPolygon on the API, compact boundary_codec blob in the DB (numpy: imported on use)"""
+    def to_representation(self, value):
+        from .boundary_codec import boundary_to_geojson
+
+        return boundary_to_geojson(value) if value else None
+
+    def to_internal_value(self, data):
+        from .boundary_codec import encode_boundary
+
+        try:
+            return encode_boundary(data)
+        except (ValueError, TypeError) as e:
+            raise serializers.ValidationError(str(e))
+
 class OfficeLocationSerializer(serializers.ModelSerializer):
+    boundary = BoundaryField(required=False, allow_null=True)
+
     class Meta:
         model = OfficeLocation
-        fields =  ['id', 'name', 'latitude', 'longitude', 'radius_meters']  # include 'id' and 'name'
+        fields =  ['id', 'name', 'latitude', 'longitude', 'radius_meters', 'boundary']  # include 'id' and 'name'
 
 class EmployeeSerializer(serializers.ModelSerializer):
     office_latitude = serializers.FloatField(source='office.latitude')
@@ -64,6 +81,9 @@ class LocationAlertSerializer(serializers.ModelSerializer):
     employee_name = serializers.CharField(source='employee.name')
     employee_id = serializers.CharField(source='employee.employee_id')
     
+    duration_seconds = serializers.FloatField(read_only=True)
+
     class Meta:
         model = LocationAlert
-        fields = ['id', 'employee_id', 'employee_name', 'latitude', 'longitude', 'distance', 'timestamp', 'office_name']
+        fields = ['id', 'employee_id', 'employee_name', 'latitude', 'longitude', 'distance', 'timestamp', 'office_name',
+                  'max_distance', 'last_seen_at', 'ended_at', 'ping_count', 'duration_seconds']
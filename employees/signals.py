@@ -0,0 +1,59 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Employee, EmployeePresence, OfficeLocation
+
+# face_gallery (numpy) is imported inside the handlers so management commands and
+# migrations that never touch employees don't pay for it at startup
+
+
+@receiver(post_save, sender=Employee)
+def add_employee_to_gallery(sender, instance, **kwargs):
+    """Keep the in-memory face gallery in sync with registrations/updates"""
+    from .face_gallery import face_gallery
+    if instance.face_encoding:
+        face_gallery.add(
+            instance.employee_id, instance.name, instance.face_encoding, instance.face_encoding_norm
+        )
+    else:
+        face_gallery.remove(instance.employee_id)
+
+
+@receiver(post_delete, sender=Employee)
+def remove_employee_from_gallery(sender, instance, **kwargs):
+    from .face_gallery import face_gallery
+    face_gallery.remove(instance.employee_id)
+
+
+@receiver(post_save, sender=OfficeLocation)
+@receiver(post_delete, sender=OfficeLocation)
+def invalidate_office_index(sender, instance, **kwargs):
+    """Office edits rebuild the spatial index on the next lookup"""
+    from .office_index import office_index
+    office_index.invalidate()
+
+
+@receiver(post_save, sender=Employee)
+def touch_employee_presence(sender, instance, raw=False, **kwargs):
+    """New or edited employees show up in live location delta polls"""
+    if raw:
+        return
+    EmployeePresence.objects.bulk_create(
+        [EmployeePresence(employee=instance)], update_conflicts=True, unique_fields=['employee'],
+        update_fields=['updated_at']
+    )
+
+
+@receiver(post_delete, sender=Employee)
+def record_employee_removal(sender, instance, **kwargs):
+    """Tombstone so delta polls can tell dashboards to drop the employee"""
+    from .live_delta import record_removal
+    record_removal(instance.employee_id)
+
+
+@receiver(post_save, sender=OfficeLocation)
+def touch_office_presence(sender, instance, created=False, raw=False, **kwargs):
+    """Live location entries carry their office's name and geofence"""
+    if not created and not raw:
+        EmployeePresence.objects.filter(employee__office=instance).update(updated_at=timezone.now())
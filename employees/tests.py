@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .ann_index import IVFIndex
+from .boundary_codec import boundary_to_geojson, decode_boundary, encode_boundary
+from .descriptor_codec import decode_descriptor, descriptor_format, encode_descriptor, is_quantized
+from .face_gallery import FaceGallery, face_gallery
+from .face_snapshot import read_current_generation
+from .geofence import OfficeGeofence, PolygonGeofence, evaluate_points, geodesic_meters, meters_per_degree
+from .geofence_alerts import track_geofence
+from .live_delta import TOMBSTONE_RETENTION, next_cursor, parse_cursor
+from .live_stream import LocalBroker, encode_event, location_payload
+from .location_buffer import LocationBuffer
+from .management.commands.compact_location_history import bucket_floor
+from .models import (
+    Attendance, Employee, EmployeeLocation, EmployeePresence, FaceTemplate, LocationAlert, LocationHistory,
+    OfficeLocation
+)
+from .office_index import OfficeSpatialIndex
+from .presence import (
+    LOCATION_HEARTBEAT_SECONDS, check_employee_online_status, clear_heartbeats, employee_presence, online_heartbeats,
+    presence_status, record_attendance_presence, record_heartbeat, record_location_presence
+)
+from .reenroll_worker import extract_descriptor, init_worker
+from .trajectory import represented_counts, simplify_track, track_errors
+from .utils import (
+    decode_face_encoding, decode_unit_descriptor, descriptor_similarity, find_duplicate_pairs, normalize_descriptor,
+    score_templates, score_templates_batch
+)
+
+IMAGE_BASE64 = 'data:image/jpeg;base64,' + base64.b64encode(b'\xff\xd8test-jpeg').decode()
+
+
+def random_descriptor(seed):
+    return np.random.default_rng(seed).normal(size=128).astype(np.float32)
+
+
+def seeded_extractor(image_base64):
+    """reenroll_faces --extractor for tests: the stored image is just the descriptor's seed"""
+    return random_descriptor(int(base64.b64decode(image_base64)))
+
+
+@override_settings(FACE_GALLERY_SNAPSHOT_DIR='', LOCATION_BUFFER_ENABLED=False)
+class EmployeeAPITestCase(TestCase):
+    """Offices/employees fixtures; media goes to a temporary directory, Cloudinary is stubbed, shared caches are reset"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='employees-tests-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.enterContext(mock.patch('employees.views.upload_base64_to_cloudinary', return_value=(None, None)))
+        cache.clear()
+        face_gallery._loaded_at = None
+        self.client = APIClient()
+        self.office = OfficeLocation.objects.create(name='HQ', latitude=12.9716, longitude=77.5946,
+                                                    radius_meters=100)
+
+    def make_employee(self, employee_id, descriptor=None, office=None):
+        employee = Employee(name=f'Employee {employee_id}', employee_id=employee_id, office=office or self.office,
+                            face_image='face_images/test.jpg')
+        if descriptor is not None:
+            unit, norm = normalize_descriptor(descriptor)
+            employee.face_encoding = encode_descriptor(unit)
+            employee.face_encoding_norm = norm
+        employee.save()
+        return employee
+
+
+class BulkAttendanceTests(EmployeeAPITestCase):
+    def record(self, employee_id, descriptor, **fields):
+        return dict({
+            'employee_id': employee_id,
+            'descriptor': [float(value) for value in descriptor],
+            'latitude': self.office.latitude,
+            'longitude': self.office.longitude,
+            'action': 'login',
+        }, **fields)
+
+    def test_records_are_verified_independently(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        self.make_employee('E2', random_descriptor(2))
+
+        response = self.client.post('/api/attendance/bulk/', {'records': [
+            self.record('E1', face, face_image=IMAGE_BASE64),
+            self.record('E2', face),
+            self.record('E1', face, latitude=13.5),
+            self.record('NOPE', face),
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['recorded', 'face_mismatch', 'location_mismatch', 'error'])
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_malformed_records_do_not_fail_the_batch(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+
+        response = self.client.post('/api/attendance/bulk/', {'records': [
+            self.record('E1', face, face_image='abc'),
+            dict(self.record('E1', face), descriptor=5),
+            dict(self.record('E1', face), descriptor=['x'] * 128),
+            'not a record',
+            self.record('E1', face, face_image=12),
+            self.record('E1', face),
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], list(range(6)))
+        self.assertEqual([result['status'] for result in results], ['error'] * 5 + ['recorded'])
+        self.assertEqual(response.data['recorded'], 1)
+
+    def test_non_finite_coordinates_are_a_record_error(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+
+        response = self.client.post('/api/attendance/bulk/', {'records': [
+            self.record('E1', face, latitude='nan'),
+            self.record('E1', face, longitude='inf'),
+            self.record('E1', face, latitude=91),
+            self.record('E1', face),
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['error'] * 3 + ['recorded'])
+        self.assertEqual(results[0]['error'], 'Coordinates out of range')
+
+    def test_replayed_records_are_not_stored_twice(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        record = self.record('E1', face, captured_at='2026-01-05T09:00:00Z')
+
+        self.client.post('/api/attendance/bulk/', {'records': [record]}, format='json')
+        response = self.client.post('/api/attendance/bulk/', {'records': [record]}, format='json')
+
+        self.assertEqual(response.data['results'][0]['status'], 'duplicate')
+        self.assertEqual(Attendance.objects.count(), 1)
+
+
+class BulkLocationUpdateTests(EmployeeAPITestCase):
+    def post_points(self, *points):
+        return self.client.post('/api/location-update/bulk/', {'points': list(points)}, format='json')
+
+    def point(self, employee_id, minutes_ago, latitude=12.9716, longitude=77.5946):
+        return {'employee_id': employee_id, 'latitude': latitude, 'longitude': longitude,
+                'timestamp': (timezone.now() - timedelta(minutes=minutes_ago)).isoformat()}
+
+    def test_points_are_replayed_in_time_order(self):
+        self.make_employee('E1')
+        response = self.post_points(
+            self.point('E1', 1, latitude=12.99),
+            self.point('E1', 3, latitude=12.98),
+            self.point('E1', 5),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stored'], 3)
+        location = EmployeeLocation.objects.get(employee__employee_id='E1', is_active=True)
+        self.assertEqual(location.latitude, 12.99)
+        self.assertFalse(location.is_in_office_radius)
+
+        response = self.post_points(self.point('E1', 10))
+        self.assertEqual(response.data['stale'], 1)
+
+    def test_invalid_points_are_reported_per_index(self):
+        self.make_employee('E1')
+        response = self.post_points(
+            self.point('E1', 1),
+            {'employee_id': 'E1', 'latitude': 'north', 'longitude': 77.5},
+            self.point('E1', 1, latitude=95),
+            self.point('NOPE', 1),
+            {'employee_id': 'E1', 'latitude': 12.9, 'longitude': 77.5, 'timestamp': 'yesterday'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4])
+
+    def test_future_timestamps_are_rejected(self):
+        self.make_employee('E1')
+        response = self.post_points({'employee_id': 'E1', 'latitude': 12.9716, 'longitude': 77.5946,
+                                     'timestamp': '2030-01-01T00:00:00Z'})
+        self.assertEqual(response.data['errors'], [{'index': 0, 'error': 'Timestamp is in the future'}])
+        self.assertFalse(EmployeeLocation.objects.exists())
+
+        response = self.post_points(self.point('E1', 1))
+        self.assertEqual((response.data['stored'], response.data['stale']), (1, 0))
+
+
+class FaceGallerySnapshotTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_dir = os.path.join(self.media_root, 'face_snapshot')
+
+    def test_snapshot_is_opt_in(self):
+        with override_settings(FACE_GALLERY_SNAPSHOT_DIR=''):
+            self.assertEqual(FaceGallery().snapshot_dir, '')
+
+    def test_first_identify_builds_and_maps_the_snapshot(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        gallery = FaceGallery(snapshot_dir=self.snapshot_dir)
+
+        self.assertEqual(gallery.identify(face, top_k=1)[0][0], 'E1')
+        self.assertIsNotNone(read_current_generation(self.snapshot_dir))
+        self.assertIsInstance(gallery._state[0], np.memmap)
+
+    def test_writes_apply_locally_and_rebuild_the_snapshot_after_commit(self):
+        gallery = FaceGallery(snapshot_dir=self.snapshot_dir)
+        gallery.load()
+        generation = read_current_generation(self.snapshot_dir)
+        unit, norm = normalize_descriptor(random_descriptor(2))
+
+        with mock.patch.object(gallery, 'request_rebuild') as request_rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                gallery.add('E2', 'Employee E2', encode_descriptor(unit), norm)
+                self.assertEqual(read_current_generation(self.snapshot_dir), generation)
+                request_rebuild.assert_not_called()
+            request_rebuild.assert_called_once_with()
+
+        self.assertEqual(gallery.identify(unit, top_k=1)[0][0], 'E2')
+
+    def test_stale_snapshot_is_rebuilt_in_the_background(self):
+        gallery = FaceGallery(snapshot_dir=self.snapshot_dir, max_age=60)
+        gallery.load()
+        with mock.patch('employees.face_gallery.generation_age', return_value=61), \
+                mock.patch.object(gallery, 'request_rebuild') as request_rebuild, \
+                mock.patch.object(gallery, 'load') as load:
+            gallery.ensure_loaded()
+        request_rebuild.assert_called_once_with(changed=False)
+        load.assert_not_called()
+
+    def test_stale_in_memory_gallery_is_rebuilt_in_the_background(self):
+        gallery = FaceGallery(snapshot_dir='', max_age=0)
+        gallery.load()
+        rebuilt = threading.Event()
+        with mock.patch.object(gallery, 'load', side_effect=rebuilt.set) as load:
+            gallery.ensure_loaded()
+            self.assertTrue(rebuilt.wait(5))
+        load.assert_called_once_with()
+
+
+class FaceTemplateTests(EmployeeAPITestCase):
+    def add_template(self, employee_id, descriptor):
+        return self.client.post(f'/api/employees/{employee_id}/face-templates/',
+                                {'descriptor': [float(value) for value in descriptor]}, format='json')
+
+    def test_templates_extend_verification(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        other_angle = random_descriptor(3)
+
+        response = self.add_template('E1', other_angle)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(FaceTemplate.objects.filter(employee__employee_id='E1').count(), 1)
+
+        response = self.client.post('/api/attendance/', {
+            'employee_id': 'E1', 'descriptor': [float(value) for value in other_angle], 'face_image': IMAGE_BASE64,
+            'latitude': self.office.latitude, 'longitude': self.office.longitude, 'action': 'login',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_another_employees_face_is_rejected(self):
+        self.make_employee('E1', random_descriptor(1))
+        someone_else = random_descriptor(2)
+        self.make_employee('E2', someone_else)
+
+        response = self.add_template('E1', someone_else)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicate_employee_id'], 'E2')
+        self.assertFalse(FaceTemplate.objects.exists())
+
+
+class IdentifyFaceTests(EmployeeAPITestCase):
+    def identify(self, descriptor, **fields):
+        return self.client.post('/api/identify-face/',
+                                dict({'descriptor': [float(value) for value in descriptor]}, **fields), format='json')
+
+    def test_best_match_is_returned(self):
+        faces = [random_descriptor(seed) for seed in range(5)]
+        for index, face in enumerate(faces):
+            self.make_employee(f'E{index}', face)
+
+        response = self.identify(faces[3] + 0.01, top_k=3)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['match']['employee_id'], 'E3')
+        self.assertEqual(len(response.data['candidates']), 3)
+        self.assertEqual(response.data['gallery_size'], 5)
+
+    def test_unknown_face_has_no_match(self):
+        self.make_employee('E1', random_descriptor(1))
+        response = self.identify(random_descriptor(99))
+        self.assertIsNone(response.data['match'])
+
+    def test_top_k_is_validated_and_clamped(self):
+        self.make_employee('E1', random_descriptor(1))
+        self.assertEqual(self.identify(random_descriptor(1), top_k='abc').status_code, 400)
+        self.assertEqual(len(self.identify(random_descriptor(1), top_k=0).data['candidates']), 1)
+        self.assertEqual(self.identify(random_descriptor(1), top_k=10 ** 9).status_code, 200)
+        self.assertEqual(self.identify([1.0] * 12).status_code, 400)
+
+
+class LocationBufferTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer = LocationBuffer(flush_interval=3600)
+        self.enterContext(override_settings(LOCATION_BUFFER_ENABLED=True))
+        self.employee = self.make_employee('E1')
+
+    def location(self, latitude, minutes_ago=0, pk=None):
+        return EmployeeLocation(pk=pk, employee=self.employee, latitude=latitude, longitude=77.5946,
+                                is_in_office_radius=True, distance_from_office=0,
+                                timestamp=timezone.now() - timedelta(minutes=minutes_ago))
+
+    def test_pings_are_coalesced_into_one_row(self):
+        self.buffer.put(self.location(12.90, minutes_ago=2))
+        self.buffer.put(self.location(12.91, minutes_ago=1))
+        self.assertEqual(self.buffer.metrics()['pending'], 1)
+        self.assertFalse(EmployeeLocation.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer.metrics()['pending'], 0)
+        self.assertEqual(list(EmployeeLocation.objects.values_list('latitude', flat=True)), [12.91])
+        self.assertEqual(EmployeePresence.objects.get(employee=self.employee).latitude, 12.91)
+
+        self.buffer.put(self.location(12.92))
+        self.buffer.flush()
+        self.assertEqual(list(EmployeeLocation.objects.values_list('latitude', flat=True)), [12.92])
+
+    def test_flush_reuses_the_active_row_of_another_worker(self):
+        other_worker = [self.location(12.80, minutes_ago=5), self.location(12.81, minutes_ago=4)]
+        for location in other_worker:
+            location.set_grid_cell()
+        EmployeeLocation.objects.bulk_create(other_worker)
+
+        self.buffer.put(self.location(12.95))
+        self.buffer.flush()
+
+        active = EmployeeLocation.objects.filter(employee=self.employee, is_active=True)
+        self.assertEqual(list(active.values_list('latitude', flat=True)), [12.95])
+        self.assertEqual(EmployeeLocation.objects.count(), 2)
+
+    def test_older_ping_does_not_overwrite_a_newer_fix_of_another_worker(self):
+        self.buffer.put(self.location(12.90, minutes_ago=3))
+        self.buffer.flush()
+        self.buffer.put(self.location(12.91, minutes_ago=2))
+
+        # Meanwhile another worker flushed a newer fix into the same row
+        other_worker = LocationBuffer(flush_interval=3600)
+        other_worker.put(self.location(12.99, minutes_ago=1))
+        other_worker.flush()
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.metrics()['stale_rows'], 1)
+        self.assertEqual(self.buffer.metrics()['pending'], 0)
+        self.assertIsNone(self.buffer.get(self.employee.pk))
+        self.assertEqual(list(EmployeeLocation.objects.filter(is_active=True).values_list('latitude', flat=True)),
+                         [12.99])
+        presence = EmployeePresence.objects.get(employee=self.employee)
+        self.assertEqual(presence.latitude, 12.99)
+        self.assertTrue(presence_status(presence.last_location_at, presence.is_sharing, None)[0])
+
+    def test_presence_never_moves_back(self):
+        record_location_presence([self.location(12.99, minutes_ago=1)])
+        record_location_presence([self.location(12.90, minutes_ago=20)])
+        self.assertEqual(EmployeePresence.objects.get(employee=self.employee).latitude, 12.99)
+
+    def test_deactivate_marks_the_entry_pending(self):
+        self.buffer.put(self.location(12.90))
+        self.buffer.flush()
+        self.buffer.deactivate(self.employee.pk)
+        self.assertEqual(self.buffer.metrics()['pending'], 1)
+        self.assertIsNone(self.buffer.get(self.employee.pk))
+
+        self.buffer.flush()
+        self.assertFalse(EmployeeLocation.objects.get(employee=self.employee).is_active)
+
+
+class ViewportTests(EmployeeAPITestCase):
+    def place(self, employee_id, latitude, longitude, minutes_ago=1):
+        employee = self.make_employee(employee_id)
+        location = EmployeeLocation.objects.create(employee=employee, latitude=latitude, longitude=longitude,
+                                                   is_in_office_radius=False, distance_from_office=0)
+        EmployeeLocation.objects.filter(pk=location.pk).update(
+            timestamp=timezone.now() - timedelta(minutes=minutes_ago))
+        return employee
+
+    def viewport(self, **params):
+        return self.client.get('/api/live-employee-locations/viewport/', params)
+
+    def test_bbox_returns_only_positions_inside(self):
+        self.place('IN', 12.55, 77.55)
+        self.place('OUT', 12.65, 77.55)
+        self.place('EAST', 12.55, 179.995)
+
+        response = self.viewport(bbox='77.5,12.5,77.6,12.6')
+        self.assertEqual([entry['employee_id'] for entry in response.data['employees']], ['IN'])
+
+        response = self.viewport(bbox='179.99,12.5,-179.99,12.6')
+        self.assertEqual([entry['employee_id'] for entry in response.data['employees']], ['EAST'])
+
+    def test_radius_is_applied_before_the_page_limit(self):
+        # Newer positions in the circle's bounding box but outside the circle must not fill the page
+        for index in range(6):
+            self.place(f'CORNER{index}', 12.5 + 0.0089, 77.5 + 0.0092, minutes_ago=1)
+        for index in range(3):
+            self.place(f'NEAR{index}', 12.5, 77.5 + index * 0.001, minutes_ago=5)
+
+        with mock.patch('employees.views.MAX_VIEWPORT_POINTS', 5):
+            response = self.viewport(lat=12.5, lon=77.5, radius=1000, cluster=0)
+
+        self.assertEqual(sorted(entry['employee_id'] for entry in response.data['employees']),
+                         ['NEAR0', 'NEAR1', 'NEAR2'])
+        self.assertFalse(response.data['truncated'])
+
+        response = self.viewport(lat=12.5, lon=77.5, radius=1000, cluster=1, zoom=10)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_heartbeat_keeps_a_stale_position_online(self):
+        self.place('BEAT', 12.55, 77.55, minutes_ago=11)
+        self.place('GONE', 12.56, 77.55, minutes_ago=11)
+        record_heartbeat('BEAT', timezone.now() - timedelta(minutes=1))
+
+        response = self.viewport(bbox='77.5,12.5,77.6,12.6')
+        status = {entry['employee_id']: entry['status'] for entry in response.data['employees']}
+        self.assertEqual(status, {'BEAT': 'online', 'GONE': 'offline'})
+
+        response = self.viewport(bbox='77.5,12.5,77.6,12.6', cluster=1, zoom=3)
+        self.assertEqual((response.data['clusters'][0]['count'], response.data['clusters'][0]['online']), (2, 1))
+
+    def test_invalid_viewports_are_rejected(self):
+        self.assertEqual(self.viewport(bbox='1,2,3').status_code, 400)
+        self.assertEqual(self.viewport(lat=12.5, lon=77.5, radius=-1).status_code, 400)
+        self.assertEqual(self.viewport(bbox='77.5,12.5,77.6,12.6', zoom='near').status_code, 400)
+
+
+class AttendancePresenceTests(EmployeeAPITestCase):
+    def test_batch_moves_last_attendance_forward_only(self):
+        first, second, third = (self.make_employee(employee_id) for employee_id in ('A1', 'A2', 'A3'))
+        now = timezone.now()
+        record_attendance_presence({first.pk: now, second.pk: now})
+
+        with self.assertNumQueries(2):
+            record_attendance_presence({
+                first.pk: now - timedelta(hours=1),   # replayed older check-in
+                second.pk: now + timedelta(minutes=5),
+                third.pk: now,                        # no presence record yet
+            })
+
+        attendance = dict(EmployeePresence.objects.values_list('employee_id', 'last_attendance_at'))
+        self.assertEqual(attendance[first.pk], now)
+        self.assertEqual(attendance[second.pk], now + timedelta(minutes=5))
+        self.assertEqual(attendance[third.pk], now)
+
+    def test_large_batches_are_split(self):
+        employees = [self.make_employee(f'B{index}') for index in range(5)]
+        now = timezone.now()
+        with mock.patch('employees.presence.ATTENDANCE_PRESENCE_BATCH', 2):
+            record_attendance_presence({employee.pk: now for employee in employees})
+        self.assertEqual(EmployeePresence.objects.filter(last_attendance_at=now).count(), 5)
+
+    def test_write_paths_keep_records_consistent(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        self.client.post('/api/attendance/', {
+            'employee_id': 'E1', 'descriptor': [float(value) for value in face], 'face_image': IMAGE_BASE64,
+            'latitude': self.office.latitude, 'longitude': self.office.longitude, 'action': 'login',
+        }, format='json')
+        self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.9720, 'longitude': 77.5946},
+                         format='json')
+
+        record = EmployeePresence.objects.get(employee__employee_id='E1')
+        self.assertEqual(record.last_attendance_at, Attendance.objects.get().timestamp)
+        self.assertEqual((record.latitude, record.is_sharing), (12.9720, True))
+        call_command('sync_employee_presence', '--check', stdout=io.StringIO())
+
+        self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.9720, 'longitude': 77.5946,
+                                                   'is_sharing': False}, format='json')
+        self.assertFalse(EmployeePresence.objects.get(employee__employee_id='E1').is_sharing)
+        call_command('sync_employee_presence', '--check', stdout=io.StringIO())
+
+    def test_sync_command_reports_and_repairs_drift(self):
+        employee = self.make_employee('E1')
+        EmployeeLocation.objects.create(employee=employee, latitude=12.97, longitude=77.59, is_in_office_radius=True,
+                                        distance_from_office=0)
+
+        with self.assertRaisesMessage(CommandError, '1 of 1 presence records drifted'):
+            call_command('sync_employee_presence', '--check', stdout=io.StringIO())
+        call_command('sync_employee_presence', stdout=io.StringIO())
+        call_command('sync_employee_presence', '--check', stdout=io.StringIO())
+        self.assertEqual(EmployeePresence.objects.get(employee=employee).latitude, 12.97)
+
+
+class DescriptorSimilarityTests(EmployeeAPITestCase):
+    def check_in(self, employee_id, descriptor):
+        return self.client.post('/api/attendance/', {
+            'employee_id': employee_id, 'descriptor': [float(value) for value in descriptor],
+            'face_image': IMAGE_BASE64, 'latitude': self.office.latitude, 'longitude': self.office.longitude,
+            'action': 'login',
+        }, format='json')
+
+    def test_normalized_dot_product_is_cosine_similarity(self):
+        first, second = random_descriptor(1), random_descriptor(2)
+        unit, norm = normalize_descriptor(first * 3)
+
+        self.assertAlmostEqual(float(np.linalg.norm(unit)), 1.0, places=6)
+        self.assertAlmostEqual(norm, 3 * float(np.linalg.norm(first)), places=3)
+        expected = float(first @ second / (np.linalg.norm(first) * np.linalg.norm(second)))
+        self.assertAlmostEqual(descriptor_similarity(unit, normalize_descriptor(second)[0]), expected, places=5)
+
+        zero, zero_norm = normalize_descriptor(np.zeros(128))
+        self.assertEqual(zero_norm, 0)
+        self.assertFalse(zero.any())
+
+    def test_batched_template_scores_match_single_scores(self):
+        templates = np.vstack([normalize_descriptor(random_descriptor(seed))[0] for seed in range(6)])
+        owners = np.array([0, 0, 1, 1, 1, 3])
+        probes = np.vstack([normalize_descriptor(random_descriptor(seed) + 0.1)[0] for seed in (0, 3, 5, 7)])
+        claimed = np.array([0, 1, 3, 2])
+
+        for method in ('max', 'centroid'):
+            scores = score_templates_batch(probes, templates, owners, claimed, method=method)
+            for probe, owner, score in zip(probes, claimed, scores):
+                if owner in owners:
+                    self.assertAlmostEqual(float(score), score_templates(probe, templates[owners == owner], method),
+                                           places=5)
+                else:
+                    self.assertEqual(score, -1)
+
+    def test_verification_ignores_descriptor_scale_and_legacy_rows(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        self.assertEqual(self.check_in('E1', face * 7.5).status_code, 201)
+
+        # Rows stored before normalization: raw float32 blob, no norm
+        Employee.objects.filter(employee_id='E1').update(face_encoding=face.tobytes(), face_encoding_norm=None)
+        self.assertEqual(self.check_in('E1', face).status_code, 201)
+        self.assertEqual(self.check_in('E1', random_descriptor(2)).status_code, 403)
+
+
+class ApproximateIndexTests(EmployeeAPITestCase):
+    def clustered_gallery(self, size=2000, clusters=40):
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(clusters, 128))
+        vectors = centers[rng.integers(clusters, size=size)] + rng.normal(0, 0.4, size=(size, 128))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+    def recall_at_1(self, index, vectors, queries=200):
+        rng = np.random.default_rng(11)
+        picked = rng.choice(vectors.shape[0], queries, replace=False)
+        noisy = vectors[picked] + rng.normal(0, 0.02, size=(queries, 128)).astype(np.float32)
+        exact = np.argmax(noisy @ vectors.T, axis=1)
+        hits = 0
+        for query, expected in zip(noisy, exact):
+            labels, _ = index.search(query, k=1)
+            hits += bool(len(labels)) and labels[0] == expected
+        return hits / queries
+
+    def test_ivf_recall_and_exact_search_when_probing_every_list(self):
+        vectors = self.clustered_gallery()
+        index = IVFIndex(n_lists=32, n_probe=4)
+        index.train(vectors)
+        index.add(range(len(vectors)), vectors)
+
+        self.assertEqual(len(index), len(vectors))
+        self.assertGreaterEqual(self.recall_at_1(index, vectors), 0.95)
+
+        query = vectors[5]
+        labels, scores = index.search(query, k=10, n_probe=index.n_lists)
+        expected = np.argsort(-(vectors @ query))[:10]
+        self.assertEqual(list(labels), list(expected))
+        self.assertTrue(np.all(np.diff(scores) <= 1e-6))
+
+    def test_pq_codes_keep_near_duplicates_findable(self):
+        vectors = self.clustered_gallery()
+        index = IVFIndex(n_lists=32, n_probe=8, pq_subvectors=16)
+        index.train(vectors)
+        index.add(range(len(vectors)), vectors)
+
+        self.assertEqual(index._list_data[0].dtype, np.uint8)
+        hits = sum(42 + offset in list(index.search(vectors[42 + offset], k=10)[0]) for offset in range(50))
+        self.assertGreaterEqual(hits, 45)
+
+    def test_removed_and_replaced_labels(self):
+        vectors = self.clustered_gallery(size=200, clusters=5)
+        index = IVFIndex(n_lists=8)
+        index.train(vectors)
+        index.add(['a', 'b'], vectors[:2])
+
+        index.remove('a')
+        self.assertNotIn('a', index.search(vectors[0], k=5, n_probe=8)[0])
+        index.add(['b'], vectors[:1])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.search(vectors[0], k=1, n_probe=8)[0][0], 'b')
+
+    def test_gallery_switches_to_the_index_past_its_threshold(self):
+        faces = [random_descriptor(seed) for seed in range(12)]
+        for index, face in enumerate(faces):
+            self.make_employee(f'E{index}', face)
+        gallery = FaceGallery(ann_min_size=10)
+
+        gallery.load()
+        self.assertIsNotNone(gallery._ann)
+        for index, face in enumerate(faces):
+            self.assertEqual(gallery.identify(face + 0.01, top_k=1)[0][0], f'E{index}')
+
+        gallery.remove('E3')
+        self.assertNotEqual(gallery.identify(faces[3], top_k=1)[0][0], 'E3')
+
+
+class DescriptorCodecTests(EmployeeAPITestCase):
+    def test_formats_round_trip_within_their_precision(self):
+        unit, _ = normalize_descriptor(random_descriptor(1))
+        for fmt, size, tolerance in (('float32', 516, 0), ('float16', 260, 1e-3), ('int8', 136, 1e-2)):
+            blob = encode_descriptor(unit, fmt)
+            self.assertEqual(len(blob), size)
+            self.assertEqual(descriptor_format(blob), fmt)
+            self.assertEqual(is_quantized(blob), fmt != 'float32')
+            np.testing.assert_allclose(decode_descriptor(blob), unit, atol=tolerance)
+            self.assertGreater(descriptor_similarity(decode_unit_descriptor(blob), unit), 0.9999)
+
+    def test_untagged_blobs_decode_as_legacy_float32(self):
+        raw = random_descriptor(2)
+        self.assertEqual(descriptor_format(raw.tobytes()), 'legacy')
+        np.testing.assert_array_equal(decode_descriptor(raw.tobytes()), raw)
+        np.testing.assert_allclose(decode_face_encoding(raw.tobytes()), normalize_descriptor(raw)[0], rtol=1e-6)
+
+    def test_unknown_format_and_newer_version_are_rejected(self):
+        with self.assertRaises(ValueError):
+            encode_descriptor(random_descriptor(1), 'bfloat16')
+        blob = bytearray(encode_descriptor(random_descriptor(1), 'float16'))
+        blob[2] = 99
+        with self.assertRaises(ValueError):
+            decode_descriptor(bytes(blob))
+
+    def test_reencode_command_converts_rows_and_keeps_matching(self):
+        face = random_descriptor(3)
+        employee = self.make_employee('E1', face)
+        Employee.objects.filter(pk=employee.pk).update(face_encoding=face.tobytes(), face_encoding_norm=None)
+        FaceTemplate.objects.create(employee=employee, descriptor=encode_descriptor(normalize_descriptor(face)[0]))
+
+        call_command('reencode_face_descriptors', format='int8', stdout=io.StringIO())
+
+        employee.refresh_from_db()
+        self.assertEqual(descriptor_format(employee.face_encoding), 'int8')
+        self.assertAlmostEqual(employee.face_encoding_norm, float(np.linalg.norm(face)), places=3)
+        self.assertEqual(descriptor_format(FaceTemplate.objects.get().descriptor), 'int8')
+        self.assertGreater(descriptor_similarity(
+            decode_face_encoding(employee.face_encoding, employee.face_encoding_norm), normalize_descriptor(face)[0]
+        ), 0.999)
+
+
+class LazyImportTests(TestCase):
+    def test_urlconf_and_commands_load_without_heavy_dependencies(self):
+        # A fresh interpreter: this test process has numpy loaded already
+        snippet = (
+            "import os, sys\n"
+            "os.environ['DJANGO_SETTINGS_MODULE'] = 'employeemanagement.settings'\n"
+            "import django\n"
+            "django.setup()\n"
+            "import employees.urls\n"
+            "from employees.management.commands import update_employee_status\n"
+            "print('LOADED=' + ','.join(m for m in ('numpy', 'sklearn', 'PIL', 'geopy', 'cloudinary') if m in sys.modules))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', snippet], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('LOADED=\n', result.stdout)
+
+
+class DuplicateFaceTests(EmployeeAPITestCase):
+    def register(self, employee_id, descriptor):
+        return self.client.post('/api/register-employee/', {
+            'name': f'Employee {employee_id}', 'employee_id': employee_id, 'face_image': IMAGE_BASE64,
+            'descriptor': [float(value) for value in descriptor], 'office_id': self.office.pk,
+        }, format='json')
+
+    def test_blocked_pairs_match_brute_force(self):
+        rng = np.random.default_rng(5)
+        vectors = rng.normal(size=(60, 128))
+        vectors[10:20] = vectors[:10] + rng.normal(0, 0.02, size=(10, 128))  # ten near-duplicate pairs
+        matrix = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+        pairs_i, pairs_j, scores = find_duplicate_pairs(matrix, threshold=0.95, block_size=7)
+
+        scores_all = matrix @ matrix.T
+        expected = {(i, j) for i in range(60) for j in range(i + 1, 60) if scores_all[i, j] >= 0.95}
+        self.assertEqual(set(zip(pairs_i.tolist(), pairs_j.tolist())), expected)
+        self.assertEqual(len(expected), 10)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_registering_an_enrolled_face_is_rejected(self):
+        face = random_descriptor(1)
+        self.assertEqual(self.register('E1', face).status_code, 201)
+
+        response = self.register('E2', face * 2 + 0.01)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicate_employee_id'], 'E1')
+        self.assertFalse(Employee.objects.filter(employee_id='E2').exists())
+        self.assertEqual(self.register('E2', random_descriptor(2)).status_code, 201)
+
+    def test_registration_sees_faces_enrolled_by_another_worker(self):
+        face = random_descriptor(1)
+        self.assertEqual(self.register('E1', random_descriptor(2)).status_code, 201)
+        self.assertEqual(len(face_gallery), 1)
+
+        # Enrolled through another worker: this worker's gallery has not seen it
+        other = self.make_employee('E2')
+        unit, norm = normalize_descriptor(face)
+        Employee.objects.filter(pk=other.pk).update(face_encoding=encode_descriptor(unit), face_encoding_norm=norm)
+        self.assertEqual(len(face_gallery), 1)
+
+        with mock.patch.object(IVFIndex, 'search') as search:
+            response = self.register('E3', face)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicate_employee_id'], 'E2')
+        search.assert_not_called()
+
+    def test_exact_identify_skips_the_ann_index(self):
+        gallery = FaceGallery(ann_min_size=1, snapshot_dir='')
+        self.make_employee('E1', random_descriptor(1))
+        gallery.load()
+        self.assertIsNotNone(gallery._ann)
+        with mock.patch.object(IVFIndex, 'search') as search:
+            matches = gallery.identify(random_descriptor(1), top_k=1, exact=True)
+        search.assert_not_called()
+        self.assertEqual(matches[0][0], 'E1')
+
+    def test_roster_audit_command_reports_pairs(self):
+        face = random_descriptor(1)
+        self.make_employee('E1', face)
+        self.make_employee('E2', face + 0.01)
+        self.make_employee('E3', random_descriptor(3))
+
+        output = io.StringIO()
+        call_command('find_duplicate_faces', block_size=2, stdout=output)
+
+        self.assertIn('(E1)  <->  Employee E2 (E2)', output.getvalue())
+        self.assertIn('Found 1 near-duplicate pairs among 3 employees', output.getvalue())
+
+
+class ReenrollFacesTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+
+    def enroll(self, employee_id, stored_seed, image_seed=None):
+        employee = self.make_employee(employee_id, random_descriptor(stored_seed))
+        if image_seed is not None:
+            employee.face_image.save(f'{employee_id}.jpg', ContentFile(str(image_seed).encode()))
+        else:
+            Employee.objects.filter(pk=employee.pk).update(face_image='')
+        return employee
+
+    def reenroll(self, *args):
+        output = io.StringIO()
+        call_command('reenroll_faces', *args, extractor='employees.tests.seeded_extractor', workers=2,
+                     chunk_size=1, checkpoint=self.checkpoint, stdout=output)
+        return output.getvalue()
+
+    def test_descriptors_and_templates_are_regenerated(self):
+        first = self.enroll('E1', stored_seed=1, image_seed=11)
+        second = self.enroll('E2', stored_seed=2, image_seed=2)
+        FaceTemplate.objects.create(employee=first, descriptor=first.face_encoding)
+
+        output = self.reenroll()
+
+        self.assertIn('2 updated, 0 failed', output)
+        first.refresh_from_db()
+        self.assertGreater(descriptor_similarity(decode_face_encoding(first.face_encoding, first.face_encoding_norm),
+                                                 normalize_descriptor(random_descriptor(11))[0]), 0.999)
+        self.assertEqual(FaceTemplate.objects.filter(employee=first).count(), 1)
+        self.assertEqual(FaceTemplate.objects.filter(employee=second).count(), 1)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_failures_keep_the_checkpoint_and_validate_only_writes_nothing(self):
+        self.enroll('E1', stored_seed=1, image_seed=1)
+        missing = self.enroll('E2', stored_seed=2)
+        before = bytes(Employee.objects.get(employee_id='E1').face_encoding)
+
+        self.assertIn('0 updated, 1 failed, 2 processed', self.reenroll('--validate-only'))
+        self.assertEqual(bytes(Employee.objects.get(employee_id='E1').face_encoding), before)
+
+        output = self.reenroll()
+        self.assertIn('1 updated, 1 failed', output)
+        self.assertIn('E2: no face image available', output)
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        # A resumed run retries the failed employee
+        output = self.reenroll()
+        self.assertIn(f'Resuming after employee pk {missing.pk}, retrying 1 failed employees', output)
+        self.assertIn('Re-enrolling 1 employees', output)
+        self.assertIn('0 updated, 1 failed', output)
+
+        missing.face_image.save('E2.jpg', ContentFile(b'2'))
+        self.assertIn('1 updated, 0 failed', self.reenroll())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_worker_runs_in_a_spawned_process(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        path = os.path.join(self.media_root, 'face.jpg')
+        with open(path, 'wb') as image_file:
+            image_file.write(b'7')
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker) as pool:
+            pk, descriptor, error = pool.submit(
+                extract_descriptor, (1, path, None, 'employees.tests.seeded_extractor')
+            ).result(timeout=120)
+        self.assertIsNone(error)
+        self.assertTrue(np.allclose(descriptor, random_descriptor(7)))
+
+
+class GeofenceTests(TestCase):
+    def destination(self, latitude, longitude, meters, bearing):
+        from geopy.distance import geodesic
+        point = geodesic(meters=meters).destination((latitude, longitude), bearing)
+        return point.latitude, point.longitude
+
+    def test_projected_distance_matches_geodesic_nearby(self):
+        fence = OfficeGeofence(12.9716, 77.5946, 100)
+        for meters, bearing in ((5, 0), (80, 45), (400, 135), (2500, 270), (9000, 200)):
+            latitude, longitude = self.destination(12.9716, 77.5946, meters, bearing)
+            self.assertAlmostEqual(fence.distance(latitude, longitude), meters, delta=0.05 + meters * 2e-5)
+
+    def test_boundary_decisions_use_the_exact_geodesic(self):
+        for office_latitude in (0.0, 12.9716, 59.9, -33.87):
+            fence = OfficeGeofence(office_latitude, 77.5946, 100)
+            for bearing in (0, 60, 90, 210):
+                for meters, inside in ((99.9, True), (99.95, True), (100.05, False), (100.1, False)):
+                    latitude, longitude = self.destination(office_latitude, 77.5946, meters, bearing)
+                    _, is_inside = fence.evaluate(latitude, longitude)
+                    self.assertEqual(is_inside, inside, (office_latitude, bearing, meters))
+                    self.assertEqual(fence.contains(latitude, longitude), inside)
+
+    def test_far_points_and_the_antimeridian(self):
+        fence = OfficeGeofence(12.9716, 77.5946, 100)
+        self.assertFalse(fence.in_bounding_box(13.5, 77.5946))
+        self.assertAlmostEqual(fence.distance(13.9716, 77.5946), geodesic_meters(12.9716, 77.5946, 13.9716, 77.5946),
+                               delta=0.006 * 111000)
+
+        dateline = OfficeGeofence(0.0, 179.9995, 200)
+        self.assertTrue(dateline.evaluate(0.0, -179.9995)[1])
+        self.assertAlmostEqual(dateline.distance(0.0, -179.9995), 111.3, delta=0.5)
+
+    def test_vectorized_points_match_single_evaluations(self):
+        rng = np.random.default_rng(3)
+        latitudes = 12.9716 + rng.uniform(-0.003, 0.003, 200)
+        longitudes = 77.5946 + rng.uniform(-0.003, 0.003, 200)
+        distances, inside = evaluate_points(latitudes, longitudes, [12.9716] * 200, [77.5946] * 200, [150] * 200)
+
+        fence = OfficeGeofence(12.9716, 77.5946, 150)
+        for latitude, longitude, distance, is_inside in zip(latitudes, longitudes, distances, inside):
+            expected_distance, expected_inside = fence.evaluate(latitude, longitude)
+            self.assertEqual(bool(is_inside), expected_inside)
+            # Haversine (spherical) away from the boundary band, so within its relative error
+            self.assertAlmostEqual(distance, expected_distance, delta=0.006 * expected_distance)
+
+
+class OfficeIndexTests(EmployeeAPITestCase):
+    def random_offices(self, count=300):
+        rng = np.random.default_rng(9)
+        latitudes = 12.9 + rng.uniform(-0.3, 0.3, count)
+        longitudes = 77.6 + rng.uniform(-0.3, 0.3, count)
+        radii = rng.uniform(50, 3000, count)
+        return [(index, f'Office {index}', latitudes[index], longitudes[index], radii[index], None)
+                for index in range(count)]
+
+    def test_queries_match_a_full_scan(self):
+        offices = self.random_offices()
+        index = OfficeSpatialIndex().build(offices)
+        fences = {office_id: OfficeGeofence(latitude, longitude, radius)
+                  for office_id, _, latitude, longitude, radius, _ in offices}
+
+        rng = np.random.default_rng(10)
+        for latitude, longitude in zip(12.9 + rng.uniform(-0.35, 0.35, 50), 77.6 + rng.uniform(-0.35, 0.35, 50)):
+            expected = sorted(office_id for office_id, fence in fences.items() if fence.evaluate(latitude, longitude)[1])
+            self.assertEqual(sorted(match[0] for match in index.containing(latitude, longitude)), expected)
+
+            by_distance = sorted(fences, key=lambda office_id: fences[office_id].distance(latitude, longitude))
+            self.assertEqual([match[0] for match in index.nearest(latitude, longitude, limit=5)], by_distance[:5])
+
+    def test_wide_and_antimeridian_offices(self):
+        index = OfficeSpatialIndex().build([
+            (1, 'Campus', 10.0, 20.0, 25000, None),
+            (2, 'Dateline', 0.0, 179.9995, 200, None),
+        ])
+        self.assertEqual([match[0] for match in index.containing(10.2, 20.0)], [1])
+        self.assertEqual([match[0] for match in index.containing(0.0, -179.9995)], [2])
+        # Far from every centre cell: falls back to the full haversine pass
+        self.assertEqual([match[0] for match in index.nearest(50.0, -100.0, limit=2)], [2, 1])
+        self.assertEqual(index.nearest(-5.0, 25.0, limit=1)[0][0], 1)
+
+    def test_nearest_measures_polygons_to_their_edge(self):
+        index = OfficeSpatialIndex().build([
+            (1, 'Circle', 0.15, 0.0, 50, None),
+            # Centre five rings away, but its edge is ~5.5 km from the point
+            (2, 'Estate', 0.5, 0.0, 10, encode_boundary({'type': 'Polygon', 'coordinates': [[
+                [-0.1, 0.05], [0.1, 0.05], [0.1, 0.95], [-0.1, 0.95], [-0.1, 0.05]
+            ]]})),
+        ])
+        matches = index.nearest(0.0, 0.0, limit=2)
+        self.assertEqual([match[0] for match in matches], [2, 1])
+        self.assertAlmostEqual(matches[0][2], 0.05 * meters_per_degree(0.0)[0], delta=5)
+
+    def test_far_fallback_is_ordered_by_the_returned_distances(self):
+        index = OfficeSpatialIndex().build([
+            (1, 'Circle', 25.0, 0.0, 10, None),
+            (2, 'Estate', 28.0, 0.0, 10, encode_boundary({'type': 'Polygon', 'coordinates': [[
+                [-1, 22], [1, 22], [1, 34], [-1, 34], [-1, 22]
+            ]]})),
+        ])
+        matches = index.nearest(20.0, 0.0, limit=2)
+        self.assertEqual([match[0] for match in matches], [2, 1])
+        self.assertLess(matches[0][2], matches[1][2])
+
+    def test_containing_rejects_by_bounding_box_first(self):
+        index = OfficeSpatialIndex().build([(1, 'Kiosk', 10.005, 20.005, 50, None)])
+        with mock.patch.object(OfficeGeofence, 'evaluate', autospec=True,
+                               side_effect=OfficeGeofence.evaluate) as evaluate:
+            self.assertEqual(index.containing(10.0001, 20.0001), [])  # same grid cell, ~700 m away
+            evaluate.assert_not_called()
+            self.assertEqual([match[0] for match in index.containing(10.005, 20.005)], [1])
+
+    def test_check_in_at_a_permitted_other_office(self):
+        branch = OfficeLocation.objects.create(name='Branch', latitude=13.0500, longitude=77.6200, radius_meters=150)
+        face = random_descriptor(1)
+        employee = self.make_employee('E1', face)
+
+        check_in = {'employee_id': 'E1', 'descriptor': [float(value) for value in face], 'face_image': IMAGE_BASE64,
+                    'latitude': branch.latitude, 'longitude': branch.longitude, 'action': 'login'}
+        self.assertEqual(self.client.post('/api/attendance/', check_in, format='json').status_code, 403)
+
+        employee.allowed_offices.add(branch)
+        self.assertEqual(self.client.post('/api/attendance/', check_in, format='json').status_code, 201)
+
+        response = self.client.get('/api/office-locations/nearby/', {'latitude': branch.latitude,
+                                                                     'longitude': branch.longitude, 'limit': 2})
+        self.assertEqual([office['name'] for office in response.data['offices']], ['Branch', 'HQ'])
+        self.assertEqual(response.data['containing'], [branch.pk])
+
+
+class PolygonGeofenceTests(EmployeeAPITestCase):
+    # ~1.1 km square around (12.97, 77.59) with a ~220 m square hole in the middle
+    OUTER = [[77.585, 12.965], [77.595, 12.965], [77.595, 12.975], [77.585, 12.975], [77.585, 12.965]]
+    HOLE = [[77.589, 12.969], [77.591, 12.969], [77.591, 12.971], [77.589, 12.971], [77.589, 12.969]]
+
+    def fence(self, geometry):
+        return PolygonGeofence(12.97, 77.59, decode_boundary(encode_boundary(geometry)))
+
+    def test_boundary_codec_round_trips(self):
+        geometry = {'type': 'MultiPolygon', 'coordinates': [
+            [self.OUTER, self.HOLE],
+            [[[77.6, 12.98], [77.61, 12.98], [77.605, 12.99], [77.6, 12.98]]],
+        ]}
+        decoded = boundary_to_geojson(encode_boundary(geometry))
+
+        self.assertEqual(decoded['type'], 'MultiPolygon')
+        np.testing.assert_allclose(np.array(decoded['coordinates'][0][1]), np.array(self.HOLE), atol=1e-7)
+        self.assertEqual(boundary_to_geojson(encode_boundary({'type': 'Polygon', 'coordinates': [self.OUTER]}))['type'],
+                         'Polygon')
+        for bad in ({'type': 'Point', 'coordinates': [0, 0]}, {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1]]]},
+                    {'type': 'Polygon', 'coordinates': [[[0, 0], [200, 0], [0, 1]]]}, [1, 2]):
+            with self.assertRaises(ValueError):
+                encode_boundary(bad)
+
+    def test_oversized_boundaries_are_rejected_before_packing(self):
+        # More parts than the header's polygon count can hold
+        triangles = {'type': 'MultiPolygon', 'coordinates': [[[[0, 0], [0.001, 0], [0, 0.001]]]] * 70000}
+        with self.assertRaisesRegex(ValueError, 'vertices'):
+            encode_boundary(triangles)
+
+        response = self.client.post('/api/office-locations/', {
+            'name': 'Huge', 'latitude': 0, 'longitude': 0, 'radius_meters': 10, 'boundary': triangles,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_containment_holes_and_edge_distance(self):
+        fence = self.fence({'type': 'Polygon', 'coordinates': [self.OUTER, self.HOLE]})
+
+        self.assertEqual(fence.evaluate(12.967, 77.587), (0.0, True))
+        self.assertFalse(fence.contains(12.97, 77.59))  # inside the hole
+        self.assertFalse(fence.contains(12.98, 77.59))
+
+        distance, inside = fence.evaluate(12.97, 77.59)
+        self.assertFalse(inside)
+        self.assertAlmostEqual(distance, 0.001 * min(fence.lat_meters, fence.lon_meters), delta=0.5)  # to the hole's edge
+
+    def test_vectorized_evaluation_matches_single_points(self):
+        fence = self.fence({'type': 'MultiPolygon', 'coordinates': [
+            [self.OUTER, self.HOLE], [[[77.6, 12.98], [77.61, 12.98], [77.605, 12.99], [77.6, 12.98]]],
+        ]})
+        rng = np.random.default_rng(4)
+        latitudes, longitudes = rng.uniform(12.96, 12.995, 500), rng.uniform(77.58, 77.615, 500)
+
+        distances, inside = fence.evaluate_many(latitudes, longitudes)
+
+        self.assertTrue(inside.any() and not inside.all())
+        for latitude, longitude, distance, is_inside in zip(latitudes, longitudes, distances, inside):
+            expected_distance, expected_inside = fence.evaluate(latitude, longitude)
+            self.assertEqual(bool(is_inside), expected_inside)
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_offices_with_a_boundary_check_in_by_polygon(self):
+        response = self.client.post('/api/office-locations/', {
+            'name': 'Campus', 'latitude': 12.97, 'longitude': 77.59, 'radius_meters': 10,
+            'boundary': {'type': 'Polygon', 'coordinates': [self.OUTER]},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['boundary']['type'], 'Polygon')
+        campus = OfficeLocation.objects.get(name='Campus')
+
+        face = random_descriptor(1)
+        self.make_employee('E1', face, office=campus)
+        check_in = {'employee_id': 'E1', 'descriptor': [float(value) for value in face], 'face_image': IMAGE_BASE64,
+                    'latitude': 12.974, 'longitude': 77.594, 'action': 'login'}
+        self.assertEqual(self.client.post('/api/attendance/', check_in, format='json').status_code, 201)
+        check_in['latitude'] = 12.976
+        self.assertEqual(self.client.post('/api/attendance/', check_in, format='json').status_code, 403)
+
+        invalid = self.client.post('/api/office-locations/', {
+            'name': 'Bad', 'latitude': 0, 'longitude': 0, 'radius_meters': 10,
+            'boundary': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1]]]},
+        }, format='json')
+        self.assertEqual(invalid.status_code, 400)
+
+
+class LocationUpdateTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee('E1')
+
+    def ping(self, **fields):
+        return self.client.post('/api/location-update/', dict({'employee_id': 'E1'}, **fields), format='json')
+
+    def test_geofence_state_is_decided_by_the_server(self):
+        response = self.ping(latitude=12.9800, longitude=77.5946, is_in_office_radius=True, distance_from_office=0)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_in_office_radius'])
+        self.assertGreater(response.data['distance'], 900)
+        location = EmployeeLocation.objects.get(employee=self.employee)
+        self.assertFalse(location.is_in_office_radius)
+
+        response = self.ping(latitude=12.9717, longitude=77.5946, is_in_office_radius=False, distance_from_office=5000)
+        self.assertTrue(response.data['is_in_office_radius'])
+
+    def test_unmoved_pings_are_not_written_until_the_heartbeat_interval(self):
+        self.assertTrue(self.ping(latitude=12.9716, longitude=77.5946).data['recorded'])
+        self.assertFalse(self.ping(latitude=12.97161, longitude=77.5946).data['recorded'])
+        self.assertTrue(self.ping(latitude=12.9730, longitude=77.5946).data['recorded'])
+
+        EmployeeLocation.objects.update(timestamp=timezone.now() - timedelta(seconds=LOCATION_HEARTBEAT_SECONDS + 1))
+        self.assertTrue(self.ping(latitude=12.9730, longitude=77.5946).data['recorded'])
+        self.assertEqual(EmployeeLocation.objects.filter(employee=self.employee, is_active=True).count(), 1)
+
+    def test_bad_input_and_stopping_sharing(self):
+        self.assertEqual(self.ping(latitude='north', longitude=77.5).status_code, 400)
+        self.assertEqual(self.ping(longitude=77.5).status_code, 400)
+        self.assertEqual(self.ping(employee_id='NOPE', latitude=12.9, longitude=77.5).status_code, 404)
+
+        self.ping(latitude=12.9716, longitude=77.5946)
+        self.ping(latitude=12.9716, longitude=77.5946, is_sharing=False)
+        self.assertFalse(EmployeeLocation.objects.filter(employee=self.employee, is_active=True).exists())
+        self.assertFalse(EmployeePresence.objects.get(employee=self.employee).is_sharing)
+
+
+class LocationHistoryTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee('E1')
+        self.now = timezone.now()
+
+    def point(self, at, latitude=12.97, inside=True, distance=0.0, resolution=LocationHistory.RESOLUTION_RAW, count=1):
+        return LocationHistory(employee=self.employee, bucket_start=at, resolution=resolution, latitude=latitude,
+                               longitude=77.59, is_in_office_radius=inside, distance_from_office=distance,
+                               point_count=count)
+
+    def compact(self, **options):
+        call_command('compact_location_history', raw_days=1, minute_days=2, retention_days=30, stdout=io.StringIO(),
+                     **options)
+
+    def test_aging_points_are_downsampled_then_expired(self):
+        minute = bucket_floor(self.now - timedelta(days=1, hours=6), 60)
+        quarter = bucket_floor(self.now - timedelta(days=5), 900)
+        LocationHistory.objects.bulk_create([
+            self.point(minute + timedelta(seconds=5), latitude=12.96),
+            self.point(minute + timedelta(seconds=25), latitude=12.98, inside=False, distance=40),
+            self.point(quarter + timedelta(minutes=1), resolution=LocationHistory.RESOLUTION_MINUTE, count=3),
+            self.point(quarter + timedelta(minutes=9), resolution=LocationHistory.RESOLUTION_MINUTE, count=1,
+                       latitude=12.99),
+            self.point(self.now - timedelta(days=40)),
+            self.point(self.now - timedelta(hours=1)),
+        ])
+
+        self.compact()
+
+        rows = {row.resolution: row for row in LocationHistory.objects.exclude(resolution=LocationHistory.RESOLUTION_RAW)}
+        self.assertEqual(LocationHistory.objects.count(), 3)
+        self.assertEqual(rows[60].bucket_start, minute)
+        self.assertEqual((rows[60].point_count, rows[60].is_in_office_radius, rows[60].distance_from_office),
+                         (2, False, 40))
+        self.assertAlmostEqual(rows[60].latitude, 12.97)
+        self.assertEqual((rows[900].bucket_start, rows[900].point_count), (quarter, 4))
+        self.assertAlmostEqual(rows[900].latitude, (12.97 * 3 + 12.99) / 4)
+        self.assertTrue(LocationHistory.objects.filter(resolution=0, bucket_start__gt=self.now - timedelta(days=1)).exists())
+
+    def test_late_points_merge_into_an_existing_bucket(self):
+        minute = bucket_floor(self.now - timedelta(days=1, hours=6), 60)
+        LocationHistory.objects.create(employee=self.employee, bucket_start=minute, resolution=60, latitude=12.96,
+                                       longitude=77.59, is_in_office_radius=True, distance_from_office=0,
+                                       point_count=3)
+        LocationHistory.objects.bulk_create([self.point(minute + timedelta(seconds=30), latitude=13.0)])
+
+        self.compact()
+
+        bucket = LocationHistory.objects.get()
+        self.assertEqual(bucket.point_count, 4)
+        self.assertAlmostEqual(bucket.latitude, (12.96 * 3 + 13.0) / 4)
+
+    def test_history_endpoint_returns_the_requested_range(self):
+        LocationHistory.objects.bulk_create([self.point(self.now - timedelta(hours=hours)) for hours in (1, 3, 30)])
+        url = '/api/employees/E1/location-history/'
+
+        response = self.client.get(url, {'start': (self.now - timedelta(hours=4)).isoformat(),
+                                         'end': self.now.isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['points']), 2)
+        self.assertEqual(response.data['points'][0]['resolution_seconds'], 0)
+        self.assertEqual(self.client.get(url, {'date': '17/10/2026'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday', 'end': 'today'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/employees/NOPE/location-history/').status_code, 404)
+
+
+class TrajectoryCompressionTests(EmployeeAPITestCase):
+    def track(self, offsets_meters, seconds_apart=10):
+        start = timezone.now() - timedelta(hours=1)
+        timestamps = [start + timedelta(seconds=seconds_apart * index) for index in range(len(offsets_meters))]
+        latitudes = [12.97 + north / 110600 for north, _ in offsets_meters]
+        longitudes = [77.59 + east / 108500 for _, east in offsets_meters]
+        return timestamps, latitudes, longitudes
+
+    def test_constant_speed_line_keeps_only_its_ends(self):
+        track = self.track([(index * 8.0, 0.0) for index in range(50)])
+        self.assertEqual(list(simplify_track(*track, tolerance_meters=1)), [0, 49])
+
+    def test_turns_stops_and_forced_points_survive(self):
+        # East for 20 fixes, then north for 20: the corner is the only point interpolation misses
+        offsets = [(0.0, index * 10.0) for index in range(20)] + [(index * 10.0, 190.0) for index in range(1, 21)]
+        track = self.track(offsets)
+        kept = simplify_track(*track, tolerance_meters=5)
+        self.assertEqual(list(kept), [0, 19, 39])
+        self.assertLessEqual(track_errors(*track, kept).max(), 5)
+
+        keep = np.zeros(40, dtype=bool)
+        keep[7] = True
+        self.assertIn(7, simplify_track(*track, tolerance_meters=5, keep=keep))
+
+        # Same path, but the device sat still at the start for half the time: positions in time no longer line up
+        timestamps, latitudes, longitudes = self.track([(0.0, 0.0)] * 10 + [(0.0, index * 10.0) for index in range(10)])
+        self.assertGreater(len(simplify_track(timestamps, latitudes, longitudes, tolerance_meters=5)), 2)
+
+    def test_gaps_and_represented_counts(self):
+        timestamps, latitudes, longitudes = self.track([(index * 8.0, 0.0) for index in range(10)])
+        timestamps[5:] = [timestamp + timedelta(hours=1) for timestamp in timestamps[5:]]
+        kept = simplify_track(timestamps, latitudes, longitudes, tolerance_meters=1, max_gap_seconds=600)
+        self.assertEqual(list(kept), [0, 4, 5, 9])
+        self.assertEqual(list(represented_counts(10, kept)), [4, 1, 4, 1])
+        self.assertEqual(represented_counts(10, kept, counts=[2] * 10).sum(), 20)
+
+    def test_bulk_uploads_store_compressed_history(self):
+        self.make_employee('E1')
+        start = timezone.now() - timedelta(minutes=30)
+        # ~11 m apart in a straight line at constant speed: every fix is stored, few are needed for the track
+        points = [{'employee_id': 'E1', 'latitude': 12.9716 + index * 0.0001, 'longitude': 77.5946,
+                   'timestamp': (start + timedelta(seconds=10 * index)).isoformat()} for index in range(30)]
+
+        response = self.client.post('/api/location-update/bulk/', {'points': points}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stored'], 30)
+        history = list(LocationHistory.objects.order_by('bucket_start'))
+        self.assertLessEqual(len(history), 6)
+        self.assertEqual(sum(point.point_count for point in history), 30)
+
+    def test_compress_command_reports_and_deletes(self):
+        employee = self.make_employee('E1')
+        timestamps, latitudes, longitudes = self.track([(index * 8.0, 0.0) for index in range(20)])
+        LocationHistory.objects.bulk_create([
+            LocationHistory(employee=employee, bucket_start=timestamp, latitude=latitude, longitude=longitude,
+                            is_in_office_radius=True, distance_from_office=0)
+            for timestamp, latitude, longitude in zip(timestamps, latitudes, longitudes)
+        ])
+
+        output = io.StringIO()
+        call_command('compress_location_history', '--dry-run', tolerance_meters=1, stdout=output)
+        self.assertIn('20 -> 2 points', output.getvalue())
+        self.assertEqual(LocationHistory.objects.count(), 20)
+
+        call_command('compress_location_history', tolerance_meters=1, stdout=io.StringIO())
+        self.assertEqual(list(LocationHistory.objects.values_list('point_count', flat=True)), [19, 1])
+
+
+@override_settings(GEOFENCE_EXIT_MARGIN_METERS=25, GEOFENCE_MIN_DWELL_SECONDS=120)
+class GeofenceAlertTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee('E1')
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def feed(self, seconds, outside_meters):
+        distance = self.office.radius_meters + outside_meters
+        return track_geofence(self.employee, 12.98, 77.59, distance, outside_meters,
+                              at=self.start + timedelta(seconds=seconds))
+
+    def test_one_alert_per_excursion(self):
+        events = [self.feed(seconds, outside) for seconds, outside in (
+            (0, 0), (10, 60), (60, 80), (130, 90), (140, 90), (150, 150), (160, 120), (300, 120),
+            (310, 0), (350, 0), (440, 0),
+        )]
+
+        self.assertEqual(events, [None, None, None, 'opened', None, 'updated', None, 'updated',
+                                  None, None, 'closed'])
+        alert = LocationAlert.objects.get()
+        self.assertEqual(alert.timestamp, self.start + timedelta(seconds=10))
+        self.assertEqual(alert.ended_at, self.start + timedelta(seconds=310))
+        self.assertAlmostEqual(alert.max_distance, (100 + 150) / 1000)
+        self.assertEqual(alert.ping_count, 5)
+
+    def test_jitter_and_short_excursions_do_not_alert(self):
+        for seconds, outside in ((0, 10), (200, 20), (400, 40), (450, 0), (600, 40), (700, 40)):
+            self.assertIsNone(self.feed(seconds, outside))
+        self.assertFalse(LocationAlert.objects.exists())
+
+    def test_state_is_rebuilt_from_the_open_alert(self):
+        self.feed(0, 60)
+        self.assertEqual(self.feed(150, 60), 'opened')
+        cache.clear()
+
+        self.assertEqual(self.feed(160, 0), None)
+        self.assertEqual(self.feed(300, 0), 'closed')
+        self.assertEqual(LocationAlert.objects.filter(ended_at__isnull=True).count(), 0)
+
+    def test_location_pings_go_through_the_debouncer(self):
+        for _ in range(3):
+            self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.99, 'longitude': 77.5946},
+                             format='json')
+        self.assertFalse(LocationAlert.objects.exists())
+
+
+class PresenceQueryTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_employee('ONLINE', location_minutes=2, attendance_hours=1)
+        self.add_employee('STALE', location_minutes=20, attendance_hours=1)
+        self.add_employee('STOPPED', location_minutes=1, sharing=False)
+        self.add_employee('GONE', location_minutes=30, attendance_hours=48)
+        self.add_employee('NEVER')
+        call_command('sync_employee_presence', stdout=io.StringIO())
+
+    def add_employee(self, employee_id, location_minutes=None, sharing=True, attendance_hours=None):
+        employee = self.make_employee(employee_id)
+        if location_minutes is not None:
+            location = EmployeeLocation.objects.create(employee=employee, latitude=12.9716, longitude=77.5946,
+                                                       is_in_office_radius=True, distance_from_office=0,
+                                                       is_active=sharing)
+            EmployeeLocation.objects.filter(pk=location.pk).update(
+                timestamp=timezone.now() - timedelta(minutes=location_minutes))
+        if attendance_hours is not None:
+            attendance = Attendance.objects.create(employee=employee, latitude=12.9716, longitude=77.5946,
+                                                   action='login')
+            Attendance.objects.filter(pk=attendance.pk).update(
+                timestamp=timezone.now() - timedelta(hours=attendance_hours))
+        return employee
+
+    def test_status_rules(self):
+        now = timezone.now()
+        recent, stale, old_login = (now - timedelta(minutes=minutes) for minutes in (5, 11, 60 * 25))
+        self.assertEqual(presence_status(recent, True, None, now), (True, 'recent_location'))
+        self.assertEqual(presence_status(stale, True, recent, now), (False, 'stale_location'))
+        self.assertEqual(presence_status(stale, True, old_login, now), (False, 'no_recent_login'))
+        self.assertEqual(presence_status(recent, False, None, now), (False, 'no_recent_activity'))
+
+    def test_one_query_agrees_with_the_per_employee_check(self):
+        with self.assertNumQueries(1):
+            presence = employee_presence(Employee.objects.all())
+
+        online = {employee.employee_id: is_online for employee, _, is_online in presence}
+        self.assertEqual(online, {'ONLINE': True, 'STALE': False, 'STOPPED': False, 'GONE': False, 'NEVER': False})
+        for employee, _, is_online in presence:
+            self.assertEqual(check_employee_online_status(employee), is_online, employee.employee_id)
+
+    def test_live_locations_do_not_query_per_employee(self):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/live-employee-locations/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        few = count_queries()
+        for index in range(10):
+            self.add_employee(f'MORE{index}', location_minutes=index, attendance_hours=1)
+        call_command('sync_employee_presence', stdout=io.StringIO())
+        self.assertEqual(count_queries(), few)
+
+    def test_status_sync_deactivates_stale_sharers(self):
+        response = self.client.post('/api/update-employee-status/')
+
+        self.assertEqual(response.data['updated_count'], 2)
+        sharing = set(EmployeeLocation.objects.filter(is_active=True).values_list('employee__employee_id', flat=True))
+        self.assertEqual(sharing, {'ONLINE'})
+        self.assertEqual(set(EmployeePresence.objects.filter(is_sharing=True).values_list(
+            'employee__employee_id', flat=True)), {'ONLINE'})
+
+
+class HeartbeatPresenceTests(EmployeeAPITestCase):
+    def status(self, employee_ids):
+        return self.client.get('/api/employee-presence/', {'employee_ids': ','.join(employee_ids)})
+
+    def test_heartbeats_expire_with_the_online_window(self):
+        now = timezone.now()
+        record_heartbeat('A', now - timedelta(minutes=2))
+        record_heartbeat('B', now - timedelta(minutes=11))  # already past the window: not stored
+        record_heartbeat('C', now + timedelta(hours=1))     # device clock ahead: clamped to now
+
+        heartbeats = online_heartbeats(['A', 'B', 'C', 'D'])
+        self.assertEqual(set(heartbeats), {'A', 'C'})
+        self.assertLessEqual(heartbeats['C'], timezone.now())
+
+        clear_heartbeats(['A'])
+        self.assertEqual(set(online_heartbeats(['A', 'C'])), {'C'})
+
+    def test_status_endpoint_reads_only_the_cache(self):
+        self.make_employee('E1')
+        self.make_employee('E2')
+        self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.9716, 'longitude': 77.5946},
+                         format='json')
+
+        with self.assertNumQueries(0):
+            response = self.status(['E1', 'E2'])
+
+        self.assertEqual(response.data['E1']['status'], 'online')
+        self.assertIsNotNone(response.data['E1']['last_seen'])
+        self.assertEqual(response.data['E2'], {'status': 'offline', 'last_seen': None})
+
+        self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.9716, 'longitude': 77.5946,
+                                                   'is_sharing': False}, format='json')
+        self.assertEqual(self.status(['E1']).data['E1']['status'], 'offline')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/employee-presence/').status_code, 400)
+        with mock.patch('employees.views.MAX_PRESENCE_STATUS_IDS', 2):
+            self.assertEqual(self.status(['A', 'B', 'C']).status_code, 400)
+
+    def test_skipped_pings_keep_a_stale_stored_location_online(self):
+        employee = self.make_employee('E1')
+        location = EmployeeLocation.objects.create(employee=employee, latitude=12.9716, longitude=77.5946,
+                                                   is_in_office_radius=True, distance_from_office=0)
+        EmployeeLocation.objects.filter(pk=location.pk).update(timestamp=timezone.now() - timedelta(minutes=11))
+        call_command('sync_employee_presence', stdout=io.StringIO())
+
+        entries = {entry['employee_id']: entry for entry in self.client.get('/api/live-employee-locations/').data}
+        self.assertEqual(entries['E1']['status'], 'offline')
+
+        record_heartbeat('E1')
+        entries = {entry['employee_id']: entry for entry in self.client.get('/api/live-employee-locations/').data}
+        self.assertEqual(entries['E1']['status'], 'online')
+
+
+class LiveStreamTests(EmployeeAPITestCase):
+    def test_event_frame(self):
+        frame = encode_event('location', {'employee_id': 'E1', 'at': timezone.now()})
+        self.assertTrue(frame.startswith(b'event: location\ndata: {"employee_id": "E1"'))
+        self.assertTrue(frame.endswith(b'\n\n'))
+
+    def test_broker_fans_out_by_office(self):
+        broker = LocalBroker()
+
+        async def scenario():
+            everyone = broker.subscribe()
+            office_only = broker.subscribe({self.office.id})
+            other_office = broker.subscribe({self.office.id + 1})
+            # Sync views publish from worker threads
+            await asyncio.to_thread(broker.publish, 'status', self.office.id, {'employee_id': 'E1'})
+            frames = [await asyncio.wait_for(subscriber.queue.get(), 1) for subscriber in (everyone, office_only)]
+            await asyncio.sleep(0)
+            pending = other_office.queue.qsize()
+            for subscriber in (everyone, office_only, other_office):
+                broker.unsubscribe(subscriber)
+            return frames, pending
+
+        frames, pending = asyncio.run(scenario())
+        self.assertEqual(frames, [encode_event('status', {'employee_id': 'E1'})] * 2)
+        self.assertEqual(pending, 0)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_writes_publish_after_commit(self):
+        self.make_employee('E1')
+        with mock.patch('employees.live_stream.get_broker') as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/location-update/', {'employee_id': 'E1', 'latitude': 12.9716,
+                                                           'longitude': 77.5946}, format='json')
+
+        event_type, office_id, payload = get_broker.return_value.publish.call_args.args
+        self.assertEqual((event_type, office_id), ('location', self.office.id))
+        self.assertEqual(payload['employee_id'], 'E1')
+        self.assertEqual(payload['status'], 'online')
+        self.assertTrue(payload['is_in_office_radius'])
+
+    def test_location_payload(self):
+        employee = self.make_employee('E1')
+        location = EmployeeLocation.objects.create(employee=employee, latitude=12.9716, longitude=77.5946,
+                                                   is_in_office_radius=True, distance_from_office=3.0)
+        payload = location_payload(employee, location, True)
+        self.assertEqual(payload['office_id'], self.office.id)
+        self.assertEqual((payload['latitude'], payload['longitude']), (12.9716, 77.5946))
+        self.assertEqual(payload['last_updated'], location.timestamp.isoformat())
+        self.assertTrue(payload['is_sharing'])
+
+        offline = location_payload(employee, None, False)
+        self.assertEqual((offline['latitude'], offline['status'], offline['is_sharing']), (None, 'offline', False))
+
+    def test_stream_needs_asgi(self):
+        response = self.client.get('/api/live-employee-locations/stream/')
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_stream_refuses_the_local_broker_with_several_workers(self):
+        with mock.patch('employees.views.get_broker', return_value=LocalBroker()):
+            response = asyncio.run(AsyncClient().get('/api/live-employee-locations/stream/'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_stream_rejects_bad_office_filter(self):
+        response = asyncio.run(AsyncClient().get('/api/live-employee-locations/stream/', {'office_id': 'x'}))
+        self.assertEqual(response.status_code, 400)
+
+
+class LiveDeltaTests(EmployeeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for employee_id in ('E1', 'E2'):
+            self.make_employee(employee_id)
+            self.ping(employee_id)
+        # Both pings were returned by a poll a minute ago
+        EmployeePresence.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        self.since = next_cursor(timezone.now() - timedelta(seconds=30))
+
+    def ping(self, employee_id, latitude=12.9716):
+        self.client.post('/api/location-update/', {'employee_id': employee_id, 'latitude': latitude,
+                                                   'longitude': 77.5946}, format='json')
+
+    def poll(self, since=None, path='/api/live-employee-locations/', **headers):
+        return self.client.get(path, {'since': since} if since else {}, **headers)
+
+    def test_full_list_without_cursor(self):
+        response = self.poll()
+        self.assertEqual(sorted(entry['employee_id'] for entry in response.data), ['E1', 'E2'])
+        self.assertTrue(response['X-Cursor'].endswith('Z'))
+        self.assertEqual(parse_cursor(response['X-Cursor']).utcoffset(), timedelta(0))
+
+    def test_delta_has_only_changed_employees(self):
+        self.ping('E1', 12.9726)
+        for path in ('/api/live-employee-locations/', '/api/employee-locations/'):
+            response = self.poll(self.since, path)
+            self.assertFalse(response.data['full'])
+            self.assertEqual([entry['employee_id'] for entry in response.data['employees']], ['E1'])
+            self.assertEqual(response.data['removed'], [])
+            self.assertEqual(response.data['cursor'], response['X-Cursor'])
+
+    def test_deleted_employees_are_tombstoned(self):
+        Employee.objects.get(employee_id='E2').delete()
+        response = self.poll(self.since)
+        self.assertEqual(response.data['employees'], [])
+        self.assertEqual(response.data['removed'], ['E2'])
+
+        # Re-created since: listed as present, not removed
+        self.make_employee('E2')
+        response = self.poll(self.since)
+        self.assertEqual([entry['employee_id'] for entry in response.data['employees']], ['E2'])
+        self.assertEqual(response.data['removed'], [])
+
+    def test_old_cursor_gets_a_full_resync(self):
+        response = self.poll(next_cursor(timezone.now() - TOMBSTONE_RETENTION - timedelta(days=1)))
+        self.assertTrue(response.data['full'])
+        self.assertEqual(len(response.data['employees']), 2)
+
+    def test_unchanged_state_is_not_modified(self):
+        etag = self.poll()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.poll(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(any('employees_employeelocation' in query['sql'] for query in queries.captured_queries))
+
+        self.ping('E1', 12.9726)
+        self.assertEqual(self.poll(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bad_cursor(self):
+        response = self.poll('yesterday')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValueError):
+            parse_cursor('2024-13-40T00:00:00Z')
@@ -0,0 +1,103 @@
+"""
+Trajectory compression for location tracks
+Time-aware Douglas-Peucker (TD-TR): a point is dropped when the position
+interpolated in time between its kept neighbours is within tolerance of it
+(the synchronized Euclidean distance), so replaying the compressed track at the
+original timestamps never strays further than the tolerance from what was sent.
+"""
+
+import numpy as np
+
+from .geofence import meters_per_degree
+
+
+def _project(latitudes, longitudes):
+    """Local flat projection in meters around the track's mean latitude"""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    lat_meters, lon_meters = meters_per_degree(float(np.mean(latitudes)))
+    delta_lon = (longitudes - longitudes[0] + 180.0) % 360.0 - 180.0
+    return np.column_stack([delta_lon * lon_meters, (latitudes - latitudes[0]) * lat_meters])
+
+
+def _seconds(timestamps):
+    first = timestamps[0]
+    return np.array([(timestamp - first).total_seconds() for timestamp in timestamps], dtype=np.float64)
+
+
+def _synchronized_errors(xy, seconds, start, end, inner):
+    """Distance of each inner point from the start->end segment position at the same time"""
+    span = seconds[end] - seconds[start]
+    fraction = (seconds[inner] - seconds[start]) / span if span > 0 else np.zeros(len(inner))
+    expected = xy[start] + fraction[:, None] * (xy[end] - xy[start])
+    return np.hypot(*(xy[inner] - expected).T)
+
+
+def simplify_track(timestamps, latitudes, longitudes, tolerance_meters, max_gap_seconds=None, keep=None):
+    """
+    Indices of the points to keep, in order
+    timestamps: datetimes in ascending order
+    max_gap_seconds: points on either side of a longer gap are always kept
+    keep: optional boolean mask of points that must survive (e.g. geofence state changes)
+    """
+    n = len(timestamps)
+    if n <= 2:
+        return np.arange(n)
+
+    xy = _project(latitudes, longitudes)
+    seconds = _seconds(timestamps)
+
+    kept = np.zeros(n, dtype=bool)
+    kept[0] = kept[-1] = True
+    if keep is not None:
+        kept |= np.asarray(keep, dtype=bool)
+    if max_gap_seconds:
+        gaps = np.flatnonzero(np.diff(seconds) > max_gap_seconds)
+        kept[gaps] = True
+        kept[gaps + 1] = True
+
+    # Forced points split the track into independent pieces; each is simplified without recursion
+    anchors = np.flatnonzero(kept)
+    stack = [(start, end) for start, end in zip(anchors[:-1], anchors[1:]) if end - start > 1]
+    while stack:
+        start, end = stack.pop()
+        inner = np.arange(start + 1, end)
+        errors = _synchronized_errors(xy, seconds, start, end, inner)
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance_meters:
+            split = int(inner[worst])
+            kept[split] = True
+            if split - start > 1:
+                stack.append((start, split))
+            if end - split > 1:
+                stack.append((split, end))
+
+    return np.flatnonzero(kept)
+
+
+def track_errors(timestamps, latitudes, longitudes, kept_indices):
+    """
+    Positional error of every original point against the compressed track
+    (0 for kept points; synchronized distance to the interpolated position otherwise)
+    """
+    n = len(timestamps)
+    errors = np.zeros(n)
+    if n <= 2:
+        return errors
+
+    xy = _project(latitudes, longitudes)
+    seconds = _seconds(timestamps)
+    for start, end in zip(kept_indices[:-1], kept_indices[1:]):
+        if end - start > 1:
+            errors[start + 1:end] = _synchronized_errors(xy, seconds, start, end, np.arange(start + 1, end))
+    return errors
+
+
+def represented_counts(n_points, kept_indices, counts=None):
+    """
+    point_count for each kept point: its own count plus those of the dropped points
+    that follow it, so downsampled buckets still count every raw fix
+    """
+    counts = np.ones(n_points, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+    owner = np.searchsorted(kept_indices, np.arange(n_points), side='right') - 1
+    return np.bincount(owner, weights=counts, minlength=len(kept_indices)).astype(np.int64)
@@ -5,13 +5,23 @@ urlpatterns = [
     path('register-employee/', views.RegisterEmployeeView.as_view(), name='register-employee'),
     path('employees/', views.EmployeeListView.as_view(), name='employee-list'),
     path('employees/<str:employee_id>/', views.GetEmployeeByID.as_view(), name='employee-detail'),
+    path('employees/<str:employee_id>/face-templates/', views.EmployeeFaceTemplatesView.as_view(), name='employee-face-templates'),
+    path('employees/<str:employee_id>/location-history/', views.employee_location_history, name='employee-location-history'),
+    path('identify-face/', views.IdentifyFaceView.as_view(), name='identify-face'),
     path('attendance/', views.AttendanceView.as_view(), name='attendance'),
+    path('attendance/bulk/', views.BulkAttendanceView.as_view(), name='attendance-bulk'),
     path('office-locations/', views.OfficeLocationView.as_view(), name='office-locations'),
+    path('office-locations/nearby/', views.NearbyOfficesView.as_view(), name='office-locations-nearby'),
     path('admin-attendance-logs/', views.AdminAttendanceLogsView.as_view(), name='admin-attendance-logs'),
     path('employee-attendance-logs/<str:employee_id>/', views.EmployeeAttendanceLogsView.as_view(), name='employee-attendance-logs'),
     path('location-alerts/', views.location_alerts, name='location_alerts'),
     path('employee-locations/', views.employee_locations, name='employee_locations'),
     path('location-update/', views.location_update, name='location_update'),
+    path('location-update/bulk/', views.bulk_location_update, name='bulk_location_update'),
     path('live-employee-locations/', views.live_employee_locations, name='live_employee_locations'),
+    path('live-employee-locations/stream/', views.live_location_stream, name='live_location_stream'),
+    path('live-employee-locations/viewport/', views.live_employee_viewport, name='live_employee_viewport'),
+    path('employee-presence/', views.employee_presence_status, name='employee_presence_status'),
+    path('location-buffer/metrics/', views.location_buffer_metrics, name='location_buffer_metrics'),
     path('update-employee-status/', views.update_employee_status, name='update_employee_status'),
 ]
@@ -1,15 +1,30 @@
 import numpy as np
 import base64
 import io
-from PIL import Image
-from geopy.distance import geodesic
-from sklearn.metrics.pairwise import cosine_similarity
+
+from .descriptor_codec import decode_descriptor, is_quantized
+
+# Minimum cosine similarity for a face to be accepted
+FACE_SIMILARITY_THRESHOLD = 0.95
+
+# Registrations at or above this similarity to an existing employee are rejected as duplicates
+# (kept equal to the acceptance threshold so 1:N identification can never match two people)
+DUPLICATE_FACE_THRESHOLD = FACE_SIMILARITY_THRESHOLD
+
+# Multi-template enrollment: how an employee's templates are combined ('max' or 'centroid'),
+# how many are kept, and when an accepted attendance descriptor is added as a new template
+FACE_TEMPLATE_SCORING = 'max'
+MAX_FACE_TEMPLATES = 10
+TEMPLATE_AUTO_ENROLL_SIMILARITY = 0.97
+TEMPLATE_REDUNDANT_SIMILARITY = 0.995
 
 def get_face_encoding_from_base64(base64_str):
     """
     Extract face encoding from base64 image using face-api.js descriptors
     This function will be called by the frontend which sends the descriptor directly
     """
+    from PIL import Image
+
     try:
         if "," in base64_str:
             base64_str = base64_str.split(",")[1]
@@ -26,6 +41,113 @@ def get_face_encoding_from_base64(base64_str):
         print("❌ Error in get_face_encoding_from_base64:", e)
         return None
 
+def normalize_descriptor(descriptor):
+    """
+    L2-normalize a face descriptor once so later comparisons are a plain dot product
+    Returns: (unit_vector as float32, original_norm)
+    """
+    vector = np.asarray(descriptor, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(vector))
+    if norm == 0 or not np.isfinite(norm):
+        return np.zeros_like(vector), norm
+    return vector / np.float32(norm), norm
+
+def decode_unit_descriptor(blob):
+    """
+    Decode a blob that was stored unit-length (templates, normalized face_encoding)
+    float16/int8 blobs are re-normalized to undo quantization drift
+    """
+    vector = decode_descriptor(blob)
+    if is_quantized(blob):
+        return normalize_descriptor(vector)[0]
+    return vector
+
+def decode_face_encoding(face_encoding, face_encoding_norm=None):
+    """
+    Turn a stored face_encoding blob into a unit-length float32 vector
+    Rows saved before normalization have no face_encoding_norm and are normalized here
+    """
+    if face_encoding_norm is not None:
+        return decode_unit_descriptor(face_encoding)
+    return normalize_descriptor(decode_descriptor(face_encoding))[0]
+
+def descriptor_similarity(unit1, unit2):
+    """Cosine similarity of two already-normalized descriptors"""
+    return float(np.dot(unit1, unit2))
+
+def score_templates(probe_unit, templates, method=FACE_TEMPLATE_SCORING):
+    """
+    Score a normalized probe against all of an employee's templates in one operation
+    templates: (n, 128) matrix of unit-length descriptors
+    method: 'max' = best single template, 'centroid' = normalized mean template
+    """
+    if method == 'centroid':
+        centroid, _ = normalize_descriptor(templates.mean(axis=0))
+        return descriptor_similarity(probe_unit, centroid)
+    return float(np.max(templates @ probe_unit))
+
+def score_templates_batch(probes_unit, templates, template_owner, probe_owner, method=FACE_TEMPLATE_SCORING):
+    """
+    Vectorized score_templates for many probes at once
+    probes_unit: (n, 128) normalized probes; templates: (m, 128) unit templates
+    template_owner: (m,) owner index of each template; probe_owner: (n,) owner index each probe is claimed by
+    Returns (n,) similarities, -1 where the owner has no templates
+    """
+    template_owner = np.asarray(template_owner, dtype=np.intp)
+    probe_owner = np.asarray(probe_owner, dtype=np.intp)
+    n_owners = int(max(template_owner.max(initial=-1), probe_owner.max(initial=-1))) + 1
+    scores = np.full(probes_unit.shape[0], -1.0, dtype=np.float32)
+    if templates.shape[0] == 0 or probes_unit.shape[0] == 0:
+        return scores
+
+    if method == 'centroid':
+        centroids = np.zeros((n_owners, templates.shape[1]), dtype=np.float32)
+        np.add.at(centroids, template_owner, templates)
+        norms = np.linalg.norm(centroids, axis=1)
+        has_templates = norms > 0
+        centroids[has_templates] /= norms[has_templates, None]
+        valid = has_templates[probe_owner]
+        scores[valid] = np.einsum('ij,ij->i', probes_unit[valid], centroids[probe_owner[valid]])
+        return scores
+
+    # 'max': score every (probe, template of the claimed owner) pair, then reduce per probe
+    order = np.argsort(template_owner, kind='stable')
+    counts = np.bincount(template_owner, minlength=n_owners)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    pair_counts = counts[probe_owner]
+    pair_probe = np.repeat(np.arange(probes_unit.shape[0]), pair_counts)
+    pair_offset = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    pair_template = order[starts[probe_owner][pair_probe] + pair_offset]
+    pair_scores = np.einsum('ij,ij->i', probes_unit[pair_probe], templates[pair_template])
+    np.maximum.at(scores, pair_probe, pair_scores)
+    return scores
+
+def find_duplicate_pairs(matrix, threshold=DUPLICATE_FACE_THRESHOLD, block_size=4096):
+    """
+    All (i, j, similarity) with i < j and similarity >= threshold among the rows of a
+    unit-length (n, 128) matrix, computed as blocked matrix products so memory stays
+    at block_size**2 scores instead of n**2
+    """
+    pairs_i, pairs_j, pairs_score = [], [], []
+    n = matrix.shape[0]
+    for row_start in range(0, n, block_size):
+        rows = matrix[row_start:row_start + block_size]
+        for col_start in range(row_start, n, block_size):
+            scores = rows @ matrix[col_start:col_start + block_size].T
+            if col_start == row_start:
+                # Diagonal block: only the strict upper triangle (i < j, no self-matches)
+                scores = np.triu(scores, k=1)
+            local_i, local_j = np.nonzero(scores >= threshold)
+            pairs_i.append(local_i + row_start)
+            pairs_j.append(local_j + col_start)
+            pairs_score.append(scores[local_i, local_j])
+
+    if not pairs_i:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    pairs_i, pairs_j, pairs_score = (np.concatenate(x) for x in (pairs_i, pairs_j, pairs_score))
+    order = np.argsort(-pairs_score)
+    return pairs_i[order], pairs_j[order], pairs_score[order]
+
 def compare_face_descriptors(descriptor1, descriptor2, threshold=0.6):
     """
     Compare two face descriptors using cosine similarity
@@ -33,12 +155,10 @@ def compare_face_descriptors(descriptor1, descriptor2, threshold=0.6):
     threshold: similarity threshold (lower = more strict)
     """
     try:
-        # Reshape descriptors for cosine_similarity
-        desc1 = descriptor1.reshape(1, -1)
-        desc2 = descriptor2.reshape(1, -1)
-        
-        # Calculate cosine similarity
-        similarity = cosine_similarity(desc1, desc2)[0][0]
+        similarity = descriptor_similarity(
+            normalize_descriptor(descriptor1)[0],
+            normalize_descriptor(descriptor2)[0]
+        )
         
         # Convert similarity to distance (1 - similarity)
         distance = 1 - similarity
@@ -49,7 +169,17 @@ def compare_face_descriptors(descriptor1, descriptor2, threshold=0.6):
         print("❌ Error in compare_face_descriptors:", e)
         return False, 1.0
 
+EARTH_RADIUS_METERS = 6371008.8
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters for arrays of coordinate pairs (vectorized)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
 def is_within_location(user_lat, user_lon, office_lat, office_lon):
+    from geopy.distance import geodesic
+
     user_location = (user_lat, user_lon)
     office_location = (office_lat, office_lon)
     return geodesic(user_location, office_location).meters  # returns distance in meters
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Viewport queries over live employee positions
+Every EmployeeLocation carries the fixed latitude/longitude grid cell of its
+position (lat_cell, lon_cell), in a partial index over the active rows, so "who is on
+screen" is an index range scan over the rows in the requested bounding box
+instead of a read of every employee. At low zoom the rows are clustered in the
+DB (GROUP BY a coarser cell) and only one entry per cluster is returned.
+Kept free of model imports at module level so models.py can use grid_cell().
+"""
+
+import math
+
+from django.db.models import Avg, Count, F, FloatField, Max, Q, Value
+from django.db.models.functions import Cos, Floor, Power, Radians, Sin
+
+# Position grid cell size (~1.1 km of latitude), stored on EmployeeLocation
+LIVE_CELL_DEGREES = 0.01
+LIVE_CELL_COLUMNS = round(360.0 / LIVE_CELL_DEGREES)
+
+# Clustering is on by default below this web-map zoom level
+CLUSTER_MAX_ZOOM = 14
+
+# Cluster cells per 256px map tile (~64px per cluster)
+CLUSTER_CELLS_PER_TILE = 4
+
+# Individual positions returned per viewport request; larger result sets are clustered
+MAX_VIEWPORT_POINTS = 2000
+
+# Radius queries are limited to a quarter of the globe
+MAX_VIEWPORT_RADIUS_METERS = 5_000_000
+
+
+def grid_cell(latitude, longitude):
+    """(lat_cell, lon_cell) of a position on the LIVE_CELL_DEGREES grid"""
+    row = math.floor(latitude / LIVE_CELL_DEGREES)
+    column = min(math.floor((longitude + 180.0) / LIVE_CELL_DEGREES), LIVE_CELL_COLUMNS - 1)
+    return row, max(column, 0)
+
+
+def parse_viewport(params):
+    """
+    Bounding box from query params, as (min_lat, min_lon, max_lat, max_lon, circle)
+    ?bbox=min_lon,min_lat,max_lon,max_lat (GeoJSON order; min_lon > max_lon crosses the antimeridian)
+    or ?lat=..&lon=..&radius=meters, in which case circle is (lat, lon, radius)
+    Raises ValueError with a message for the client
+    """
+    from .geofence import meters_per_degree
+
+    if params.get('bbox'):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in params['bbox'].split(','))
+        except ValueError:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        if not all(math.isfinite(value) for value in (min_lon, min_lat, max_lon, max_lat)):
+            raise ValueError("bbox must be finite numbers")
+        if not (-90 <= min_lat <= max_lat <= 90) or not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+            raise ValueError("bbox must be within [-180, -90, 180, 90] with min_lat <= max_lat")
+        return min_lat, min_lon, max_lat, max_lon, None
+
+    if params.get('lat') is not None and params.get('lon') is not None and params.get('radius') is not None:
+        try:
+            latitude, longitude, radius = float(params['lat']), float(params['lon']), float(params['radius'])
+        except ValueError:
+            raise ValueError("lat, lon and radius must be numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("lat/lon out of range")
+        if not 0 < radius <= MAX_VIEWPORT_RADIUS_METERS:
+            raise ValueError(f"radius must be between 0 and {MAX_VIEWPORT_RADIUS_METERS} meters")
+
+        lat_meters, _ = meters_per_degree(latitude)
+        lat_span = radius / lat_meters
+        min_lat, max_lat = max(-90.0, latitude - lat_span), min(90.0, latitude + lat_span)
+        # Widest longitude span is at the box's edge closest to a pole
+        _, lon_meters = meters_per_degree(min(89.9, max(abs(min_lat), abs(max_lat))))
+        lon_span = radius / lon_meters
+        if lon_span >= 180 or max_lat >= 90 or min_lat <= -90:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon = (longitude - lon_span + 180.0) % 360.0 - 180.0
+            max_lon = (longitude + lon_span + 180.0) % 360.0 - 180.0
+        return min_lat, min_lon, max_lat, max_lon, (latitude, longitude, radius)
+
+    raise ValueError("Provide bbox=min_lon,min_lat,max_lon,max_lat or lat, lon and radius")
+
+
+def viewport_q(min_lat, min_lon, max_lat, max_lon):
+    """
+    Filter for active positions in the box
+    The cell ranges drive the partial (lat_cell, lon_cell) index; the exact
+    coordinate bounds trim the partial cells at the edges
+    """
+    first_row, first_column = grid_cell(min_lat, min_lon)
+    last_row, last_column = grid_cell(max_lat, max_lon)
+    q = Q(is_active=True, lat_cell__range=(first_row, last_row), latitude__range=(min_lat, max_lat))
+    if min_lon <= max_lon:
+        return q & Q(lon_cell__range=(first_column, last_column), longitude__range=(min_lon, max_lon))
+    # Crosses the antimeridian: two longitude ranges
+    return q & (
+        Q(lon_cell__gte=first_column, longitude__gte=min_lon) |
+        Q(lon_cell__lte=last_column, longitude__lte=max_lon)
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius):
+    """
+    Rows of queryset within radius meters of a point, tested in the DB so it combines
+    with viewport_q before any slicing or grouping
+    Haversine without the arcsin: distance <= radius  <=>  a <= sin²(radius / 2R)
+    """
+    from .utils import EARTH_RADIUS_METERS
+
+    phi = math.radians(latitude)
+    half_dlat = (Radians('latitude') - Value(phi, output_field=FloatField())) / Value(2.0)
+    half_dlon = (Radians('longitude') - Value(math.radians(longitude), output_field=FloatField())) / Value(2.0)
+    haversine = Power(Sin(half_dlat), 2) + Value(math.cos(phi), output_field=FloatField()) * Cos(
+        Radians('latitude')) * Power(Sin(half_dlon), 2)
+    limit = math.sin(min(radius / (2 * EARTH_RADIUS_METERS), math.pi / 2)) ** 2
+    return queryset.alias(haversine=haversine).filter(haversine__lte=limit)
+
+
+def in_viewport(latitude, longitude, min_lat, min_lon, max_lat, max_lon):
+    if not min_lat <= latitude <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= longitude <= max_lon
+    return longitude >= min_lon or longitude <= max_lon
+
+
+def viewport_zoom(min_lon, max_lon):
+    """Approximate web-map zoom of a box shown about four tiles (1024px) wide"""
+    width = max_lon - min_lon if min_lon <= max_lon else max_lon - min_lon + 360.0
+    if width <= 0:
+        return 22
+    return max(0, min(22, math.floor(math.log2(360.0 / width)) + 2))
+
+
+def cluster_degrees(zoom):
+    """Cluster cell size in degrees for a web-map zoom level"""
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+def cluster_positions(queryset, cell_degrees, online):
+    """
+    Group the positions in queryset into cell_degrees cells in the DB
+    online: Q matching the positions whose employee is online
+    Returns one dict per non-empty cell: centroid, employee and online counts, latest update
+    """
+    rows = queryset.order_by().annotate(
+        cluster_row=Floor(_scaled('latitude', cell_degrees)),
+        cluster_column=Floor(_scaled('longitude', cell_degrees)),
+    ).values('cluster_row', 'cluster_column').annotate(
+        count=Count('employee', distinct=True),
+        online=Count('employee', distinct=True, filter=online),
+        center_latitude=Avg('latitude'),
+        center_longitude=Avg('longitude'),
+        last_updated=Max('timestamp'),
+    )
+    return [
+        {
+            'latitude': row['center_latitude'],
+            'longitude': row['center_longitude'],
+            'count': row['count'],
+            'online': row['online'],
+            'last_updated': row['last_updated'].isoformat() if row['last_updated'] else None,
+            # Zoom-in target for the map client: the cell's bounds
+            'bbox': [
+                row['cluster_column'] * cell_degrees,
+                row['cluster_row'] * cell_degrees,
+                (row['cluster_column'] + 1) * cell_degrees,
+                (row['cluster_row'] + 1) * cell_degrees,
+            ],
+        }
+        for row in rows
+    ]
+
+
+def _scaled(field, cell_degrees):
+    return F(field) / Value(cell_degrees, output_field=FloatField())
@@ -3,32 +3,229 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.generics import ListAPIView
+from django.conf import settings
 from django.core.files.base import ContentFile
-from sklearn.metrics.pairwise import cosine_similarity
 from django.utils.timezone import now
 from rest_framework.decorators import api_view
 from datetime import datetime, timedelta
 from django.utils.timezone import make_aware
-from .models import Employee, Attendance, OfficeLocation, LocationAlert, EmployeeLocation
+from django.utils.dateparse import parse_datetime
+from .models import Employee, Attendance, OfficeLocation, LocationAlert, EmployeeLocation, FaceTemplate, LocationHistory
 from .serializers import EmployeeSerializer, AttendanceSerializer, OfficeLocationSerializer, LocationAlertSerializer
-from .utils import get_face_encoding_from_base64, is_within_location, compare_face_descriptors
-from .cloudinary_utils import (
-    configure_cloudinary, 
-    upload_base64_to_cloudinary, 
-    prepare_image_for_face_detection
+from .cloudinary_utils import upload_base64_to_cloudinary
+from .presence import (
+    employee_presence, sync_presence_flags, record_location_presence, record_sharing_stopped,
+    record_attendance_presence, record_heartbeat, clear_heartbeats, online_heartbeats, online_ids,
+    ONLINE_LOCATION_WINDOW, LOCATION_HEARTBEAT_SECONDS
+)
+from .location_buffer import location_buffer
+from .geofence_alerts import track_geofence
+from .live_stream import (
+    get_broker, encode_event, location_payload, publish_location, publish_status, publish_attendance,
+    KEEPALIVE_SECONDS, RETRY_MILLISECONDS
+)
+from .live_delta import (
+    parse_cursor, next_cursor, is_full_resync, changed_since, removed_since, presence_fingerprint
+)
+from .viewport import (
+    parse_viewport, viewport_q, within_radius, in_viewport, viewport_zoom, cluster_degrees, cluster_positions,
+    CLUSTER_MAX_ZOOM, MAX_VIEWPORT_POINTS
 )
 
-import numpy as np
+import asyncio
 import base64
+import binascii
 import io
-from PIL import Image
+import itertools
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# Cloudinary is configured lazily by cloudinary_utils on the first upload; numpy and the face/geo
+# modules built on it (utils, face_gallery, geofence, office_index, trajectory) are imported inside
+# the views that use them, so loading the URLconf does not import numpy
+
+# Upper bound on candidates returned by one identification request
+MAX_IDENTIFY_TOP_K = 50
+
+# Upper bound on records accepted by one bulk attendance request
+MAX_BULK_ATTENDANCE_RECORDS = 500
+
+# Upper bound on GPS points accepted by one bulk location request
+MAX_BULK_LOCATION_POINTS = 5000
+
+# Device clocks may run this far ahead of the server; later bulk fixes are rejected
+MAX_LOCATION_CLOCK_SKEW_SECONDS = 60
+
+# Upper bound on employees looked up by one presence status request
+MAX_PRESENCE_STATUS_IDS = 1000
+
+# Location pings that keep the same inside/outside state and move less than this are not stored...
+LOCATION_MIN_MOVE_METERS = 10.0
+# ...unless the stored location is older than presence.LOCATION_HEARTBEAT_SECONDS (keeps the online window fresh)
+
+def load_template_matrix(employee):
+    """
+    All of an employee's face templates as one (n, 128) unit-length matrix
+    Falls back to the single stored face_encoding for employees without templates
+    """
+    import numpy as np
+    from .utils import decode_face_encoding, decode_unit_descriptor
+
+    blobs = list(FaceTemplate.objects.filter(employee=employee).values_list('descriptor', flat=True))
+    if blobs:
+        return np.vstack([decode_unit_descriptor(blob) for blob in blobs])
+    return decode_face_encoding(employee.face_encoding, employee.face_encoding_norm).reshape(1, -1)
+
+def permitted_office_ids(employee_pks):
+    """{employee pk: extra office ids they may check in at} for many employees in one query"""
+    permitted = {}
+    for employee_pk, office_pk in Employee.allowed_offices.through.objects.filter(
+        employee_id__in=employee_pks
+    ).values_list('employee_id', 'officelocation_id'):
+        permitted.setdefault(employee_pk, set()).add(office_pk)
+    return permitted
+
+def find_permitted_office(employee, latitude, longitude):
+    """
+    Nearest office other than the home office whose geofence contains the point and
+    that the employee is allowed to use; (office_id, name, distance) or None
+    """
+    from .office_index import office_index
+
+    matches = office_index.containing(latitude, longitude)
+    if not matches:
+        return None
+    permitted = permitted_office_ids([employee.pk]).get(employee.pk, set())
+    return next((match for match in matches if match[0] in permitted), None)
+
+def classify_location(employee, latitude, longitude):
+    """
+    Server-side geofence state of a location ping: (distance_meters, is_inside)
+    Inside means the home office or any other permitted office containing the point
+    """
+    from .geofence import get_office_geofence
+
+    distance, is_inside = get_office_geofence(employee.office).evaluate(latitude, longitude)
+    if not is_inside:
+        match = find_permitted_office(employee, latitude, longitude)
+        if match:
+            return match[2], True
+    return distance, is_inside
+
+def resolve_permitted_offices(employee_pks, latitudes, longitudes, distances, inside):
+    """
+    Batch version of find_permitted_office for points already checked against home offices
+    Points outside their home office that fall in another permitted office get their
+    distances/inside entries updated in place; returns {position: (office_id, name, distance)}
+    """
+    import numpy as np
+    from .office_index import office_index
+
+    containing = {}
+    for position in np.flatnonzero(~inside):
+        matches = office_index.containing(latitudes[position], longitudes[position])
+        if matches:
+            containing[position] = matches
+    if not containing:
+        return {}
+
+    permitted = permitted_office_ids({employee_pks[position] for position in containing})
+    accepted = {}
+    for position, matches in containing.items():
+        allowed = permitted.get(employee_pks[position], set())
+        match = next((match for match in matches if match[0] in allowed), None)
+        if match:
+            accepted[position] = match
+            distances[position] = match[2]
+            inside[position] = True
+    return accepted
+
+def is_redundant_ping(previous, latitude, longitude, is_inside, at=None):
+    """True when storing this ping (taken at `at`, default now) would change nothing dashboards or alerts care about"""
+    from .utils import haversine_distances
+
+    if previous is None or previous.is_in_office_radius != is_inside:
+        return False
+    if ((at or timezone.now()) - previous.timestamp).total_seconds() >= LOCATION_HEARTBEAT_SECONDS:
+        return False
+    moved = float(haversine_distances(previous.latitude, previous.longitude, latitude, longitude))
+    return moved < LOCATION_MIN_MOVE_METERS
+
+def history_point(location):
+    """Raw LocationHistory row for a stored location"""
+    return LocationHistory(
+        employee_id=location.employee_id,
+        bucket_start=location.timestamp,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        is_in_office_radius=location.is_in_office_radius,
+        distance_from_office=location.distance_from_office
+    )
+
+def compress_history_points(points):
+    """
+    Drop track points the time-aware simplifier can reconstruct within
+    LOCATION_TRACK_TOLERANCE_METERS; points on either side of a geofence state change are always kept
+    points: LocationHistory rows grouped by employee, in time order within each employee
+    """
+    import numpy as np
+    from .trajectory import simplify_track, represented_counts
+
+    compressed = []
+    for _, group in itertools.groupby(points, key=lambda point: point.employee_id):
+        group = list(group)
+        inside = np.array([point.is_in_office_radius for point in group])
+        keep = np.zeros(len(group), dtype=bool)
+        changes = np.flatnonzero(inside[1:] != inside[:-1])
+        keep[changes] = True
+        keep[changes + 1] = True
+        kept = simplify_track(
+            [point.bucket_start for point in group],
+            [point.latitude for point in group], [point.longitude for point in group],
+            settings.LOCATION_TRACK_TOLERANCE_METERS, settings.LOCATION_TRACK_MAX_GAP_SECONDS, keep
+        )
+        for index, count in zip(kept, represented_counts(len(group), kept)):
+            group[index].point_count = int(count)
+            compressed.append(group[index])
+    return compressed
+
+def record_history(points):
+    """Append raw track points, through the write-behind buffer when it is enabled"""
+    if location_buffer.enabled:
+        location_buffer.append_history(points)
+    else:
+        LocationHistory.objects.bulk_create(points)
 
-# Configure Cloudinary
-configure_cloudinary()
+def add_face_template(employee, descriptor_unit, source='registration', similarity=None):
+    """
+    Append a template, evicting the oldest attendance-sourced one when the employee is at the cap
+    Returns the new FaceTemplate, or None if the cap is reached by registration templates only
+    """
+    from .utils import MAX_FACE_TEMPLATES
+    from .descriptor_codec import encode_descriptor
+
+    if FaceTemplate.objects.filter(employee=employee).count() >= MAX_FACE_TEMPLATES:
+        oldest = FaceTemplate.objects.filter(employee=employee, source='attendance').order_by('created_at').first()
+        if oldest is None:
+            return None
+        oldest.delete()
+
+    return FaceTemplate.objects.create(
+        employee=employee,
+        descriptor=encode_descriptor(descriptor_unit, settings.FACE_ENCODING_FORMAT),
+        source=source,
+        similarity=similarity
+    )
 
 @api_view(['POST'])
 def analyze_face(request):
+    import numpy as np
+
     try:
         base64_img = request.data.get('image_base64', '')
 
@@ -39,6 +236,8 @@ def analyze_face(request):
         if "," in base64_img:
             base64_img = base64_img.split(",")[1]
 
+        from PIL import Image
+
         # Decode image to numpy array
         image_data = base64.b64decode(base64_img)
         image = Image.open(io.BytesIO(image_data))
@@ -54,8 +253,38 @@ def analyze_face(request):
         print("❌ Analyze Face Error:", e)
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def duplicate_face_response(descriptor_unit, employee_id):
+    """
+    409 response when the face is already registered to another employee, else None
+    Compares against the gallery of primary descriptors (Employee.face_encoding);
+    extra face templates are not part of the gallery
+    The gallery is reloaded from the Employee table first (this worker's copy can miss
+    registrations made on other workers for up to GALLERY_MAX_AGE_SECONDS) and scored
+    exactly, bypassing the IVF index, so no stored encoding is skipped
+    """
+    from .utils import DUPLICATE_FACE_THRESHOLD
+    from .face_gallery import face_gallery
+
+    face_gallery.load()
+    matches = face_gallery.identify(descriptor_unit, top_k=1, exact=True)
+    if not matches or matches[0][0] == employee_id or matches[0][2] < DUPLICATE_FACE_THRESHOLD:
+        return None
+    duplicate_id, duplicate_name, duplicate_similarity = matches[0]
+    print(f"❌ Duplicate face: {employee_id} matches {duplicate_id} ({duplicate_similarity:.4f})")
+    return Response({
+        'error': f'This face is already registered as {duplicate_name} ({duplicate_id}).',
+        'duplicate_employee_id': duplicate_id,
+        'similarity': round(duplicate_similarity, 4),
+        'threshold': DUPLICATE_FACE_THRESHOLD,
+        'status': 'duplicate_face'
+    }, status=409)
+
 class RegisterEmployeeView(APIView):
     def post(self, request):
+        import numpy as np
+        from .utils import normalize_descriptor
+        from .descriptor_codec import encode_descriptor
+
         try:
             name = request.data['name']
             employee_id = request.data['employee_id']
@@ -67,6 +296,16 @@ class RegisterEmployeeView(APIView):
             if not descriptor_list or len(descriptor_list) != 128:
                 return Response({'error': 'Invalid or missing face descriptor'}, status=400)
 
+            # Convert descriptor to float32 and normalize once, so verification is a plain dot product
+            descriptor_array, descriptor_norm = normalize_descriptor(descriptor_list)
+            if descriptor_norm == 0 or not np.isfinite(descriptor_norm):
+                return Response({'error': 'Invalid or missing face descriptor'}, status=400)
+
+            # 👥 Duplicate check: one vectorized pass over every stored encoding (face gallery)
+            duplicate = duplicate_face_response(descriptor_array, employee_id)
+            if duplicate is not None:
+                return duplicate
+
             # 🖼️ Upload to Cloudinary
             try:
                 cloudinary_url, cloudinary_id = upload_base64_to_cloudinary(
@@ -87,9 +326,6 @@ class RegisterEmployeeView(APIView):
             image_data = base64.b64decode(face_image_base64)
             image_file = ContentFile(image_data, name=f"{employee_id}.jpg")
 
-            # Convert descriptor to float32 and store
-            descriptor_array = np.array(descriptor_list, dtype=np.float32)
-
             # Get OfficeLocation instance
             try:
                 office_instance = OfficeLocation.objects.get(id=office_id)
@@ -97,16 +333,20 @@ class RegisterEmployeeView(APIView):
                 return Response({'error': 'Invalid office ID'}, status=400)
 
             # Save employee with Cloudinary URLs
-            Employee.objects.create(
+            employee = Employee.objects.create(
                 name=name,
                 employee_id=employee_id,
                 face_image=image_file,  # Local backup
                 face_image_cloudinary_url=cloudinary_url,
                 face_image_cloudinary_id=cloudinary_id,
                 office=office_instance,
-                face_encoding=descriptor_array.tobytes()  # now 128-D float32
+                face_encoding=encode_descriptor(descriptor_array, settings.FACE_ENCODING_FORMAT),  # 128-D unit-length, tagged format
+                face_encoding_norm=descriptor_norm
             )
 
+            # 🧠 First face template; more can be appended later for lighting/angle variation
+            add_face_template(employee, descriptor_array, source='registration')
+
             return Response({
                 'message': 'Employee registered successfully!',
                 'cloudinary_url': cloudinary_url,
@@ -117,14 +357,122 @@ class RegisterEmployeeView(APIView):
             print("❌ Register Error:", e)
             return Response({'error': str(e)}, status=500)
 
+class IdentifyFaceView(APIView):
+    """1:N identification against the in-memory face gallery (kiosk mode; primary descriptors only)"""
+    def post(self, request):
+        import numpy as np
+        from .utils import FACE_SIMILARITY_THRESHOLD
+        from .face_gallery import face_gallery
+
+        try:
+            descriptor_list = request.data.get('descriptor')
+            try:
+                top_k = min(max(int(request.data.get('top_k', 5)), 1), MAX_IDENTIFY_TOP_K)
+            except (TypeError, ValueError):
+                return Response({'error': 'top_k must be an integer'}, status=400)
+
+            if not isinstance(descriptor_list, list) or len(descriptor_list) != 128:
+                return Response({'error': 'Invalid or missing face descriptor'}, status=400)
+
+            matches = face_gallery.identify(np.array(descriptor_list, dtype=np.float32), top_k=top_k)
+
+            results = [{
+                'employee_id': employee_id,
+                'employee_name': name,
+                'similarity': round(similarity, 4),
+                'is_match': similarity >= FACE_SIMILARITY_THRESHOLD
+            } for employee_id, name, similarity in matches]
+
+            best = results[0] if results and results[0]['is_match'] else None
+
+            return Response({
+                'match': best,
+                'candidates': results,
+                'threshold': FACE_SIMILARITY_THRESHOLD,
+                'gallery_size': len(face_gallery)
+            }, status=200)
+
+        except Exception as e:
+            print("❌ Identify Face Error:", e)
+            return Response({'error': str(e)}, status=500)
+
+class EmployeeFaceTemplatesView(APIView):
+    """
+    List or append face templates for one employee
+    Templates are used to verify that employee's own check-ins; 1:N identification
+    (kiosk mode, duplicate checks) only searches primary descriptors
+    """
+    def get(self, request, employee_id):
+        from .utils import MAX_FACE_TEMPLATES
+
+        try:
+            employee = Employee.objects.get(employee_id=employee_id)
+        except Employee.DoesNotExist:
+            return Response({'error': 'Employee not found'}, status=404)
+
+        templates = FaceTemplate.objects.filter(employee=employee).values('id', 'source', 'similarity', 'created_at')
+        return Response({
+            'employee_id': employee.employee_id,
+            'max_templates': MAX_FACE_TEMPLATES,
+            'templates': list(templates)
+        })
+
+    def post(self, request, employee_id):
+        import numpy as np
+        from .utils import normalize_descriptor, MAX_FACE_TEMPLATES
+
+        try:
+            descriptor_list = request.data.get('descriptor')
+            if not descriptor_list or len(descriptor_list) != 128:
+                return Response({'error': 'Invalid or missing face descriptor'}, status=400)
+
+            try:
+                employee = Employee.objects.get(employee_id=employee_id)
+            except Employee.DoesNotExist:
+                return Response({'error': 'Employee not found'}, status=404)
+
+            descriptor_unit, descriptor_norm = normalize_descriptor(descriptor_list)
+            if descriptor_norm == 0 or not np.isfinite(descriptor_norm):
+                return Response({'error': 'Invalid or missing face descriptor'}, status=400)
+
+            # 👥 Someone else's face must not become this employee's template
+            duplicate = duplicate_face_response(descriptor_unit, employee.employee_id)
+            if duplicate is not None:
+                return duplicate
+
+            template = add_face_template(employee, descriptor_unit, source='registration')
+            if template is None:
+                return Response({
+                    'error': f'Employee already has {MAX_FACE_TEMPLATES} registration templates',
+                    'max_templates': MAX_FACE_TEMPLATES
+                }, status=400)
+
+            return Response({
+                'message': 'Face template added successfully!',
+                'template_id': template.id,
+                'template_count': FaceTemplate.objects.filter(employee=employee).count()
+            }, status=201)
+
+        except Exception as e:
+            print("❌ Add Face Template Error:", e)
+            return Response({'error': str(e)}, status=500)
+
 class GetEmployeeByID(RetrieveAPIView):
     lookup_field = 'employee_id'
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
 class AttendanceView(APIView):
     def post(self, request):
+        import numpy as np
+        from .utils import (
+            FACE_SIMILARITY_THRESHOLD, normalize_descriptor, score_templates,
+            TEMPLATE_AUTO_ENROLL_SIMILARITY, TEMPLATE_REDUNDANT_SIMILARITY
+        )
+        from .face_gallery import face_gallery
+        from .geofence import get_office_geofence
+
         try:
-            employee_id = request.data['employee_id']
+            employee_id = request.data.get('employee_id')
             face_image_base64 = request.data['face_image']
             descriptor_list = request.data.get('descriptor')
             latitude = float(request.data['latitude'])
@@ -136,17 +484,31 @@ class AttendanceView(APIView):
 
             incoming_encoding = np.array(descriptor_list, dtype=np.float32)
 
+            if not employee_id:
+                # 🏢 Kiosk mode: no employee_id, identify the person from the face alone
+                if len(incoming_encoding) != 128:
+                    return Response({
+                        'error': 'Invalid face descriptor length. Expected 128 dimensions.',
+                        'received_length': len(incoming_encoding)
+                    }, status=400)
+                matches = face_gallery.identify(incoming_encoding, top_k=1)
+                if not matches or matches[0][2] < FACE_SIMILARITY_THRESHOLD:
+                    best = round(matches[0][2], 4) if matches else None
+                    print(f"❌ Kiosk check-in: no employee matched (best similarity: {best})")
+                    return Response({
+                        'error': 'Face not recognized. Please try again or enter your employee ID.',
+                        'similarity': best,
+                        'threshold': FACE_SIMILARITY_THRESHOLD,
+                        'status': 'face_not_recognized'
+                    }, status=403)
+                employee_id = matches[0][0]
+                print(f"🏢 Kiosk check-in identified {employee_id} ({matches[0][2]:.4f})")
+
             try:
                 employee = Employee.objects.get(employee_id=employee_id)
             except Employee.DoesNotExist:
                 return Response({'error': 'Employee not found'}, status=404)
 
-            stored_encoding = np.frombuffer(employee.face_encoding, dtype=np.float32)
-
-            # ✅ Face recognition check
-            similarity = cosine_similarity(incoming_encoding.reshape(1, -1), stored_encoding.reshape(1, -1))[0][0]
-            print(f"🧠 Cosine Similarity: {similarity:.4f}")
-
             # Additional validation checks
             if len(incoming_encoding) != 128:
                 print(f"❌ Invalid descriptor length: {len(incoming_encoding)}")
@@ -155,6 +517,13 @@ class AttendanceView(APIView):
                     'received_length': len(incoming_encoding)
                 }, status=400)
 
+            templates = load_template_matrix(employee)
+            incoming_unit = normalize_descriptor(incoming_encoding)[0]
+
+            # ✅ Face recognition check: every template scored in one matrix-vector product
+            similarity = score_templates(incoming_unit, templates)
+            print(f"🧠 Cosine Similarity: {similarity:.4f} (best of {len(templates)} templates)")
+
             # Check if descriptor is all zeros or empty
             if np.all(incoming_encoding == 0) or np.sum(np.abs(incoming_encoding)) < 1e-6:
                 print(f"❌ Empty or zero descriptor detected")
@@ -172,7 +541,7 @@ class AttendanceView(APIView):
                 }, status=400)
 
             # Make threshold even stricter - 0.95 for better security
-            threshold = 0.95
+            threshold = FACE_SIMILARITY_THRESHOLD
             if similarity < threshold:
                 print(f"❌ Face rejected! Similarity: {similarity:.4f} < {threshold}")
                 return Response({
@@ -184,12 +553,20 @@ class AttendanceView(APIView):
             
             print(f"✅ Face accepted! Similarity: {similarity:.4f} >= {threshold}")
 
-            # ✅ Location check
+            # ✅ Location check: home office first, then any other permitted office containing the point
             office = employee.office
-            distance = is_within_location(latitude, longitude, office.latitude, office.longitude)
+            office_id, office_name = office.pk, office.name
+            distance, is_inside = get_office_geofence(office).evaluate(latitude, longitude)
             print(f"📍 Distance from office: {int(distance)} meters")
 
-            if distance > office.radius_meters:
+            if not is_inside:
+                match = find_permitted_office(employee, latitude, longitude)
+                if match:
+                    office_id, office_name, distance = match
+                    is_inside = True
+                    print(f"📍 Checked in at permitted office {office_name} ({int(distance)} meters)")
+
+            if not is_inside:
                 return Response({
                     'error': f'❌ Location mismatch. You are {int(distance)} meters away from office.',
                     'distance': int(distance),
@@ -217,7 +594,7 @@ class AttendanceView(APIView):
             image_file = ContentFile(image_data, name=f"{employee_id}_{action}.jpg")
 
             # ✅ Save attendance with Cloudinary URLs
-            Attendance.objects.create(
+            attendance = Attendance.objects.create(
                 employee=employee,
                 image=image_file,  # Local backup
                 image_cloudinary_url=cloudinary_url,
@@ -225,13 +602,23 @@ class AttendanceView(APIView):
                 latitude=latitude,
                 longitude=longitude,
                 action=action,
+                office_id=office_id,
                 timestamp=now()
             )
+            record_attendance_presence({employee.pk: attendance.timestamp})
+            publish_attendance(employee, attendance, office_name)
+
+            # 🧠 High-confidence, non-redundant captures become extra templates (cuts future false rejects)
+            best_template_score = float(np.max(templates @ incoming_unit))
+            if TEMPLATE_AUTO_ENROLL_SIMILARITY <= similarity and best_template_score < TEMPLATE_REDUNDANT_SIMILARITY:
+                if add_face_template(employee, incoming_unit, source='attendance', similarity=similarity):
+                    print(f"🧠 Added attendance face template for {employee.name}")
 
             return Response({
                 'message': f'{action.capitalize()} recorded successfully!',
                 'similarity': round(similarity, 4),
-                'distance_from_office': int(distance)
+                'distance_from_office': int(distance),
+                'office_name': office_name
             }, status=201)
 
         except Exception as e:
@@ -239,6 +626,223 @@ class AttendanceView(APIView):
             return Response({'error': str(e)}, status=500)
   
         
+class BulkAttendanceView(APIView):
+    """
+    Replay many queued kiosk/offline check-ins in one request
+    Each record is validated independently so one bad record does not fail the batch
+    """
+    def post(self, request):
+        import numpy as np
+        from .utils import (
+            FACE_SIMILARITY_THRESHOLD, normalize_descriptor, decode_face_encoding, decode_unit_descriptor,
+            score_templates_batch
+        )
+        from .geofence import evaluate_offices
+
+        try:
+            records = request.data.get('records')
+            if not isinstance(records, list) or not records:
+                return Response({'error': 'Missing records list'}, status=400)
+            if len(records) > MAX_BULK_ATTENDANCE_RECORDS:
+                return Response({
+                    'error': f'Too many records. Maximum is {MAX_BULK_ATTENDANCE_RECORDS} per request.'
+                }, status=400)
+
+            results = [None] * len(records)
+            parsed = []  # (index, employee_id, descriptor_unit, latitude, longitude, action, captured_at, image_bytes)
+
+            # 1️⃣ Per-record field validation (no DB access)
+            for index, record in enumerate(records):
+                if not isinstance(record, dict):
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Invalid record: expected an object'}
+                    continue
+                try:
+                    employee_id = str(record['employee_id'])
+                    descriptor_list = record.get('descriptor')
+                    latitude = float(record['latitude'])
+                    longitude = float(record['longitude'])
+                    action = record['action']
+                except (KeyError, TypeError, ValueError) as e:
+                    results[index] = {'index': index, 'status': 'error', 'error': f'Invalid record: {e}'}
+                    continue
+                if not (abs(latitude) <= 90 and abs(longitude) <= 180):  # Also rejects nan/inf
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                      'error': 'Coordinates out of range'}
+                    continue
+
+                if not isinstance(descriptor_list, list) or len(descriptor_list) != 128:
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                      'error': 'Invalid face descriptor length. Expected 128 dimensions.'}
+                    continue
+
+                face_image = record.get('face_image')
+                try:
+                    descriptor_unit, descriptor_norm = normalize_descriptor(descriptor_list)
+                    image_bytes = None
+                    if face_image:
+                        if not isinstance(face_image, str):
+                            raise TypeError('face_image must be a base64 string')
+                        if "," in face_image:
+                            face_image = face_image.split(",")[1]
+                        image_bytes = base64.b64decode(face_image)
+                except (TypeError, ValueError, binascii.Error) as e:
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                      'error': f'Invalid record: {e}'}
+                    continue
+                if descriptor_norm < 1e-6 or not np.isfinite(descriptor_norm):
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'no_face_detected',
+                                      'error': 'No face detected in the image.'}
+                    continue
+
+                captured_at = None
+                if record.get('captured_at'):
+                    try:
+                        captured_at = parse_datetime(str(record['captured_at']))
+                    except ValueError:
+                        pass
+                    if captured_at is None:
+                        results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                          'error': 'Invalid captured_at timestamp'}
+                        continue
+                    if timezone.is_naive(captured_at):
+                        captured_at = make_aware(captured_at)
+
+                parsed.append((index, employee_id, descriptor_unit, latitude, longitude,
+                               action, captured_at or now(), image_bytes))
+
+            # 2️⃣ One query for employees + offices, one for all of their templates
+            employees = {
+                employee.employee_id: employee
+                for employee in Employee.objects.filter(
+                    employee_id__in={item[1] for item in parsed}
+                ).select_related('office')
+            }
+            owner_of = {employee.pk: owner for owner, employee in enumerate(employees.values())}
+            employee_by_owner = list(employees.values())
+
+            template_owner, template_vectors = [], []
+            for employee_pk, blob in FaceTemplate.objects.filter(
+                employee_id__in=owner_of.keys()
+            ).values_list('employee_id', 'descriptor'):
+                template_owner.append(owner_of[employee_pk])
+                template_vectors.append(decode_unit_descriptor(blob))
+
+            # Legacy employees without templates are scored against their stored face_encoding
+            owners_with_templates = set(template_owner)
+            for owner, employee in enumerate(employee_by_owner):
+                if owner not in owners_with_templates and employee.face_encoding:
+                    template_owner.append(owner)
+                    template_vectors.append(decode_face_encoding(employee.face_encoding, employee.face_encoding_norm))
+            owners_with_templates = set(template_owner)
+
+            candidates = []
+            for item in parsed:
+                index, employee_id = item[0], item[1]
+                employee = employees.get(employee_id)
+                if employee is None:
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                      'error': 'Employee not found'}
+                elif owner_of[employee.pk] not in owners_with_templates:
+                    results[index] = {'index': index, 'employee_id': employee_id, 'status': 'error',
+                                      'error': 'Employee has no enrolled face'}
+                else:
+                    candidates.append(item)
+
+            if candidates:
+                # 3️⃣ Face scores for every record in one vectorized pass
+                probe_owner = np.array([owner_of[employees[item[1]].pk] for item in candidates])
+                similarities = score_templates_batch(
+                    np.vstack([item[2] for item in candidates]),
+                    np.vstack(template_vectors),
+                    np.array(template_owner),
+                    probe_owner
+                )
+
+                # 4️⃣ Distances to each record's office in one vectorized call
+                offices = [employees[item[1]].office for item in candidates]
+                distances, inside = evaluate_offices(
+                    [item[3] for item in candidates], [item[4] for item in candidates], offices
+                )
+
+                # Records outside their home office may still fall inside another permitted office
+                accepted_office = [(office.pk, office.name) for office in offices]
+                for position, match in resolve_permitted_offices(
+                    [employees[item[1]].pk for item in candidates],
+                    [item[3] for item in candidates], [item[4] for item in candidates], distances, inside
+                ).items():
+                    accepted_office[position] = match[:2]
+
+                # Skip records that were already replayed (same employee, action and capture time)
+                already_recorded = set(Attendance.objects.filter(
+                    employee__in=employees.values(),
+                    timestamp__in={item[6] for item in candidates}
+                ).values_list('employee_id', 'action', 'timestamp'))
+
+                to_create = []
+                for item, similarity, distance, is_inside, office, (office_id, office_name) in zip(
+                    candidates, similarities, distances, inside, offices, accepted_office
+                ):
+                    index, employee_id, _, latitude, longitude, action, captured_at, image_bytes = item
+                    employee = employees[employee_id]
+                    result = {'index': index, 'employee_id': employee_id,
+                              'similarity': round(float(similarity), 4), 'distance': int(distance)}
+
+                    if similarity < FACE_SIMILARITY_THRESHOLD:
+                        result.update(status='face_mismatch', error='Face does not match.')
+                    elif not is_inside:
+                        result.update(status='location_mismatch',
+                                      error=f'You were {int(distance)} meters away from office.',
+                                      allowed_radius=office.radius_meters)
+                    elif (employee.pk, action, captured_at) in already_recorded:
+                        result.update(status='duplicate')
+                    else:
+                        # Images are kept as local backups only; Cloudinary upload is skipped for replays
+                        image_file = ''
+                        if image_bytes:
+                            image_file = ContentFile(image_bytes, name=f"{employee_id}_{action}.jpg")
+                        to_create.append((Attendance(
+                            employee=employee,
+                            image=image_file,
+                            latitude=latitude,
+                            longitude=longitude,
+                            action=action,
+                            office_id=office_id
+                        ), captured_at, office_name))
+                        already_recorded.add((employee.pk, action, captured_at))
+                        result.update(status='recorded', office_name=office_name)
+                    results[index] = result
+
+                # 5️⃣ One INSERT for the batch, then stamp the original capture times
+                # (timestamp is auto_now_add, so it can only be overridden after the insert)
+                if to_create:
+                    created = Attendance.objects.bulk_create([attendance for attendance, _, _ in to_create])
+                    for attendance, (_, captured_at, _) in zip(created, to_create):
+                        attendance.timestamp = captured_at
+                    Attendance.objects.bulk_update(created, ['timestamp'])
+
+                    latest_times = {}
+                    for attendance in created:
+                        latest_times[attendance.employee_id] = max(
+                            attendance.timestamp, latest_times.get(attendance.employee_id, attendance.timestamp)
+                        )
+                    record_attendance_presence(latest_times)
+                    for attendance, (_, _, office_name) in zip(created, to_create):
+                        publish_attendance(attendance.employee, attendance, office_name)
+
+            recorded = sum(1 for result in results if result['status'] == 'recorded')
+            print(f"📦 Bulk attendance: {recorded}/{len(records)} records saved")
+
+            return Response({
+                'message': f'{recorded} of {len(records)} attendance records saved.',
+                'recorded': recorded,
+                'results': results
+            }, status=200)
+
+        except Exception as e:
+            print("❌ Bulk Attendance Error:", e)
+            return Response({'error': str(e)}, status=500)
+
+
 class OfficeLocationView(APIView):
     def post(self, request):
         serializer = OfficeLocationSerializer(data=request.data)
@@ -251,6 +855,35 @@ class OfficeLocationView(APIView):
         locations = OfficeLocation.objects.all()
         return Response(OfficeLocationSerializer(locations, many=True).data)
 
+class NearbyOfficesView(APIView):
+    """Nearest offices to a point, and which of them contain it (served from the spatial index)"""
+    def get(self, request):
+        from .geofence import PolygonGeofence
+        from .office_index import office_index
+
+        try:
+            latitude = float(request.query_params['latitude'])
+            longitude = float(request.query_params['longitude'])
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 50)
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'latitude and longitude are required numbers'}, status=400)
+
+        containing = {office_id for office_id, _, _ in office_index.containing(latitude, longitude)}
+        offices = []
+        for office_id, name, distance in office_index.nearest(latitude, longitude, limit):
+            fence = office_index.get(office_id)[1]
+            offices.append({
+                'id': office_id,
+                'name': name,
+                'latitude': fence.latitude,
+                'longitude': fence.longitude,
+                'radius_meters': fence.radius_meters,
+                'has_boundary': isinstance(fence, PolygonGeofence),
+                'distance': int(distance),
+                'is_inside': office_id in containing,
+            })
+        return Response({'offices': offices, 'containing': sorted(containing)})
+
 class OfficeLocationListView(ListAPIView):
     queryset = OfficeLocation.objects.all()
     serializer_class = OfficeLocationSerializer
@@ -283,7 +916,7 @@ class AdminAttendanceLogsView(APIView):
                 'id': log.id,
                 'employee_name': log.employee.name,
                 'employee_id': log.employee.employee_id,
-                'image_url': log.image.url,
+                'image_url': log.image.url if log.image else log.image_cloudinary_url,
                 'latitude': log.latitude,
                 'longitude': log.longitude,
                 'timestamp': log.timestamp,
@@ -309,7 +942,7 @@ class EmployeeAttendanceLogsView(APIView):
                     'id': log.id,
                     'employee_name': log.employee.name,
                     'employee_id': log.employee.employee_id,
-                    'image_url': log.image.url,
+                    'image_url': log.image.url if log.image else log.image_cloudinary_url,
                     'latitude': log.latitude,
                     'longitude': log.longitude,
                     'timestamp': log.timestamp,
@@ -365,63 +998,100 @@ def location_alert(request):
 def location_alerts(request):
     """Get all location alerts"""
     try:
-        alerts = LocationAlert.objects.all().order_by('-timestamp')[:50]  # Last 50 alerts
+        alerts = LocationAlert.objects.select_related('employee').order_by('-timestamp')
+        if request.query_params.get('open') in ('1', 'true'):
+            alerts = alerts.filter(ended_at__isnull=True)  # Employees currently outside
+        alerts = alerts[:50]  # Last 50 alerts (one per excursion)
         serializer = LocationAlertSerializer(alerts, many=True)
         return Response(serializer.data, status=200)
     except Exception as e:
         print("❌ Location Alerts Error:", e)
         return Response({'error': str(e)}, status=500)
 
+def employee_location_entry(employee, latest_location, is_online):
+    """employee_locations entry: the latest position while online, the home office otherwise"""
+    if latest_location and is_online:
+        return {
+            'employee_id': employee.employee_id,
+            'employee_name': employee.name,
+            'latitude': latest_location.latitude,
+            'longitude': latest_location.longitude,
+            'distance_from_office': latest_location.distance_from_office,
+            'is_in_office_radius': latest_location.is_in_office_radius,
+            'office_name': employee.office.name,
+            'office_latitude': employee.office.latitude,
+            'office_longitude': employee.office.longitude,
+            'office_radius': employee.office.radius_meters,
+            'timestamp': latest_location.timestamp.isoformat(),
+            'status': 'online'
+        }
+    # Employee is offline
+    return {
+        'employee_id': employee.employee_id,
+        'employee_name': employee.name,
+        'latitude': employee.office.latitude if employee.office else 0,
+        'longitude': employee.office.longitude if employee.office else 0,
+        'distance_from_office': 0,
+        'is_in_office_radius': False,
+        'office_name': employee.office.name if employee.office else 'Unknown',
+        'office_latitude': employee.office.latitude if employee.office else 0,
+        'office_longitude': employee.office.longitude if employee.office else 0,
+        'office_radius': employee.office.radius_meters if employee.office else 0,
+        'timestamp': latest_location.timestamp.isoformat() if latest_location else None,
+        'status': 'offline'
+    }
+
+def live_location_poll(request, entry):
+    """
+    Shared body of the polled live location endpoints
+    Query: ?since=<cursor> for only the employees changed since the response that returned
+    the cursor: {'cursor', 'full', 'employees', 'removed'}; 'full' is true when the cursor
+    was too old for a delta and 'employees' is everyone. Without since: the bare list.
+    Responses carry ETag, Last-Modified and the next cursor (X-Cursor); a poll whose
+    If-None-Match / If-Modified-Since still holds gets a 304 without loading any employee.
+    entry(employee, location, is_online) builds one list item
+    """
+    now = timezone.now()
+    since = None
+    if request.query_params.get('since'):
+        try:
+            since = parse_cursor(request.query_params['since'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    buffered = location_buffer.latest()
+    full = is_full_resync(since, now)
+    etag, last_modified = presence_fingerprint(buffered, now, full)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+
+    # One query: the employees with their presence records (buffered pings are newer)
+    employees = Employee.objects.select_related('office')
+    if not full:
+        employees = changed_since(employees, since, buffered, now)
+    data = [entry(*row) for row in employee_presence(employees, buffered, now, use_heartbeats=True)]
+
+    cursor = next_cursor(now)
+    if since is None:
+        response = Response(data, status=status.HTTP_200_OK)
+    else:
+        removed = [] if full else removed_since(since, [item['employee_id'] for item in data])
+        response = Response({'cursor': cursor, 'full': full, 'employees': data, 'removed': removed},
+                            status=status.HTTP_200_OK)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'  # Cache, but revalidate every poll
+    response['X-Cursor'] = cursor
+    return response
+
 @api_view(['GET'])
 def employee_locations(request):
-    """Get current locations of all employees"""
+    """Get current locations of all employees (?since=<cursor> for changes only, see live_location_poll)"""
     try:
-        # Get the latest location for each employee
-        employees = Employee.objects.all()
-        locations = []
-        
-        for employee in employees:
-            # Get the latest location for this employee
-            latest_location = EmployeeLocation.objects.filter(
-                employee=employee
-            ).order_by('-timestamp').first()
-            
-            # Check if employee should be marked as offline
-            is_online = check_employee_online_status(employee)
-            
-            if latest_location and is_online:
-                locations.append({
-                    'employee_id': employee.employee_id,
-                    'employee_name': employee.name,
-                    'latitude': latest_location.latitude,
-                    'longitude': latest_location.longitude,
-                    'distance_from_office': latest_location.distance_from_office,
-                    'is_in_office_radius': latest_location.is_in_office_radius,
-                    'office_name': employee.office.name,
-                    'office_latitude': employee.office.latitude,
-                    'office_longitude': employee.office.longitude,
-                    'office_radius': employee.office.radius_meters,
-                    'timestamp': latest_location.timestamp.isoformat(),
-                    'status': 'online'
-                })
-            else:
-                # Employee is offline
-                locations.append({
-                    'employee_id': employee.employee_id,
-                    'employee_name': employee.name,
-                    'latitude': employee.office.latitude if employee.office else 0,
-                    'longitude': employee.office.longitude if employee.office else 0,
-                    'distance_from_office': 0,
-                    'is_in_office_radius': False,
-                    'office_name': employee.office.name if employee.office else 'Unknown',
-                    'office_latitude': employee.office.latitude if employee.office else 0,
-                    'office_longitude': employee.office.longitude if employee.office else 0,
-                    'office_radius': employee.office.radius_meters if employee.office else 0,
-                    'timestamp': latest_location.timestamp.isoformat() if latest_location else None,
-                    'status': 'offline'
-                })
-        
-        return Response(locations, status=200)
+        return live_location_poll(request, employee_location_entry)
     except Exception as e:
         print("❌ Employee Locations Error:", e)
         return Response({'error': str(e)}, status=500)
@@ -429,65 +1099,94 @@ def employee_locations(request):
 @api_view(['POST'])
 def location_update(request):
     """Handle real-time location updates from employees"""
+    from .geofence import get_office_geofence
+
     try:
         print("📍 Location update received:", request.data)
         
         employee_id = request.data.get('employee_id')
         latitude = request.data.get('latitude')
         longitude = request.data.get('longitude')
-        is_in_office_radius = request.data.get('is_in_office_radius', True)
-        distance_from_office = request.data.get('distance_from_office', 0)
         is_sharing = request.data.get('is_sharing', True)  # New field to track sharing status
+        # is_in_office_radius / distance_from_office sent by older apps are ignored; the server decides
         
-        print(f"📍 Processing location update for employee {employee_id}: lat={latitude}, lon={longitude}, in_radius={is_in_office_radius}, distance={distance_from_office}, sharing={is_sharing}")
+        print(f"📍 Processing location update for employee {employee_id}: lat={latitude}, lon={longitude}, sharing={is_sharing}")
         
         if not all([employee_id, latitude, longitude]):
             print("❌ Missing required fields")
             return Response({'error': 'Missing required fields'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return Response({'error': 'latitude and longitude must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            employee = Employee.objects.get(employee_id=employee_id)
+            employee = Employee.objects.select_related('office').get(employee_id=employee_id)
             print(f"✅ Employee found: {employee.name}")
         except Employee.DoesNotExist:
             print(f"❌ Employee not found: {employee_id}")
             return Response({'error': 'Employee not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        is_in_office_radius, distance_from_office, recorded = None, None, False
         if is_sharing:
-            # Create or update employee location
-            location, created = EmployeeLocation.objects.update_or_create(
-                employee=employee,
-                is_active=True,
-                defaults={
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'is_in_office_radius': is_in_office_radius,
-                    'distance_from_office': distance_from_office,
-                    'timestamp': timezone.now()
-                }
-            )
-            
-            print(f"✅ Location {'created' if created else 'updated'}: {location}")
-            
-            # If employee is outside radius, create location alert
-            if not is_in_office_radius:
-                alert = LocationAlert.objects.create(
+            # 💓 Online until ONLINE_LOCATION_WINDOW after this ping, even if the write below is skipped
+            record_heartbeat(employee.employee_id)
+
+            # 🧭 Classify the ping against the cached office geometry before touching the DB
+            distance_from_office, is_in_office_radius = classify_location(employee, latitude, longitude)
+            distance_from_office = round(distance_from_office, 1)
+
+            location = location_buffer.get(employee.pk) if location_buffer.enabled else None
+            if location is None:
+                location = EmployeeLocation.objects.filter(employee=employee, is_active=True).first()
+            if is_redundant_ping(location, latitude, longitude, is_in_office_radius):
+                print(f"⏭️ Location unchanged for {employee.name}; skipping write")
+            else:
+                recorded = True
+                location = EmployeeLocation(
+                    pk=location.pk if location is not None else None,
                     employee=employee,
                     latitude=latitude,
                     longitude=longitude,
-                    distance=distance_from_office / 1000,  # Convert to km
-                    office_name=employee.office.name
+                    is_in_office_radius=is_in_office_radius,
+                    distance_from_office=distance_from_office,
+                    timestamp=timezone.now(),
+                    is_active=True
                 )
-                print(f"⚠️ Location alert created: {alert}")
+                location.set_grid_cell()
+                if location_buffer.enabled:
+                    # 💾 Written by the buffer's next flush, coalesced with later pings
+                    location_buffer.put(location)
+                else:
+                    location.save()
+                    record_location_presence([location])
+                record_history([history_point(location)])
+                publish_location(employee, location)
+                print(f"✅ Location stored: {location}")
+            
+            # 🚨 One alert per excursion (hysteresis + dwell time) instead of one per outside ping
+            outside_meters = 0.0 if is_in_office_radius else \
+                get_office_geofence(employee.office).outside_meters(distance_from_office)
+            event = track_geofence(employee, latitude, longitude, distance_from_office, outside_meters)
+            if event in ('opened', 'closed'):
+                print(f"⚠️ Location alert {event} for {employee.name}")
         else:
             # Mark employee as offline (not sharing location)
+            location_buffer.deactivate(employee.pk)
             EmployeeLocation.objects.filter(employee=employee, is_active=True).update(is_active=False)
+            record_sharing_stopped([employee.pk])
+            clear_heartbeats([employee.employee_id])
+            publish_status(employee, False)
             print(f"🔄 Employee {employee.name} marked as offline")
         
         response_data = {
             'message': 'Location updated successfully',
             'is_in_office_radius': is_in_office_radius,
             'distance': distance_from_office,
-            'is_sharing': is_sharing
+            'is_sharing': is_sharing,
+            'recorded': recorded
         }
         print(f"✅ Location update response: {response_data}")
         
@@ -497,31 +1196,332 @@ def location_update(request):
         print(f"❌ Location update error: {e}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+def bulk_location_update(request):
+    """
+    Ingest buffered GPS fixes for one or more employees in one request
+    Body: {"points": [{"employee_id", "latitude", "longitude", "timestamp"}, ...]}
+    Each employee's points are replayed in time order with the same rules as
+    location_update: server-side geofence, no-op pings skipped, and the points
+    fed to the geofence-exit tracker (one alert per excursion, see geofence_alerts).
+    Points dated more than MAX_LOCATION_CLOCK_SKEW_SECONDS in the future are rejected.
+    """
+    import numpy as np
+    from .geofence import get_office_geofence, evaluate_offices
+
+    try:
+        points = request.data.get('points')
+        if not isinstance(points, list) or not points:
+            return Response({'error': 'Missing points list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > MAX_BULK_LOCATION_POINTS:
+            return Response({
+                'error': f'Too many points. Maximum is {MAX_BULK_LOCATION_POINTS} per request.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = []
+        parsed = []  # (index, employee_id, latitude, longitude, timestamp)
+        received_at = now()
+
+        # 1️⃣ Per-point field validation (no DB access)
+        for index, point in enumerate(points):
+            try:
+                employee_id = str(point['employee_id'])
+                latitude = float(point['latitude'])
+                longitude = float(point['longitude'])
+                timestamp = parse_datetime(str(point['timestamp'])) if point.get('timestamp') else received_at
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append({'index': index, 'error': f'Invalid point: {e}'})
+                continue
+            if timestamp is None:
+                errors.append({'index': index, 'error': 'Invalid timestamp'})
+                continue
+            if not (abs(latitude) <= 90 and abs(longitude) <= 180):
+                errors.append({'index': index, 'error': 'Coordinates out of range'})
+                continue
+            if timezone.is_naive(timestamp):
+                timestamp = make_aware(timestamp)
+            if timestamp > received_at + timedelta(seconds=MAX_LOCATION_CLOCK_SKEW_SECONDS):
+                # Would become the active location and make every real fix look stale until then
+                errors.append({'index': index, 'error': 'Timestamp is in the future'})
+                continue
+            parsed.append((index, employee_id, latitude, longitude, timestamp))
+
+        # 2️⃣ One query for employees + offices, one for their active locations
+        employees = {
+            employee.employee_id: employee
+            for employee in Employee.objects.filter(
+                employee_id__in={item[1] for item in parsed}
+            ).select_related('office')
+        }
+        for item in parsed:
+            if item[1] not in employees:
+                errors.append({'index': item[0], 'error': f'Employee not found: {item[1]}'})
+        parsed = sorted((item for item in parsed if item[1] in employees), key=lambda item: (item[1], item[4]))
+
+        active = {}
+        for location in EmployeeLocation.objects.filter(employee__in=employees.values(), is_active=True):
+            active.setdefault(location.employee_id, location)  # newest first (Meta.ordering)
+        for employee in employees.values():
+            buffered = location_buffer.get(employee.pk) if location_buffer.enabled else None
+            if buffered is not None and (employee.pk not in active or buffered.timestamp >= active[employee.pk].timestamp):
+                active[employee.pk] = buffered
+
+        stored, stale = 0, 0
+        changed = {}
+        history = []
+        alert_events = {'opened': 0, 'closed': 0}
+        last_seen = {}
+        if parsed:
+            # 3️⃣ Geofence state of every point in one vectorized pass
+            latitudes = np.array([item[2] for item in parsed])
+            longitudes = np.array([item[3] for item in parsed])
+            employee_pks = [employees[item[1]].pk for item in parsed]
+            distances, inside = evaluate_offices(latitudes, longitudes, [employees[item[1]].office for item in parsed])
+            resolve_permitted_offices(employee_pks, latitudes, longitudes, distances, inside)
+
+            # 4️⃣ Replay each employee's points in time order against their latest stored location
+            for position, (index, employee_id, latitude, longitude, timestamp) in enumerate(parsed):
+                employee = employees[employee_id]
+                location = active.get(employee.pk)
+                if location is not None and timestamp <= location.timestamp:
+                    stale += 1  # Older than the position we already have
+                    continue
+                last_seen[employee_id] = timestamp
+
+                is_inside = bool(inside[position])
+                distance = round(float(distances[position]), 1)
+                outside_meters = 0.0 if is_inside else \
+                    get_office_geofence(employee.office).outside_meters(distance)
+                event = track_geofence(employee, latitude, longitude, distance, outside_meters, at=timestamp)
+                if event in alert_events:
+                    alert_events[event] += 1
+
+                if is_redundant_ping(location, latitude, longitude, is_inside, at=timestamp):
+                    continue
+
+                location = EmployeeLocation(
+                    pk=location.pk if location is not None else None,
+                    employee=employee,
+                    latitude=latitude,
+                    longitude=longitude,
+                    is_in_office_radius=is_inside,
+                    distance_from_office=distance,
+                    timestamp=timestamp,
+                    is_active=True
+                )
+                location.set_grid_cell()
+                active[employee.pk] = location
+                changed[employee.pk] = location
+                history.append(history_point(location))
+                stored += 1
+
+        # 5️⃣ Coalesced writes: one row per employee (through the write-behind buffer when enabled), then the history
+        # (timestamp is auto_now_add, so new rows get the fix time after the insert)
+        if location_buffer.enabled:
+            for location in changed.values():
+                location_buffer.put(location)
+        else:
+            new_locations = [location for location in changed.values() if location.pk is None]
+            if new_locations:
+                fix_times = [location.timestamp for location in new_locations]
+                EmployeeLocation.objects.bulk_create(new_locations)
+                for location, fix_time in zip(new_locations, fix_times):
+                    location.timestamp = fix_time
+            if changed:
+                EmployeeLocation.objects.bulk_update(
+                    list(changed.values()),
+                    ['latitude', 'longitude', 'lat_cell', 'lon_cell', 'is_in_office_radius', 'distance_from_office',
+                     'timestamp']
+                )
+                record_location_presence(changed.values())
+        if history:
+            history = compress_history_points(history)
+            record_history(history)
+        for employee_id, timestamp in last_seen.items():
+            record_heartbeat(employee_id, timestamp)  # Recent uploads keep the employee online
+        for location in changed.values():
+            publish_location(location.employee, location)
+
+        print(f"📦 Bulk location update: {len(parsed)} points, {stored} stored, "
+              f"{alert_events['opened']} alerts opened, {alert_events['closed']} closed, "
+              f"{stale} stale, {len(errors)} rejected")
+
+        return Response({
+            'message': f'{len(parsed)} of {len(points)} points accepted.',
+            'accepted': len(parsed),
+            'stored': stored,
+            'stale': stale,
+            'alerts_opened': alert_events['opened'],
+            'alerts_closed': alert_events['closed'],
+            'history_points': len(history),
+            'employees': {
+                employee_id: {
+                    'latitude': active[employee.pk].latitude,
+                    'longitude': active[employee.pk].longitude,
+                    'is_in_office_radius': active[employee.pk].is_in_office_radius,
+                    'distance_from_office': active[employee.pk].distance_from_office,
+                    'timestamp': active[employee.pk].timestamp,
+                }
+                for employee_id, employee in employees.items() if employee.pk in active
+            },
+            'errors': sorted(errors, key=lambda error: error['index'])
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        print(f"❌ Bulk location update error: {e}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def employee_location_history(request, employee_id):
+    """
+    Stored track of one employee for a time range (one index range on (employee, bucket_start))
+    Query: ?date=YYYY-MM-DD (default today) or ?start=...&end=... ISO datetimes
+    Older parts of the range come back downsampled; see compact_location_history
+    """
+    try:
+        employee = Employee.objects.get(employee_id=employee_id)
+    except Employee.DoesNotExist:
+        return Response({'error': 'Employee not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.query_params.get('start') or request.query_params.get('end'):
+        try:
+            start = parse_datetime(request.query_params.get('start', ''))
+            end = parse_datetime(request.query_params.get('end', ''))
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return Response({'error': 'start and end must be ISO datetimes'}, status=status.HTTP_400_BAD_REQUEST)
+        start = make_aware(start) if timezone.is_naive(start) else start
+        end = make_aware(end) if timezone.is_naive(end) else end
+    else:
+        try:
+            day = datetime.strptime(request.query_params['date'], '%Y-%m-%d') if request.query_params.get('date') \
+                else datetime.combine(timezone.localdate(), datetime.min.time())
+        except ValueError:
+            return Response({'error': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        start = make_aware(day)
+        end = start + timedelta(days=1)
+
+    points = LocationHistory.objects.filter(
+        employee=employee, bucket_start__gte=start, bucket_start__lt=end
+    ).values_list(
+        'bucket_start', 'latitude', 'longitude', 'is_in_office_radius', 'distance_from_office',
+        'resolution', 'point_count'
+    )
+
+    return Response({
+        'employee_id': employee.employee_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'points': [
+            {
+                'timestamp': bucket_start.isoformat(),
+                'latitude': latitude,
+                'longitude': longitude,
+                'is_in_office_radius': is_in_office_radius,
+                'distance_from_office': distance_from_office,
+                'resolution_seconds': resolution,
+                'point_count': point_count,
+            }
+            for bucket_start, latitude, longitude, is_in_office_radius, distance_from_office, resolution, point_count in points
+        ]
+    }, status=status.HTTP_200_OK)
+
+def live_stream_snapshot(office_ids):
+    """Current dashboard state sent when a stream opens (one presence query)"""
+    employees = Employee.objects.all()
+    if office_ids:
+        employees = employees.filter(office_id__in=office_ids)
+    presence = employee_presence(employees, location_buffer.latest(), use_heartbeats=True)
+    return [location_payload(employee, location, is_online) for employee, location, is_online in presence]
+
+async def live_location_stream(request):
+    """
+    Server-Sent Events stream of live dashboard updates (needs an ASGI server)
+    Query: ?office_id=1,2 to only receive employees of those home offices
+    Sends a `snapshot` event, then `location`, `status` and `attendance` deltas as they
+    are written; a `reset` event means the client fell behind and should reconnect
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The live stream needs an ASGI server (e.g. uvicorn employeemanagement.asgi:application)'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+    try:
+        office_ids = {int(office_id) for office_id in request.GET.get('office_id', '').split(',') if office_id}
+    except ValueError:
+        return JsonResponse({'error': 'office_id must be a comma-separated list of integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    broker = get_broker()
+    if not broker.cross_process and settings.WEB_CONCURRENCY > 1:
+        # Each dashboard would only receive the writes handled by its own worker
+        return JsonResponse({'error': 'The live stream needs LIVE_STREAM_BACKEND=employees.live_stream.RedisBroker '
+                                      'when running more than one worker'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def events():
+        # Subscribed before the snapshot is read, so nothing written in between is missed
+        subscriber = broker.subscribe(office_ids)
+        print(f"📡 Live stream opened ({broker.subscriber_count()} open)")
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+            snapshot = await sync_to_async(live_stream_snapshot)(office_ids)
+            yield encode_event('snapshot', {
+                'employees': snapshot,
+                'online_window_seconds': ONLINE_LOCATION_WINDOW.total_seconds()
+            })
+            while not subscriber.overflowed:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame
+            yield encode_event('reset', {'reason': 'Stream fell behind; reconnect for a new snapshot'})
+        finally:
+            broker.unsubscribe(subscriber)
+            print(f"📡 Live stream closed ({broker.subscriber_count()} open)")
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+    return response
+
+@api_view(['GET'])
+def employee_presence_status(request):
+    """
+    Online status from the presence heartbeats only (one cache get_many, no DB read)
+    Query: ?employee_ids=EMP1,EMP2,... (at most MAX_PRESENCE_STATUS_IDS)
+    """
+    employee_ids = [employee_id for employee_id in request.query_params.get('employee_ids', '').split(',') if employee_id]
+    if not employee_ids:
+        return Response({'error': 'employee_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(employee_ids) > MAX_PRESENCE_STATUS_IDS:
+        return Response({'error': f'At most {MAX_PRESENCE_STATUS_IDS} employee_ids per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    heartbeats = online_heartbeats(employee_ids)
+    return Response({
+        employee_id: {
+            'status': 'online' if employee_id in heartbeats else 'offline',
+            'last_seen': heartbeats[employee_id].isoformat() if employee_id in heartbeats else None
+        }
+        for employee_id in employee_ids
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+def location_buffer_metrics(request):
+    """Write-behind buffer counters for this worker (flush size/latency, coalesced pings, pending rows)"""
+    return Response(location_buffer.metrics(), status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 def update_employee_status(request):
     """Manually trigger employee status update"""
     try:
         print("🔄 Manual employee status update requested")
         
-        employees = Employee.objects.all()
-        updated_count = 0
-        
-        for employee in employees:
-            # Check if employee should be marked as offline
-            is_online = check_employee_online_status(employee)
-            
-            # Get the latest location record
-            latest_location = EmployeeLocation.objects.filter(
-                employee=employee
-            ).order_by('-timestamp').first()
-            
-            if latest_location:
-                # Update the is_active status based on online check
-                if latest_location.is_active != is_online:
-                    latest_location.is_active = is_online
-                    latest_location.save()
-                    updated_count += 1
-                    print(f"✅ Updated {employee.name} to {'online' if is_online else 'offline'}")
+        updated = sync_presence_flags(employee_presence(Employee.objects.all(), location_buffer.latest()))
+        for employee, is_online in updated:
+            print(f"✅ Updated {employee.name} to {'online' if is_online else 'offline'}")
+        updated_count = len(updated)
         
         return Response({
             'message': f'Employee status update completed. Updated {updated_count} employees.',
@@ -532,122 +1532,184 @@ def update_employee_status(request):
         print(f"❌ Employee status update error: {e}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def check_employee_online_status(employee):
-    """
-    Check if employee should be marked as offline based on:
-    1. No location update for more than 10 minutes (if they were sharing)
-    2. No login for more than 24 hours (more reasonable for daily work)
-    """
-    now = timezone.now()
-    
-    # Get the latest attendance (login/logout)
-    latest_attendance = Attendance.objects.filter(
-        employee=employee
-    ).order_by('-timestamp').first()
-    
-    # Get the latest location update
-    latest_location = EmployeeLocation.objects.filter(
-        employee=employee
-    ).order_by('-timestamp').first()
-    
-    # If employee has a recent location update (within 10 minutes), they're online
+def live_location_entry(employee, latest_location, is_online):
+    """live_employee_locations entry: last shared position (online or gone stale), else the home office"""
     if latest_location and latest_location.is_active:
-        time_since_location = now - latest_location.timestamp
-        if time_since_location <= timedelta(minutes=10):
-            print(f"✅ Employee {employee.name} has recent location update ({time_since_location.total_seconds()/60:.1f} minutes ago) - marking online")
-            return True
-    
-    # Check if employee hasn't logged in for more than 24 hours (more reasonable)
-    if latest_attendance:
-        time_since_login = now - latest_attendance.timestamp
-        if time_since_login > timedelta(hours=24):
-            print(f"🕐 Employee {employee.name} hasn't logged in for {time_since_login.total_seconds()/3600:.1f} hours - marking offline")
-            return False
-    
-    # If employee has location data but it's older than 10 minutes, they're offline
-    if latest_location and latest_location.is_active:
-        time_since_location = now - latest_location.timestamp
-        if time_since_location > timedelta(minutes=10):
-            print(f"📍 Employee {employee.name} hasn't sent location for {time_since_location.total_seconds()/60:.1f} minutes - marking offline")
-            return False
-    
-    # Default to offline if no recent activity
-    return False
+        # Online and sharing, or offline because the shared location is too old
+        return {
+            'employee_id': employee.employee_id,
+            'employee_name': employee.name,
+            'latitude': latest_location.latitude,
+            'longitude': latest_location.longitude,
+            'is_in_office_radius': latest_location.is_in_office_radius,
+            'distance_from_office': latest_location.distance_from_office,
+            'office_name': employee.office.name,
+            'office_latitude': employee.office.latitude,
+            'office_longitude': employee.office.longitude,
+            'office_radius': employee.office.radius_meters,
+            'last_updated': latest_location.timestamp.isoformat(),
+            'status': 'online' if is_online else 'offline',
+            'is_sharing': is_online
+        }
+    # Employee is offline with no recent location
+    return {
+        'employee_id': employee.employee_id,
+        'employee_name': employee.name,
+        'latitude': employee.office.latitude if employee.office else 0,
+        'longitude': employee.office.longitude if employee.office else 0,
+        'is_in_office_radius': False,
+        'distance_from_office': 0,
+        'office_name': employee.office.name if employee.office else 'Unknown',
+        'office_latitude': employee.office.latitude if employee.office else 0,
+        'office_longitude': employee.office.longitude if employee.office else 0,
+        'office_radius': employee.office.radius_meters if employee.office else 0,
+        'last_updated': latest_location.timestamp.isoformat() if latest_location else None,
+        'status': 'offline',
+        'is_sharing': False
+    }
 
 @api_view(['GET'])
 def live_employee_locations(request):
-    """Get live locations of all employees (including offline ones)"""
+    """
+    Get live locations of all employees (including offline ones)
+    ?since=<cursor> for only the changes, with ETag/Last-Modified revalidation (see live_location_poll)
+    """
     try:
         print("📡 Live employee locations request received")
-        
-        # Get all employees
-        employees = Employee.objects.all().select_related('office')
-        
-        data = []
-        for employee in employees:
-            # Get the most recent location for this employee
-            latest_location = EmployeeLocation.objects.filter(
-                employee=employee
-            ).order_by('-timestamp').first()
-            
-            # Check if employee should be marked as offline
-            is_online = check_employee_online_status(employee)
-            
-            if latest_location and latest_location.is_active and is_online:
-                # Employee is online and sharing location
-                data.append({
-                    'employee_id': employee.employee_id,
-                    'employee_name': employee.name,
-                    'latitude': latest_location.latitude,
-                    'longitude': latest_location.longitude,
-                    'is_in_office_radius': latest_location.is_in_office_radius,
-                    'distance_from_office': latest_location.distance_from_office,
-                    'office_name': employee.office.name,
-                    'office_latitude': employee.office.latitude,
-                    'office_longitude': employee.office.longitude,
-                    'office_radius': employee.office.radius_meters,
-                    'last_updated': latest_location.timestamp.isoformat(),
-                    'status': 'online',
-                    'is_sharing': True
-                })
-            elif latest_location and latest_location.is_active:
-                # Employee has location data but is offline (location too old)
-                data.append({
-                    'employee_id': employee.employee_id,
-                    'employee_name': employee.name,
-                    'latitude': latest_location.latitude,
-                    'longitude': latest_location.longitude,
-                    'is_in_office_radius': latest_location.is_in_office_radius,
-                    'distance_from_office': latest_location.distance_from_office,
-                    'office_name': employee.office.name,
-                    'office_latitude': employee.office.latitude,
-                    'office_longitude': employee.office.longitude,
-                    'office_radius': employee.office.radius_meters,
-                    'last_updated': latest_location.timestamp.isoformat(),
-                    'status': 'offline',
-                    'is_sharing': False
-                })
-            else:
-                # Employee is offline with no recent location
-                data.append({
-                    'employee_id': employee.employee_id,
-                    'employee_name': employee.name,
-                    'latitude': employee.office.latitude if employee.office else 0,
-                    'longitude': employee.office.longitude if employee.office else 0,
-                    'is_in_office_radius': False,
-                    'distance_from_office': 0,
-                    'office_name': employee.office.name if employee.office else 'Unknown',
-                    'office_latitude': employee.office.latitude if employee.office else 0,
-                    'office_longitude': employee.office.longitude if employee.office else 0,
-                    'office_radius': employee.office.radius_meters if employee.office else 0,
-                    'last_updated': latest_location.timestamp.isoformat() if latest_location else None,
-                    'status': 'offline',
-                    'is_sharing': False
-                })
-        
-        print(f"✅ Returning {len(data)} employee locations (online + offline)")
-        return Response(data, status=status.HTTP_200_OK)
+        response = live_location_poll(request, live_location_entry)
+        if response.status_code == status.HTTP_200_OK:
+            employees = response.data if isinstance(response.data, list) else response.data['employees']
+            print(f"✅ Returning {len(employees)} employee locations (online + offline)")
+        elif response.status_code == status.HTTP_304_NOT_MODIFIED:
+            print("✅ Live employee locations unchanged (304)")
+        return response
         
     except Exception as e:
         print(f"❌ Live employee locations error: {e}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def viewport_position(employee, latitude, longitude, is_in_office_radius, distance_from_office, timestamp, is_online):
+    """One employee entry of the viewport response"""
+    return {
+        'employee_id': employee.employee_id,
+        'employee_name': employee.name,
+        'latitude': latitude,
+        'longitude': longitude,
+        'is_in_office_radius': is_in_office_radius,
+        'distance_from_office': distance_from_office,
+        'office_name': employee.office.name if employee.office else None,
+        'last_updated': timestamp.isoformat(),
+        'status': 'online' if is_online else 'offline',
+        'is_sharing': is_online
+    }
+
+@api_view(['GET'])
+def live_employee_viewport(request):
+    """
+    Live positions inside a map viewport (only rows in the box are read)
+    Query: ?bbox=min_lon,min_lat,max_lon,max_lat or ?lat=..&lon=..&radius=meters
+    Optional: zoom (web-map level; below CLUSTER_MAX_ZOOM positions come back clustered),
+    cluster=1|0 to force or disable clustering (disabled clustering truncates at MAX_VIEWPORT_POINTS)
+    Only employees with an active shared location are returned; clusters are computed from
+    the DB and so do not include pings still waiting in the write-behind buffer
+    Online status follows the other live endpoints: a recent location or a live heartbeat
+    """
+    from .utils import haversine_distances
+
+    try:
+        min_lat, min_lon, max_lat, max_lon, circle = parse_viewport(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        zoom = request.query_params.get('zoom')
+        zoom = max(0, min(22, int(zoom))) if zoom not in (None, '') else None
+    except ValueError:
+        return Response({'error': 'zoom must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        cluster = request.query_params.get('cluster', '').lower()
+        if cluster in ('1', 'true'):
+            clustered = True
+        elif cluster in ('0', 'false'):
+            clustered = False
+        else:
+            clustered = zoom is not None and zoom < CLUSTER_MAX_ZOOM
+
+        now = timezone.now()
+        online_since = now - ONLINE_LOCATION_WINDOW
+        bbox = [min_lon, min_lat, max_lon, max_lat]
+        positions = EmployeeLocation.objects.filter(viewport_q(min_lat, min_lon, max_lat, max_lon))
+        if circle is not None:
+            # In the DB, so the slice below and the clusters only ever see rows inside the circle
+            positions = within_radius(positions, *circle)
+
+        if not clustered:
+            rows = list(positions.select_related('employee', 'employee__office').only(
+                'latitude', 'longitude', 'is_in_office_radius', 'distance_from_office', 'timestamp',
+                'employee__employee_id', 'employee__name', 'employee__office__name'
+            )[:MAX_VIEWPORT_POINTS + 1])
+
+            latest = {}
+            for location in rows:
+                latest.setdefault(location.employee_id, location)  # newest first (Meta.ordering)
+            if location_buffer.enabled:
+                # Buffered pings are newer than their DB rows: they move employees in, out or within the box
+                for employee_pk, buffered in location_buffer.latest().items():
+                    stored = latest.get(employee_pk)
+                    if stored is not None and stored.timestamp > buffered.timestamp:
+                        continue
+                    latest.pop(employee_pk, None)
+                    if buffered.is_active and in_viewport(buffered.latitude, buffered.longitude,
+                                                          min_lat, min_lon, max_lat, max_lon) and (
+                        circle is None or haversine_distances(
+                            circle[0], circle[1], buffered.latitude, buffered.longitude) <= circle[2]
+                    ):
+                        latest[employee_pk] = buffered
+
+            locations = list(latest.values())
+            truncated = len(locations) > MAX_VIEWPORT_POINTS
+            if not truncated or cluster in ('0', 'false'):
+                locations.sort(key=lambda location: location.timestamp, reverse=True)
+                locations = locations[:MAX_VIEWPORT_POINTS]
+                online = online_ids({
+                    location.employee.employee_id: (location.timestamp, location.is_active) for location in locations
+                }, now)
+                data = [
+                    viewport_position(
+                        location.employee, location.latitude, location.longitude, location.is_in_office_radius,
+                        location.distance_from_office, location.timestamp,
+                        location.employee.employee_id in online
+                    )
+                    for location in locations
+                ]
+                print(f"🗺️ Viewport {bbox}: {len(data)} employees")
+                return Response({
+                    'bbox': bbox,
+                    'clustered': False,
+                    'count': len(data),
+                    'truncated': truncated,
+                    'employees': data
+                }, status=status.HTTP_200_OK)
+
+        # Too many (or too small) to draw one by one: one entry per cell, grouped in the DB
+        cell_degrees = cluster_degrees(zoom if zoom is not None else viewport_zoom(min_lon, max_lon))
+        # Heartbeats can keep an employee online a little past their stored location
+        heartbeat_candidates = dict(positions.filter(
+            timestamp__gte=online_since - timedelta(seconds=LOCATION_HEARTBEAT_SECONDS), timestamp__lt=online_since
+        ).values_list('employee__employee_id', 'employee_id'))
+        heartbeat_online = [heartbeat_candidates[employee_id] for employee_id in online_heartbeats(heartbeat_candidates)]
+        clusters = cluster_positions(
+            positions, cell_degrees, Q(timestamp__gte=online_since) | Q(employee_id__in=heartbeat_online)
+        )
+        print(f"🗺️ Viewport {bbox}: {len(clusters)} clusters at {cell_degrees:.4f}°")
+        return Response({
+            'bbox': bbox,
+            'clustered': True,
+            'cell_degrees': cell_degrees,
+            'count': sum(cluster['count'] for cluster in clusters),
+            'clusters': clusters
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        print(f"❌ Live employee viewport error: {e}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
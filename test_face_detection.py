@@ -3,7 +3,8 @@
 Test script to verify face detection is working properly
 """
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from employees.utils import normalize_descriptor, descriptor_similarity
 
 def test_face_similarity():
     """Test face similarity calculation"""
@@ -14,12 +15,12 @@ def test_face_similarity():
     face1 = np.random.rand(128).astype(np.float32)
     face2 = face1 + np.random.normal(0, 0.01, 128).astype(np.float32)  # Slight noise
     
-    similarity = cosine_similarity(face1.reshape(1, -1), face2.reshape(1, -1))[0][0]
+    similarity = descriptor_similarity(normalize_descriptor(face1)[0], normalize_descriptor(face2)[0])
     print(f"✅ Same face with noise: {similarity:.4f}")
     
     # Test 2: Different faces (should be low similarity)
     face3 = np.random.rand(128).astype(np.float32)
-    similarity = cosine_similarity(face1.reshape(1, -1), face3.reshape(1, -1))[0][0]
+    similarity = descriptor_similarity(normalize_descriptor(face1)[0], normalize_descriptor(face3)[0])
     print(f"❌ Different faces: {similarity:.4f}")
     
     # Test 3: Threshold test
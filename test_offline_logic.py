@@ -13,7 +13,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'employeemanagement.settings')
 django.setup()
 
 from employees.models import Employee, EmployeeLocation, Attendance
-from employees.views import check_employee_online_status
+from employees.presence import check_employee_online_status
 from django.utils import timezone
 
 def test_offline_logic():